@@ -1,3 +1,4 @@
+import logging
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_socketio import SocketIO
@@ -5,7 +6,9 @@ from flask_cors import CORS
 from flask_migrate import Migrate
 from flasgger import Swagger
 from .config import Config
-from .extensions import db, socketio, cors, migrate
+from .extensions import db, socketio, cors, migrate, redis_manager
+
+logger = logging.getLogger(__name__)
 
 def create_app(config_class=Config):
     app = Flask(__name__)
@@ -33,7 +36,8 @@ def create_app(config_class=Config):
         origins=allowed_origins, 
         supports_credentials=True,
         allow_headers=['Content-Type', 'Authorization', 'X-Requested-With'],
-        methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS']
+        expose_headers=['X-Session-Token', 'X-Session-Token-Expires'],
+        methods=['GET', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS']
     )
     
     socketio.init_app(
@@ -48,6 +52,14 @@ def create_app(config_class=Config):
         always_connect=True
     )
     migrate.init_app(app, db)
+    redis_manager.init_app(app)
+    from app.services.ephemeral_store import init_ephemeral_store
+    init_ephemeral_store(app)
+    
+    from app.services.object_write_buffer import object_write_buffer
+    object_write_buffer.init_app(app)
+    from app.services.cursor_broadcaster import cursor_broadcaster
+    cursor_broadcaster.init_app(app)
     
     # Initialize Swagger
     swagger_config = {
@@ -107,31 +119,66 @@ def create_app(config_class=Config):
     app.register_blueprint(objects_bp, url_prefix='/api/objects')
     app.register_blueprint(collaboration_bp, url_prefix='/api/collaboration')
     
+    # Register CLI commands
+    from .commands import register_commands
+    register_commands(app)
+    
     # Register socket handlers
     from .socket_handlers import register_socket_handlers
     register_socket_handlers(socketio)
     
     # Add Socket.IO connection authentication
+    from flask_socketio import emit
+    from .socket_handlers.session import socket_sessions, authenticate_socket, refresh_socket_token
+    from .socket_handlers.rooms import release_rooms_left_empty
+    from .services.auth_service import get_auth_service
+    
     @socketio.on('connect')
     def handle_connect(auth=None):
-        """Handle Socket.IO connection."""
+        """Handle Socket.IO connection, binding the user to the sid when a token is sent."""
         # Only log in development mode
         if app.config.get('DEBUG', False):
             print("=== Socket.IO Connection Established ===")
-            print(f"Auth data: {auth}")
+            logger.debug(f"Socket.IO auth token provided: {bool(auth and auth.get('token'))}")
+        
+        id_token = auth.get('token') if isinstance(auth, dict) else None
+        if not id_token:
+            return
+        
+        try:
+            identity = authenticate_socket(id_token)
+            authenticated = {'user': identity.to_dict(), 'expires_at': identity.expires_at}
+            # Only a Firebase ID token earns a session token; renewing one with itself would never expire
+            session_tokens = get_auth_service().session_tokens
+            if session_tokens.enabled and not session_tokens.is_session_token(id_token):
+                session_token, session_expires_at = session_tokens.issue(identity.id)
+                authenticated.update(session_token=session_token, session_token_expires_at=session_expires_at)
+            emit('authenticated', authenticated)
+        except Exception as e:
+            # Keep the connection; events may still authenticate with an id_token
+            logger.warning(f"Socket.IO connection authentication failed: {e}")
+    
+    @socketio.on('refresh_token')
+    def handle_refresh_token(data):
+        """Rotate the Firebase token bound to this connection."""
+        id_token = (data or {}).get('id_token')
+        if not id_token:
+            emit('error', {'message': 'id_token is required'})
+            return
         
-        # Ensure Firebase is initialized
         try:
-            from app.services.auth_service import AuthService
-            auth_service = AuthService()
-            if app.config.get('DEBUG', False):
-                print("Firebase Admin SDK is properly initialized for Socket.IO")
+            identity = refresh_socket_token(id_token)
+            emit('token_refreshed', {'expires_at': identity.expires_at})
         except Exception as e:
-            print(f"Firebase initialization check failed: {e}")
+            emit('error', {'message': f'Token refresh failed: {str(e)}'})
     
     @socketio.on('disconnect')
     def handle_disconnect():
         """Handle Socket.IO disconnection."""
+        from flask import request
+        socket_sessions.unbind(request.sid)
+        release_rooms_left_empty(request.sid)
+        
         # Only log in development mode
         if app.config.get('DEBUG', False):
             print("=== Socket.IO Connection Disconnected ===")
@@ -149,15 +196,42 @@ def create_app(config_class=Config):
     def health_check():
         return {'status': 'healthy', 'message': 'CollabCanvas API is running'}, 200
     
+    @app.route('/metrics')
+    def metrics():
+        from app.services.auth_service import AuthService
+        from app.utils.identity_map import identity_map_stats
+        from app.services.permission_cache import permission_cache
+        from app.services.snapshot_cache import snapshot_cache
+        from app.services.spatial_index import spatial_indexes
+        from app.services.room_event_log import room_events
+        from app.services.canvas_state import canvas_states
+        auth_service = get_auth_service()
+        return {
+            'token_cache': AuthService.get_token_cache_stats(),
+            'auth_service': AuthService.get_init_stats(),
+            'token_verifier': auth_service.get_token_verifier_stats(),
+            'session_tokens': auth_service.session_tokens.stats(),
+            'identity_map': identity_map_stats.to_dict(),
+            'permission_cache': permission_cache.stats(),
+            'snapshot_cache': snapshot_cache.stats(),
+            'spatial_index': spatial_indexes.stats(),
+            'object_write_buffer': object_write_buffer.stats(),
+            'room_events': room_events.stats(),
+            'canvas_state': canvas_states.stats(),
+            'cursor_broadcaster': cursor_broadcaster.stats(),
+            'redis': redis_manager.stats(),
+            'ephemeral_store': app.extensions['ephemeral_store'].stats()
+        }, 200
+    
     @app.route('/test-firebase')
     def test_firebase():
         try:
-            from app.services.auth_service import AuthService
-            auth_service = AuthService()
+            from app.services.auth_service import get_auth_service
+            auth_service = get_auth_service()
             return {
                 'status': 'success',
                 'message': 'Firebase service initialized',
-                'has_mock_firebase': hasattr(auth_service, '_mock_firebase') and auth_service._mock_firebase
+                'has_mock_firebase': auth_service.is_mock
             }, 200
         except Exception as e:
             return {
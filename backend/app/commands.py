@@ -0,0 +1,29 @@
+import click
+
+def register_commands(app):
+    """Register maintenance CLI commands (run with `flask <command>`)."""
+    
+    @app.cli.command('repair-canvas-counters')
+    def repair_canvas_counters():
+        """Recompute drifted canvas object/collaborator counters."""
+        from app.services.canvas_service import CanvasService
+        fixed = CanvasService().repair_canvas_counters()
+        click.echo(f"Repaired counters on {fixed} canvas(es)")
+    
+    @app.cli.command('backfill-object-geometry')
+    @click.option('--batch-size', default=500, show_default=True, help='Objects updated per transaction.')
+    def backfill_object_geometry(batch_size):
+        """Recompute canvas object geometry columns from their properties."""
+        from app.services.canvas_service import CanvasService
+        from app.services.spatial_index import spatial_indexes
+        updated = CanvasService().backfill_object_geometry(batch_size=batch_size)
+        spatial_indexes.clear()
+        click.echo(f"Backfilled geometry for {updated} object(s)")
+    
+    @app.cli.command('compact-canvas-logs')
+    @click.option('--retain', default=None, type=int, help='Versions of operations kept after the snapshot (default OPLOG_RETAIN).')
+    def compact_canvas_logs(retain):
+        """Fold every canvas's operation log into a snapshot and trim old operations."""
+        from app.services.canvas_service import CanvasService
+        compacted = CanvasService().compact_all_canvas_logs(retain=retain)
+        click.echo(f"Compacted operation logs of {compacted} canvas(es)")
@@ -4,11 +4,29 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+# Public placeholder: nothing may be signed with it (session tokens stay off while it is in use)
+DEFAULT_SECRET_KEY = 'dev-secret-key-change-in-production'
+
 class Config:
-    SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
+    SECRET_KEY = os.environ.get('SECRET_KEY') or DEFAULT_SECRET_KEY
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///site.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     REDIS_URL = os.environ.get('REDIS_URL') or 'redis://localhost:6379/0'
+    # Shared Redis pool; connections are opened on first use and health-checked when idle
+    REDIS_MAX_CONNECTIONS = int(os.environ.get('REDIS_MAX_CONNECTIONS', 50))
+    REDIS_CONNECT_TIMEOUT_MS = int(os.environ.get('REDIS_CONNECT_TIMEOUT_MS', 500))
+    REDIS_SOCKET_TIMEOUT_MS = int(os.environ.get('REDIS_SOCKET_TIMEOUT_MS', 500))
+    REDIS_HEALTH_CHECK_INTERVAL = int(os.environ.get('REDIS_HEALTH_CHECK_INTERVAL', 30))
+    # Circuit breaker: this many consecutive errors, timeouts or commands slower than
+    # REDIS_SLOW_COMMAND_MS switch Redis off for REDIS_BREAKER_COOLDOWN seconds
+    REDIS_SLOW_COMMAND_MS = float(os.environ.get('REDIS_SLOW_COMMAND_MS', 250))
+    REDIS_BREAKER_THRESHOLD = int(os.environ.get('REDIS_BREAKER_THRESHOLD', 5))
+    REDIS_BREAKER_COOLDOWN = float(os.environ.get('REDIS_BREAKER_COOLDOWN', 10))
+    # Non-transactional pipelines are sent in chunks of at most this many commands
+    REDIS_PIPELINE_MAX_COMMANDS = int(os.environ.get('REDIS_PIPELINE_MAX_COMMANDS', 1000))
+    # Cursor/presence/activity state: "redis" (shared by every node), "memory" (single node) or
+    # "auto" (Redis when REDIS_URL is set, falling back to memory while it is unavailable)
+    EPHEMERAL_STORE = os.environ.get('EPHEMERAL_STORE', 'auto')
     
     # Firebase Configuration
     FIREBASE_PROJECT_ID = os.environ.get('FIREBASE_PROJECT_ID')
@@ -21,6 +39,24 @@ class Config:
     FIREBASE_AUTH_PROVIDER_X509_CERT_URL = os.environ.get('FIREBASE_AUTH_PROVIDER_X509_CERT_URL')
     FIREBASE_CLIENT_X509_CERT_URL = os.environ.get('FIREBASE_CLIENT_X509_CERT_URL')
     
+    # Server-issued session tokens: "kid:secret,kid:secret" (first key signs)
+    SESSION_TOKEN_KEYS = os.environ.get('SESSION_TOKEN_KEYS')
+    SESSION_TOKEN_TTL = int(os.environ.get('SESSION_TOKEN_TTL', 900))
+    
+    # Socket object updates: "buffered" coalesces them and writes in batches, "sync" commits each one
+    OBJECT_WRITE_DURABILITY = os.environ.get('OBJECT_WRITE_DURABILITY', 'buffered')
+    OBJECT_WRITE_FLUSH_INTERVAL_MS = int(os.environ.get('OBJECT_WRITE_FLUSH_INTERVAL_MS', 250))
+    OBJECT_WRITE_BUFFER_MAX = int(os.environ.get('OBJECT_WRITE_BUFFER_MAX', 10000))
+    
+    # Cursor moves are coalesced and broadcast per room as one cursors_batch per tick; rooms larger
+    # than CURSOR_TICK_ROOM_SIZE members (or a busy server) tick slower, down to CURSOR_TICK_MIN_HZ
+    CURSOR_TICK_HZ = float(os.environ.get('CURSOR_TICK_HZ', 20))
+    CURSOR_TICK_MIN_HZ = float(os.environ.get('CURSOR_TICK_MIN_HZ', 5))
+    CURSOR_TICK_ROOM_SIZE = int(os.environ.get('CURSOR_TICK_ROOM_SIZE', 10))
+    # Cursors idle this long disappear; positions reach Redis (for other nodes) once per interval
+    CURSOR_TTL = float(os.environ.get('CURSOR_TTL', 30))
+    CURSOR_PERSIST_INTERVAL_MS = int(os.environ.get('CURSOR_PERSIST_INTERVAL_MS', 1000))
+    
     # CORS Configuration
     CORS_ORIGINS = os.environ.get('CORS_ORIGINS', 'http://localhost:3000,http://localhost:5173').split(',')
     
@@ -43,9 +79,12 @@ class DevelopmentConfig(Config):
 
 class TestingConfig(Config):
     TESTING = True
+    SECRET_KEY = 'testing-secret-key'
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     SOCKETIO_MESSAGE_QUEUE = None
     FLASK_ENV = 'testing'
+    REDIS_URL = None
+    OBJECT_WRITE_DURABILITY = 'sync'
     # Minimal logging for testing
     SOCKETIO_LOGGER = False
     SOCKETIO_ENGINEIO_LOGGER = False
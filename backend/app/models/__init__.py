@@ -1,7 +1,10 @@
 from .user import User
 from .canvas import Canvas
 from .canvas_object import CanvasObject
+from .canvas_object_tombstone import CanvasObjectTombstone
+from .canvas_operation import CanvasOperation
+from .canvas_snapshot import CanvasSnapshot
 from .canvas_permission import CanvasPermission
 from .invitation import Invitation
 
-__all__ = ['User', 'Canvas', 'CanvasObject', 'CanvasPermission', 'Invitation']
+__all__ = ['User', 'Canvas', 'CanvasObject', 'CanvasObjectTombstone', 'CanvasOperation', 'CanvasSnapshot', 'CanvasPermission', 'Invitation']
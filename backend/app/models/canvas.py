@@ -7,15 +7,28 @@ class Canvas(db.Model):
     id = db.Column(db.String(36), primary_key=True)  # UUID
     title = db.Column(db.String(255), nullable=False)
     description = db.Column(db.Text)
-    owner_id = db.Column(db.String(128), db.ForeignKey('users.id'), nullable=False)
-    is_public = db.Column(db.Boolean, default=False)
+    owner_id = db.Column(db.String(128), db.ForeignKey('users.id'), nullable=False, index=True)
+    is_public = db.Column(db.Boolean, default=False, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Denormalized counters, maintained by CanvasService / CollaborationService
+    object_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    collaborator_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
+    # Bumped on every object create/update/delete; drives the objects ETag and delta sync
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
+    # Keyset pagination order for canvas listings
+    __table_args__ = (db.Index('ix_canvases_updated_at_id', 'updated_at', 'id'),)
+    
     # Relationships
     objects = db.relationship('CanvasObject', backref='canvas', lazy='dynamic', cascade='all, delete-orphan')
     permissions = db.relationship('CanvasPermission', backref='canvas', lazy='dynamic', cascade='all, delete-orphan')
     invitations = db.relationship('Invitation', backref='canvas', lazy='dynamic', cascade='all, delete-orphan')
+    tombstones = db.relationship('CanvasObjectTombstone', lazy='dynamic', cascade='all, delete-orphan')
+    operations = db.relationship('CanvasOperation', lazy='dynamic', cascade='all, delete-orphan')
+    snapshot = db.relationship('CanvasSnapshot', uselist=False, cascade='all, delete-orphan')
     
     def __repr__(self):
         return f'<Canvas {self.title}>'
@@ -29,6 +42,7 @@ class Canvas(db.Model):
             'is_public': self.is_public,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'object_count': self.objects.count(),
-            'collaborator_count': self.permissions.count()
+            'object_count': self.object_count or 0,
+            'collaborator_count': self.collaborator_count or 0,
+            'version': self.version or 0
         }
@@ -1,5 +1,6 @@
 from datetime import datetime
 from app.extensions import db
+from app.utils.geometry import geometry_columns
 import json
 
 class CanvasObject(db.Model):
@@ -12,6 +13,24 @@ class CanvasObject(db.Model):
     created_by = db.Column(db.String(128), db.ForeignKey('users.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    change_seq = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # canvas version of the last write
+    
+    # Geometry derived from properties on every write (see refresh_geometry); NULL bounds mean unknown extent
+    min_x = db.Column(db.Float)
+    min_y = db.Column(db.Float)
+    max_x = db.Column(db.Float)
+    max_y = db.Column(db.Float)
+    z_index = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rotation = db.Column(db.Float, nullable=False, default=0, server_default='0')
+    
+    __table_args__ = (
+        # Delta sync reads objects changed after a given canvas version
+        db.Index('ix_canvas_objects_canvas_seq', 'canvas_id', 'change_seq'),
+        # Region queries and extents
+        db.Index('ix_canvas_objects_canvas_x', 'canvas_id', 'min_x', 'max_x'),
+        db.Index('ix_canvas_objects_canvas_y', 'canvas_id', 'min_y', 'max_y'),
+        db.Index('ix_canvas_objects_canvas_z', 'canvas_id', 'z_index'),
+    )
     
     # Relationships
     creator = db.relationship('User', backref='created_objects')
@@ -30,6 +49,17 @@ class CanvasObject(db.Model):
         """Set properties from a dictionary."""
         self.properties = json.dumps(properties_dict)
     
+    def refresh_geometry(self):
+        """Recompute the geometry columns from the current properties."""
+        for column, value in geometry_columns(self.object_type, self.get_properties()).items():
+            setattr(self, column, value)
+    
+    def get_bounds(self):
+        """(min_x, min_y, max_x, max_y), or None when the extent is unknown."""
+        if self.min_x is None:
+            return None
+        return self.min_x, self.min_y, self.max_x, self.max_y
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -38,5 +68,6 @@ class CanvasObject(db.Model):
             'properties': self.get_properties(),
             'created_by': self.created_by,
             'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'change_seq': self.change_seq or 0
         }
@@ -0,0 +1,21 @@
+from datetime import datetime
+from app.extensions import db
+
+class CanvasObjectTombstone(db.Model):
+    __tablename__ = 'canvas_object_tombstones'
+    
+    object_id = db.Column(db.String(36), primary_key=True)  # id of the deleted CanvasObject
+    canvas_id = db.Column(db.String(36), db.ForeignKey('canvases.id'), nullable=False)
+    change_seq = db.Column(db.Integer, nullable=False)  # canvas version of the delete
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (db.Index('ix_canvas_object_tombstones_canvas_seq', 'canvas_id', 'change_seq'),)
+    
+    def __repr__(self):
+        return f'<CanvasObjectTombstone {self.object_id} on canvas {self.canvas_id}>'
+    
+    def to_dict(self):
+        return {
+            'id': self.object_id,
+            'change_seq': self.change_seq
+        }
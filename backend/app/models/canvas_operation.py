@@ -0,0 +1,37 @@
+from datetime import datetime
+from app.extensions import db
+import json
+
+class CanvasOperation(db.Model):
+    __tablename__ = 'canvas_operations'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    canvas_id = db.Column(db.String(36), db.ForeignKey('canvases.id'), nullable=False)
+    seq = db.Column(db.Integer, nullable=False)  # canvas version the operation produced
+    op = db.Column(db.String(10), nullable=False)  # 'create', 'update', 'patch', 'delete'
+    object_id = db.Column(db.String(36), nullable=False)
+    payload = db.Column(db.Text)  # JSON: object for create/update, {patch, updated_at} for patch
+    actor_id = db.Column(db.String(128))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (db.Index('ix_canvas_operations_canvas_seq', 'canvas_id', 'seq'),)
+    
+    def __repr__(self):
+        return f'<CanvasOperation {self.op} {self.object_id} @ {self.seq}>'
+    
+    def get_payload(self):
+        """Get payload as a dictionary (None for deletes)."""
+        try:
+            return json.loads(self.payload) if self.payload else None
+        except (json.JSONDecodeError, TypeError):
+            return None
+    
+    def to_dict(self):
+        return {
+            'seq': self.seq,
+            'op': self.op,
+            'object_id': self.object_id,
+            'payload': self.get_payload(),
+            'actor_id': self.actor_id,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
@@ -6,7 +6,7 @@ class CanvasPermission(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     canvas_id = db.Column(db.String(36), db.ForeignKey('canvases.id'), nullable=False)
-    user_id = db.Column(db.String(128), db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.String(128), db.ForeignKey('users.id'), nullable=False, index=True)
     permission_type = db.Column(db.String(20), nullable=False)  # 'view', 'edit'
     granted_at = db.Column(db.DateTime, default=datetime.utcnow)
     granted_by = db.Column(db.String(128), db.ForeignKey('users.id'), nullable=False)
@@ -0,0 +1,25 @@
+from datetime import datetime
+from app.extensions import db
+import json
+import zlib
+
+class CanvasSnapshot(db.Model):
+    __tablename__ = 'canvas_snapshots'
+    
+    canvas_id = db.Column(db.String(36), db.ForeignKey('canvases.id'), primary_key=True)
+    seq = db.Column(db.Integer, nullable=False)  # canvas version the snapshot reflects
+    object_count = db.Column(db.Integer, nullable=False, default=0)
+    data = db.Column(db.LargeBinary, nullable=False)  # zlib-compressed JSON list of objects
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<CanvasSnapshot {self.canvas_id} @ {self.seq}>'
+    
+    def get_objects(self):
+        """Decompress the stored object list."""
+        return json.loads(zlib.decompress(self.data))
+    
+    def set_objects(self, objects):
+        """Compress and store an object list."""
+        self.data = zlib.compress(json.dumps(objects, separators=(',', ':')).encode('utf-8'), 6)
+        self.object_count = len(objects)
@@ -1,6 +1,6 @@
 from flask import Blueprint, request, jsonify
 from flasgger import swag_from
-from app.services.auth_service import AuthService, require_auth
+from app.services.auth_service import get_auth_service, require_auth
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -67,7 +67,7 @@ def register():
         if not id_token:
             return jsonify({'error': 'ID token is required'}), 400
         
-        auth_service = AuthService()
+        auth_service = get_auth_service()
         user = auth_service.register_user(id_token)
         
         return jsonify({
@@ -188,7 +188,7 @@ def verify_token():
         if not id_token:
             return jsonify({'error': 'ID token is required'}), 400
         
-        auth_service = AuthService()
+        auth_service = get_auth_service()
         decoded_token = auth_service.verify_token(id_token)
         
         return jsonify({
@@ -198,3 +198,57 @@ def verify_token():
         
     except Exception as e:
         return jsonify({'error': str(e)}), 401
+
+@auth_bp.route('/session', methods=['POST'])
+@require_auth
+@swag_from({
+    'tags': ['Authentication'],
+    'summary': 'Issue a backend session token',
+    'description': 'Exchange a verified Firebase ID token for a short-lived backend session token that is accepted wherever an ID token is',
+    'security': [{'Bearer': []}],
+    'responses': {
+        200: {
+            'description': 'Session token issued',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'session_token': {'type': 'string'},
+                    'expires_at': {'type': 'integer'}
+                }
+            }
+        },
+        401: {
+            'description': 'Unauthorized - invalid or missing token',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'error': {'type': 'string'}
+                }
+            }
+        }
+    }
+})
+def create_session(current_user):
+    """Issue a backend session token for the current user."""
+    session_token, expires_at = get_auth_service().issue_session_token(current_user.id)
+    return jsonify({
+        'session_token': session_token,
+        'expires_at': expires_at
+    }), 200
+
+@auth_bp.route('/logout', methods=['POST'])
+@require_auth
+def logout(current_user):
+    """Revoke the presented session token, or every session token of the user."""
+    auth_service = get_auth_service()
+    data = request.get_json(silent=True) or {}
+    
+    if data.get('all_sessions'):
+        auth_service.session_tokens.revoke_user(current_user.id)
+    else:
+        token = request.headers.get('Authorization', '').split(' ')[-1]
+        if auth_service.session_tokens.is_session_token(token):
+            claims = auth_service.session_tokens.verify(token)
+            auth_service.session_tokens.revoke(claims['jti'], claims['exp'])
+    
+    return jsonify({'message': 'Logged out'}), 200
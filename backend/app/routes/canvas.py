@@ -1,7 +1,11 @@
-from flask import Blueprint, request, jsonify
+import json
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from flasgger import swag_from
-from app.services.canvas_service import CanvasService
+from app.services.canvas_service import CanvasService, CANVAS_SCOPES, CANVAS_PAGE_SIZE_DEFAULT, CANVAS_PAGE_SIZE_MAX
 from app.services.auth_service import require_auth
+from app.services.snapshot_cache import canvas_etag
+from app.services.object_write_buffer import object_write_buffer
+from app.utils.geometry import parse_bbox
 
 canvas_bp = Blueprint('canvas', __name__)
 canvas_service = CanvasService()
@@ -12,14 +16,38 @@ canvas_service = CanvasService()
 @swag_from({
     'tags': ['Canvas'],
     'summary': 'Get all canvases',
-    'description': 'Get all canvases accessible to the current user (owned, shared, or public)',
+    'description': 'Get canvases accessible to the current user (owned, shared, or public), newest first, one page at a time',
     'security': [{'Bearer': []}],
+    'parameters': [
+        {
+            'name': 'filter',
+            'in': 'query',
+            'type': 'string',
+            'required': False,
+            'description': 'Comma-separated scopes to include: owned, shared, public (default: all)'
+        },
+        {
+            'name': 'limit',
+            'in': 'query',
+            'type': 'integer',
+            'required': False,
+            'description': f'Page size (default {CANVAS_PAGE_SIZE_DEFAULT}, max {CANVAS_PAGE_SIZE_MAX})'
+        },
+        {
+            'name': 'cursor',
+            'in': 'query',
+            'type': 'string',
+            'required': False,
+            'description': 'next_cursor from the previous page'
+        }
+    ],
     'responses': {
         200: {
             'description': 'Canvases retrieved successfully',
             'schema': {
                 'type': 'object',
                 'properties': {
+                    'next_cursor': {'type': 'string'},
                     'canvases': {
                         'type': 'array',
                         'items': {
@@ -52,11 +80,28 @@ canvas_service = CanvasService()
     }
 })
 def get_canvases(current_user):
-    """Get all canvases accessible to the current user."""
+    """Get a page of canvases accessible to the current user."""
     try:
-        canvases = canvas_service.get_user_canvases(current_user.id)
+        scopes = CANVAS_SCOPES
+        if request.args.get('filter'):
+            scopes = tuple(scope.strip() for scope in request.args['filter'].split(','))
+            if not scopes or any(scope not in CANVAS_SCOPES for scope in scopes):
+                return jsonify({'error': f'filter must be a comma-separated subset of: {list(CANVAS_SCOPES)}'}), 400
+        
+        try:
+            limit = int(request.args.get('limit', CANVAS_PAGE_SIZE_DEFAULT))
+            canvases, next_cursor = canvas_service.get_user_canvases_page(
+                current_user.id,
+                scopes=scopes,
+                limit=limit,
+                cursor=request.args.get('cursor')
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
         return jsonify({
-            'canvases': [canvas.to_dict() for canvas in canvases]
+            'canvases': [canvas.to_dict() for canvas in canvases],
+            'next_cursor': next_cursor
         }), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -302,19 +347,154 @@ def delete_canvas(current_user, canvas_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@canvas_bp.route('/<canvas_id>/extents', methods=['GET'])
+@require_auth
+def get_canvas_extents(current_user, canvas_id):
+    """Get the bounding box of all objects on a canvas (for zoom to fit)."""
+    try:
+        if not canvas_service.check_canvas_permission(canvas_id, current_user.id):
+            return jsonify({'error': 'Access denied'}), 403
+        
+        object_write_buffer.flush_canvas(canvas_id)
+        return jsonify({
+            'extents': canvas_service.get_canvas_extents(canvas_id)
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@canvas_bp.route('/<canvas_id>/operations', methods=['GET'])
+@require_auth
+def get_canvas_operations(current_user, canvas_id):
+    """Get the logged object operations after a canvas version, for replay by a client that is behind."""
+    try:
+        try:
+            since = int(request.args.get('since', ''))
+        except ValueError:
+            return jsonify({'error': 'since must be an integer canvas version'}), 400
+        if since < 0:
+            return jsonify({'error': 'since must be an integer canvas version'}), 400
+        
+        if not canvas_service.check_canvas_permission(canvas_id, current_user.id):
+            return jsonify({'error': 'Access denied'}), 403
+        
+        object_write_buffer.flush_canvas(canvas_id)
+        result = canvas_service.get_canvas_operations(canvas_id, since)
+        if result is None:
+            # History before the oldest retained operation was compacted; reload the snapshot
+            return jsonify({'error': 'Operations since this version are no longer available'}), 410
+        
+        version, operations = result
+        return jsonify({
+            'operations': [operation.to_dict() for operation in operations],
+            'since': since,
+            'version': version
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+OBJECT_STREAM_FORMATS = ('ndjson', 'json')
+
+def _stream_canvas_objects(canvas_id, stream_format):
+    """Stream a canvas's objects as NDJSON or a chunked JSON array, one batch of rows at a time."""
+    version = canvas_service.get_canvas_version(canvas_id) or 0
+    
+    def generate():
+        objects = canvas_service.iter_canvas_objects(canvas_id)
+        if stream_format == 'ndjson':
+            for obj in objects:
+                yield json.dumps(obj.to_dict(), separators=(',', ':')) + '\n'
+            return
+        
+        yield f'{{"version":{version},"objects":['
+        separator = ''
+        for obj in objects:
+            yield separator + json.dumps(obj.to_dict(), separators=(',', ':'))
+            separator = ','
+        yield ']}'
+    
+    mimetype = 'application/x-ndjson' if stream_format == 'ndjson' else 'application/json'
+    response = Response(stream_with_context(generate()), status=200, mimetype=mimetype)
+    response.headers['X-Canvas-Version'] = str(version)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
 @canvas_bp.route('/<canvas_id>/objects', methods=['GET'])
 @require_auth
 def get_canvas_objects(current_user, canvas_id):
-    """Get all objects for a canvas."""
+    """Get all objects for a canvas, only those changed since a canvas version, or only those in a viewport."""
     try:
+        since = request.args.get('since')
+        if since is not None:
+            try:
+                since = int(since)
+            except ValueError:
+                return jsonify({'error': 'since must be an integer canvas version'}), 400
+            if since < 0:
+                return jsonify({'error': 'since must be an integer canvas version'}), 400
+        
+        stream = request.args.get('stream')
+        if stream is not None and stream not in OBJECT_STREAM_FORMATS:
+            return jsonify({'error': f"stream must be one of: {', '.join(OBJECT_STREAM_FORMATS)}"}), 400
+        if stream and since is not None:
+            return jsonify({'error': 'stream cannot be combined with since'}), 400
+        
+        bbox = request.args.get('bbox')
+        if bbox is not None:
+            if stream or since is not None:
+                return jsonify({'error': 'bbox cannot be combined with stream or since'}), 400
+            try:
+                bbox = parse_bbox(bbox)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+        
         # Check permission
         if not canvas_service.check_canvas_permission(canvas_id, current_user.id):
             return jsonify({'error': 'Access denied'}), 403
         
-        objects = canvas_service.get_canvas_objects(canvas_id)
-        return jsonify({
-            'objects': [obj.to_dict() for obj in objects]
-        }), 200
+        # Reads see buffered socket updates
+        object_write_buffer.flush_canvas(canvas_id)
+        
+        if stream:
+            return _stream_canvas_objects(canvas_id, stream)
+        
+        if bbox is not None:
+            version, objects = canvas_service.get_canvas_objects_in_bbox(canvas_id, bbox)
+            return jsonify({
+                'objects': [obj.to_dict() for obj in objects],
+                'bbox': list(bbox),
+                'version': version
+            }), 200
+        
+        if since is not None:
+            changes = canvas_service.get_canvas_changes(canvas_id, since)
+            if changes is not None:
+                version, objects, deleted_ids = changes
+                return jsonify({
+                    'objects': [obj.to_dict() for obj in objects],
+                    'deleted': deleted_ids,
+                    'since': since,
+                    'version': version
+                }), 200
+            # Client is ahead of the canvas or behind compacted history; fall through to a full snapshot
+        
+        version = canvas_service.get_canvas_version(canvas_id) or 0
+        etag = canvas_etag(canvas_id, version)
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            snapshot = canvas_service.get_canvas_snapshot(canvas_id, version)
+            gzip_ok = snapshot.gzipped is not None and 'gzip' in request.accept_encodings
+            response = Response(snapshot.gzipped if gzip_ok else snapshot.body,
+                                status=200, mimetype='application/json')
+            if gzip_ok:
+                response.headers['Content-Encoding'] = 'gzip'
+        
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.headers['Vary'] = 'Accept-Encoding, Authorization'
+        return response
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -1,7 +1,9 @@
 from flask import Blueprint, request, jsonify
 from flasgger import swag_from
-from app.services.canvas_service import CanvasService
+from app.services.canvas_service import CanvasService, BATCH_MAX_OPERATIONS
 from app.services.auth_service import require_auth
+from app.services.object_write_buffer import object_write_buffer
+from app.utils.merge_patch import MERGE_PATCH_MIMETYPE
 import json
 
 objects_bp = Blueprint('objects', __name__)
@@ -133,13 +135,40 @@ def create_object(current_user):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@objects_bp.route('/batch', methods=['POST'])
+@require_auth
+def batch_objects(current_user):
+    """Create, update, patch and delete many objects of one canvas in one transaction."""
+    try:
+        data = request.get_json() or {}
+        canvas_id = data.get('canvas_id')
+        operations = data.get('operations')
+        
+        if not canvas_id or not isinstance(operations, list):
+            return jsonify({'error': 'canvas_id and an operations list are required'}), 400
+        if len(operations) > BATCH_MAX_OPERATIONS:
+            return jsonify({'error': f'At most {BATCH_MAX_OPERATIONS} operations per batch'}), 400
+        
+        # Check permission once for the whole batch
+        if not canvas_service.check_canvas_permission(canvas_id, current_user.id, 'edit'):
+            return jsonify({'error': 'Edit permission required'}), 403
+        
+        object_write_buffer.flush_canvas(canvas_id)
+        version, results = canvas_service.apply_object_batch(canvas_id, operations, current_user.id)
+        return jsonify({
+            'version': version,
+            'results': results
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @objects_bp.route('/<object_id>', methods=['GET'])
 @require_auth
 def get_object(current_user, object_id):
     """Get a specific canvas object."""
     try:
-        from app.models import CanvasObject
-        canvas_object = CanvasObject.query.filter_by(id=object_id).first()
+        canvas_object = canvas_service.get_canvas_object_by_id(object_id)
         if not canvas_object:
             return jsonify({'error': 'Object not found'}), 404
         
@@ -147,6 +176,9 @@ def get_object(current_user, object_id):
         if not canvas_service.check_canvas_permission(canvas_object.canvas_id, current_user.id):
             return jsonify({'error': 'Access denied'}), 403
         
+        # Apply buffered socket updates before reading or overwriting
+        object_write_buffer.flush_canvas(canvas_object.canvas_id)
+        
         return jsonify({
             'object': canvas_object.to_dict()
         }), 200
@@ -154,13 +186,17 @@ def get_object(current_user, object_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@objects_bp.route('/<object_id>', methods=['PUT'])
+@objects_bp.route('/<object_id>', methods=['PUT', 'PATCH'])
 @require_auth
 def update_object(current_user, object_id):
-    """Update a canvas object."""
+    """Update a canvas object.
+    
+    A PATCH, a body sent as application/merge-patch+json, or a JSON body
+    with a ``patch`` key merge-patches the stored properties instead of
+    replacing them.
+    """
     try:
-        from app.models import CanvasObject
-        canvas_object = CanvasObject.query.filter_by(id=object_id).first()
+        canvas_object = canvas_service.get_canvas_object_by_id(object_id)
         if not canvas_object:
             return jsonify({'error': 'Object not found'}), 404
         
@@ -168,7 +204,27 @@ def update_object(current_user, object_id):
         if not canvas_service.check_canvas_permission(canvas_object.canvas_id, current_user.id, 'edit'):
             return jsonify({'error': 'Edit permission required'}), 403
         
-        data = request.get_json()
+        # Apply buffered socket updates before reading or overwriting
+        object_write_buffer.flush_canvas(canvas_object.canvas_id)
+        
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Request body must be a JSON object'}), 400
+        if request.method == 'PATCH' or request.mimetype == MERGE_PATCH_MIMETYPE:
+            patch = data
+        else:
+            patch = data.get('patch')
+        if patch is not None:
+            if not isinstance(patch, dict):
+                return jsonify({'error': 'Merge patch must be a JSON object'}), 400
+            updated_object = canvas_service.patch_canvas_object(object_id, patch, actor_id=current_user.id)
+            return jsonify({
+                'message': 'Object updated successfully',
+                'object': updated_object.to_dict()
+            }), 200
+        
+        # Only these columns are client-writable; ids, ownership and sequencing stay server-side
+        data = {key: data[key] for key in ('object_type', 'properties') if key in data}
         properties = data.get('properties')
         
         if properties is not None:
@@ -176,7 +232,7 @@ def update_object(current_user, object_id):
             properties_json = json.dumps(properties)
             data['properties'] = properties_json
         
-        updated_object = canvas_service.update_canvas_object(object_id, **data)
+        updated_object = canvas_service.update_canvas_object(object_id, actor_id=current_user.id, **data)
         
         return jsonify({
             'message': 'Object updated successfully',
@@ -191,8 +247,7 @@ def update_object(current_user, object_id):
 def delete_object(current_user, object_id):
     """Delete a canvas object."""
     try:
-        from app.models import CanvasObject
-        canvas_object = CanvasObject.query.filter_by(id=object_id).first()
+        canvas_object = canvas_service.get_canvas_object_by_id(object_id)
         if not canvas_object:
             return jsonify({'error': 'Object not found'}), 404
         
@@ -200,7 +255,10 @@ def delete_object(current_user, object_id):
         if not canvas_service.check_canvas_permission(canvas_object.canvas_id, current_user.id, 'edit'):
             return jsonify({'error': 'Edit permission required'}), 403
         
-        success = canvas_service.delete_canvas_object(object_id)
+        # Apply buffered socket updates before reading or overwriting
+        object_write_buffer.flush_canvas(canvas_object.canvas_id)
+        
+        success = canvas_service.delete_canvas_object(object_id, actor_id=current_user.id)
         if success:
             return jsonify({'message': 'Object deleted successfully'}), 200
         else:
@@ -1,14 +1,154 @@
 import os
 import uuid
+import time
+import hashlib
+import threading
+import tempfile
+import logging
 from app.models import User
 from app.extensions import db
+from app.utils.ttl_cache import TTLCache
+from app.utils.identity_map import get_by_id, remember
 from functools import wraps
 
+logger = logging.getLogger(__name__)
+
+# Verified tokens are cached process-wide, keyed by a SHA-256 of the raw token,
+# so repeat verifications on hot socket paths skip the signature check.
+TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE', 10000))
+TOKEN_CACHE_MAX_TTL = float(os.environ.get('TOKEN_CACHE_MAX_TTL', 3600))
+TOKEN_CACHE_NEGATIVE_TTL = float(os.environ.get('TOKEN_CACHE_NEGATIVE_TTL', 30))
+TOKEN_CACHE_CLOCK_SKEW = 5
+
+# Local RS256 verification of Firebase ID tokens against cached Google keys
+FIREBASE_LOCAL_VERIFY = os.environ.get('FIREBASE_LOCAL_VERIFY', 'true').lower() == 'true'
+FIREBASE_PUBLIC_KEYS_FILE = os.environ.get('FIREBASE_PUBLIC_KEYS_FILE')
+FIREBASE_KEYS_CACHE_PATH = os.environ.get('FIREBASE_KEYS_CACHE_PATH') or os.path.join(
+    tempfile.gettempdir(), 'collabcanvas_firebase_keys.json'
+)
+
+_token_cache = TTLCache(max_size=TOKEN_CACHE_SIZE, default_ttl=TOKEN_CACHE_MAX_TTL)
+
+class InvalidTokenError(Exception):
+    """The token itself was rejected (malformed, bad signature, expired, revoked).
+
+    Only these rejections are negatively cached; transient failures (Firebase
+    setup, certificate fetches, clock skew) are retried on the next call.
+    """
+
+def _is_definitive_rejection(error):
+    """True when error says the token is bad rather than that it could not be checked right now."""
+    import jwt
+    if isinstance(error, jwt.ImmatureSignatureError):
+        # iat/nbf/auth_time ahead of our clock: skew, the same token passes shortly
+        return False
+    if isinstance(error, jwt.InvalidTokenError):
+        return True
+    try:
+        from firebase_admin import auth as firebase_auth
+    except ImportError:
+        return False
+    if isinstance(error, firebase_auth.InvalidIdTokenError):
+        return 'used too early' not in str(error)
+    return False
+
+def _token_cache_key(id_token):
+    """Hash a raw token so the cache never holds bearer credentials."""
+    return hashlib.sha256(id_token.encode('utf-8')).hexdigest()
+
+def _token_cache_ttl(decoded_token):
+    """Seconds a decoded token may stay cached: until its own exp claim."""
+    exp = decoded_token.get('exp')
+    if exp is None:
+        return TOKEN_CACHE_MAX_TTL
+    return min(float(exp) - time.time() - TOKEN_CACHE_CLOCK_SKEW, TOKEN_CACHE_MAX_TTL)
+
 class AuthService:
     """Authentication service for Firebase integration."""
     
+    # Construction and Firebase setup counters, exposed on /metrics
+    instances_created = 0
+    firebase_init_count = 0
+    firebase_init_seconds = 0.0
+    
     def __init__(self):
-        self._initialize_firebase()
+        AuthService.instances_created += 1
+        self._mock_firebase = False
+        self._token_verifier = None
+        self._session_tokens = None
+        self._firebase_ready = False
+        self._firebase_lock = threading.Lock()
+    
+    def _ensure_firebase(self):
+        """Initialize Firebase on first use rather than at construction."""
+        if self._firebase_ready:
+            return
+        with self._firebase_lock:
+            if self._firebase_ready:
+                return
+            started = time.perf_counter()
+            self._initialize_firebase()
+            self._token_verifier = self._create_token_verifier()
+            AuthService.firebase_init_seconds += time.perf_counter() - started
+            AuthService.firebase_init_count += 1
+            self._firebase_ready = True
+    
+    def _create_token_verifier(self):
+        """Build the local ID-token verifier, if enabled and configured."""
+        project_id = os.environ.get('FIREBASE_PROJECT_ID')
+        if not FIREBASE_LOCAL_VERIFY or not project_id:
+            return None
+        # Without a static key file there is nothing to verify against in mock mode
+        if self._mock_firebase and not FIREBASE_PUBLIC_KEYS_FILE:
+            return None
+        try:
+            from app.services.firebase_token_verifier import FirebaseTokenVerifier
+            return FirebaseTokenVerifier(
+                project_id,
+                cache_path=FIREBASE_KEYS_CACHE_PATH,
+                keys_file=FIREBASE_PUBLIC_KEYS_FILE
+            )
+        except Exception as e:
+            logger.warning(f"Local token verifier unavailable, using Firebase Admin SDK: {e}")
+            return None
+    
+    @property
+    def session_tokens(self):
+        """The SessionTokenService used to issue and verify backend session tokens."""
+        if self._session_tokens is None:
+            from flask import current_app, has_app_context
+            from app.config import Config
+            from app.services.session_token_service import SessionTokenService
+            config = current_app.config if has_app_context() else {}
+            self._session_tokens = SessionTokenService.from_config(
+                config.get('SECRET_KEY') or Config.SECRET_KEY,
+                keys_spec=config.get('SESSION_TOKEN_KEYS', Config.SESSION_TOKEN_KEYS),
+                ttl=config.get('SESSION_TOKEN_TTL', Config.SESSION_TOKEN_TTL)
+            )
+        return self._session_tokens
+    
+    def issue_session_token(self, uid):
+        """Issue a short-lived backend session token for an already verified uid."""
+        return self.session_tokens.issue(uid)
+    
+    def get_token_verifier_stats(self):
+        """Return local verifier counters, or None when it is not in use."""
+        return self._token_verifier.stats() if self._token_verifier else None
+    
+    @property
+    def is_mock(self):
+        """Whether tokens are checked against the test mock instead of Firebase."""
+        self._ensure_firebase()
+        return self._mock_firebase
+    
+    @staticmethod
+    def get_init_stats():
+        """Return construction and Firebase initialization counters."""
+        return {
+            'instances_created': AuthService.instances_created,
+            'firebase_init_count': AuthService.firebase_init_count,
+            'firebase_init_seconds': round(AuthService.firebase_init_seconds, 6)
+        }
     
     def _initialize_firebase(self):
         """Initialize Firebase Admin SDK."""
@@ -87,9 +227,58 @@ class AuthService:
             self._mock_firebase = True
     
     def verify_token(self, id_token):
-        """Verify Firebase ID token."""
+        """Verify Firebase ID token, serving repeat checks from the token cache."""
+        if not id_token:
+            raise Exception('Invalid token: token is empty')
+        
+        # Backend session tokens verify with a single HMAC; no cache needed
+        if self.session_tokens.is_session_token(id_token):
+            try:
+                return self.session_tokens.verify(id_token)
+            except Exception as e:
+                raise Exception(f"Invalid token: {str(e)}")
+        
+        cache_key = _token_cache_key(id_token)
+        cached = _token_cache.get(cache_key)
+        if cached is not None:
+            is_valid, payload = cached
+            if is_valid:
+                return dict(payload)
+            raise InvalidTokenError(payload)
+        
         try:
-            if hasattr(self, '_mock_firebase') and self._mock_firebase:
+            decoded_token = self._verify_token_uncached(id_token)
+        except InvalidTokenError as e:
+            _token_cache.set(cache_key, (False, str(e)), ttl=TOKEN_CACHE_NEGATIVE_TTL)
+            raise
+        
+        _token_cache.set(cache_key, (True, decoded_token), ttl=_token_cache_ttl(decoded_token))
+        return dict(decoded_token)
+    
+    @staticmethod
+    def get_token_cache_stats():
+        """Return hit/miss counters for the verified-token cache."""
+        return _token_cache.stats()
+    
+    @staticmethod
+    def clear_token_cache():
+        """Forget every cached verification result."""
+        _token_cache.clear()
+    
+    def _verify_token_uncached(self, id_token):
+        """Verify Firebase ID token against Firebase (or the test mock).
+        
+        With the local verifier enabled, tokens are never handed to the
+        Admin SDK, whose verify_id_token fetches Google's certificates inline
+        on the request or socket thread. Only FIREBASE_LOCAL_VERIFY=false (or
+        a missing project id) takes that blocking path.
+        """
+        self._ensure_firebase()
+        try:
+            if self._token_verifier and id_token.count('.') == 2:
+                return self._token_verifier.verify(id_token)
+            
+            if self._mock_firebase:
                 # Mock token verification for testing
                 if id_token == 'valid-token':
                     return {
@@ -98,7 +287,9 @@ class AuthService:
                         'name': 'Test User'
                     }
                 else:
-                    raise Exception('Invalid token')
+                    raise InvalidTokenError('Invalid token')
+            elif self._token_verifier:
+                raise InvalidTokenError('Invalid token: not a JWT')
             else:
                 from firebase_admin import auth
                 print(f"Verifying token, length: {len(id_token)}")
@@ -106,13 +297,19 @@ class AuthService:
                 decoded_token = auth.verify_id_token(id_token)
                 print(f"Token verified successfully for user: {decoded_token.get('uid', 'unknown')}")
                 return decoded_token
+        except InvalidTokenError:
+            raise
         except Exception as e:
             print(f"Token verification failed: {str(e)}")
-            raise Exception(f"Invalid token: {str(e)}")
+            if _is_definitive_rejection(e):
+                raise InvalidTokenError(f"Invalid token: {str(e)}")
+            raise Exception(f"Token verification unavailable: {str(e)}")
     
     def register_user(self, id_token):
         """Register a new user."""
         decoded_token = self.verify_token(id_token)
+        if decoded_token.get('session'):
+            raise Exception('Session tokens cannot register users; sign in with Firebase first')
         
         print(f"=== User Registration Debug ===")
         print(f"Decoded token UID: {decoded_token['uid']}")
@@ -121,7 +318,7 @@ class AuthService:
         print(f"Decoded token picture: {decoded_token.get('picture', '')}")
         
         # Check if user already exists
-        existing_user = User.query.filter_by(id=decoded_token['uid']).first()
+        existing_user = self.get_user_by_id(decoded_token['uid'])
         print(f"Existing user found: {existing_user is not None}")
         if existing_user:
             print(f"Returning existing user: {existing_user.email}")
@@ -150,28 +347,53 @@ class AuthService:
             db.session.rollback()
             raise e
         
+        remember(user)
         return user
     
     def get_user_by_id(self, user_id):
-        """Get user by ID."""
-        return User.query.filter_by(id=user_id).first()
+        """Get user by ID (loaded at most once per request or socket event)."""
+        return get_by_id(User, user_id)
     
     def get_user_by_email(self, email):
         """Get user by email."""
         return User.query.filter_by(email=email).first()
 
+_default_auth_service = None
+_default_auth_service_lock = threading.Lock()
+
+def get_auth_service():
+    """Return the app-scoped AuthService, creating it on first use."""
+    global _default_auth_service
+    from flask import current_app, has_app_context
+    
+    if has_app_context():
+        auth_service = current_app.extensions.get('auth_service')
+        if auth_service is None:
+            with _default_auth_service_lock:
+                auth_service = current_app.extensions.get('auth_service')
+                if auth_service is None:
+                    auth_service = AuthService()
+                    current_app.extensions['auth_service'] = auth_service
+        return auth_service
+    
+    if _default_auth_service is None:
+        with _default_auth_service_lock:
+            if _default_auth_service is None:
+                _default_auth_service = AuthService()
+    return _default_auth_service
+
 def require_auth(f):
     """Decorator to require authentication."""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        from flask import request, jsonify
+        from flask import request, jsonify, after_this_request
         
         auth_header = request.headers.get('Authorization')
         if not auth_header or not auth_header.startswith('Bearer '):
             return jsonify({'error': 'Missing or invalid authorization header'}), 401
         
         id_token = auth_header.split(' ')[1]
-        auth_service = AuthService()
+        auth_service = get_auth_service()
         
         try:
             decoded_token = auth_service.verify_token(id_token)
@@ -179,6 +401,16 @@ def require_auth(f):
             if not user:
                 user = auth_service.register_user(id_token)
             
+            # Hand out a session token so later calls can skip Firebase verification
+            if not decoded_token.get('session') and auth_service.session_tokens.enabled:
+                session_token, expires_at = auth_service.issue_session_token(user.id)
+                
+                @after_this_request
+                def add_session_token(response):
+                    response.headers['X-Session-Token'] = session_token
+                    response.headers['X-Session-Token-Expires'] = str(expires_at)
+                    return response
+            
             # Add user to kwargs
             kwargs['current_user'] = user
             return f(*args, **kwargs)
@@ -1,7 +1,41 @@
+import os
 import uuid
+import json
+import base64
+import logging
+import threading
 from datetime import datetime
-from app.models import Canvas, CanvasObject, CanvasPermission, User
+from sqlalchemy import and_, or_, func, select, update
+from app.models import (
+    Canvas, CanvasObject, CanvasObjectTombstone, CanvasOperation, CanvasPermission, CanvasSnapshot, User
+)
 from app.extensions import db
+from app.utils.geometry import geometry_columns
+from app.utils.merge_patch import apply_merge_patch
+from app.utils.identity_map import get_by_id, remember, forget
+from app.services.permission_cache import permission_cache
+from app.services.snapshot_cache import snapshot_cache
+from app.services.spatial_index import spatial_indexes
+from app.services.canvas_state import canvas_states
+
+logger = logging.getLogger(__name__)
+
+CANVAS_SCOPES = ('owned', 'shared', 'public')
+CANVAS_PAGE_SIZE_DEFAULT = 50
+CANVAS_PAGE_SIZE_MAX = 200
+OBJECT_STREAM_BATCH_SIZE = 500
+# Stay well under SQLite's bound-parameter limit when loading objects by id
+OBJECT_ID_CHUNK_SIZE = 500
+OBJECT_TYPES = ('rectangle', 'circle', 'text', 'heart', 'star', 'diamond', 'line', 'arrow', 'pen', 'sticky-note')
+BATCH_OPERATIONS = ('create', 'update', 'patch', 'delete')
+BATCH_MAX_OPERATIONS = 500
+# Fold the operation log into a snapshot every N canvas versions, keeping the last OPLOG_RETAIN versions of ops
+OPLOG_COMPACT_EVERY = int(os.environ.get('OPLOG_COMPACT_EVERY', 500))
+OPLOG_RETAIN = int(os.environ.get('OPLOG_RETAIN', 1000))
+
+# Canvases whose log is being compacted in the background (one task per canvas at a time)
+_compacting = set()
+_compacting_lock = threading.Lock()
 
 class CanvasService:
     """Canvas related business logic."""
@@ -18,30 +52,68 @@ class CanvasService:
         
         db.session.add(canvas)
         db.session.commit()
+        remember(canvas)
         
         return canvas
     
     def get_canvas_by_id(self, canvas_id):
-        """Get canvas by ID."""
-        return Canvas.query.filter_by(id=canvas_id).first()
+        """Get canvas by ID (loaded at most once per request or socket event)."""
+        return get_by_id(Canvas, canvas_id)
+    
+    def _user_canvases_query(self, user_id, scopes=CANVAS_SCOPES):
+        """Single query for canvases visible to a user, newest first."""
+        conditions = []
+        if 'owned' in scopes:
+            conditions.append(Canvas.owner_id == user_id)
+        if 'shared' in scopes:
+            conditions.append(db.exists().where(and_(
+                CanvasPermission.canvas_id == Canvas.id,
+                CanvasPermission.user_id == user_id
+            )))
+        if 'public' in scopes:
+            conditions.append(Canvas.is_public.is_(True))
+        
+        return Canvas.query.filter(or_(*conditions)).order_by(
+            Canvas.updated_at.desc(), Canvas.id.desc()
+        )
     
-    def get_user_canvases(self, user_id):
-        """Get all canvases accessible to a user."""
-        # Get owned canvases
-        owned_canvases = Canvas.query.filter_by(owner_id=user_id).all()
+    @staticmethod
+    def encode_canvas_cursor(canvas):
+        """Opaque keyset cursor pointing just after canvas in listing order."""
+        position = [canvas.updated_at.isoformat(), canvas.id]
+        return base64.urlsafe_b64encode(json.dumps(position).encode('utf-8')).decode('ascii')
+    
+    @staticmethod
+    def decode_canvas_cursor(cursor):
+        """Decode a cursor from encode_canvas_cursor; raises ValueError if malformed."""
+        try:
+            updated_at, canvas_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            return datetime.fromisoformat(updated_at), str(canvas_id)
+        except Exception:
+            raise ValueError('Invalid cursor')
+    
+    def get_user_canvases_page(self, user_id, scopes=CANVAS_SCOPES, limit=CANVAS_PAGE_SIZE_DEFAULT, cursor=None):
+        """Get one page of canvases accessible to a user.
         
-        # Get canvases with permissions
-        permission_canvases = Canvas.query.join(CanvasPermission).filter(
-            CanvasPermission.user_id == user_id
-        ).all()
+        Returns (canvases, next_cursor); next_cursor is None on the last page.
+        """
+        limit = max(1, min(int(limit), CANVAS_PAGE_SIZE_MAX))
+        query = self._user_canvases_query(user_id, scopes)
         
-        # Get public canvases
-        public_canvases = Canvas.query.filter_by(is_public=True).all()
+        if cursor:
+            updated_at, canvas_id = self.decode_canvas_cursor(cursor)
+            query = query.filter(or_(
+                Canvas.updated_at < updated_at,
+                and_(Canvas.updated_at == updated_at, Canvas.id < canvas_id)
+            ))
         
-        # Combine and deduplicate
-        all_canvases = list(set(owned_canvases + permission_canvases + public_canvases))
+        canvases = query.limit(limit + 1).all()
+        next_cursor = None
+        if len(canvases) > limit:
+            canvases = canvases[:limit]
+            next_cursor = self.encode_canvas_cursor(canvases[-1])
         
-        return all_canvases
+        return canvases, next_cursor
     
     def update_canvas(self, canvas_id, **kwargs):
         """Update canvas properties."""
@@ -55,6 +127,7 @@ class CanvasService:
         
         canvas.updated_at = datetime.utcnow()
         db.session.commit()
+        permission_cache.invalidate(canvas_id)
         
         return canvas
     
@@ -66,41 +139,108 @@ class CanvasService:
         
         db.session.delete(canvas)
         db.session.commit()
+        forget(Canvas, canvas_id)
+        permission_cache.invalidate(canvas_id)
+        snapshot_cache.invalidate(canvas_id)
+        spatial_indexes.invalidate(canvas_id)
+        canvas_states.discard(canvas_id)
         
         return True
     
-    def check_canvas_permission(self, canvas_id, user_id, permission_type='view'):
-        """Check if user has permission on canvas."""
-        print(f"=== Permission Check Debug ===")
-        print(f"Canvas ID: {canvas_id}")
-        print(f"User ID: {user_id}")
-        print(f"Permission type: {permission_type}")
+    @staticmethod
+    def adjust_canvas_counters(canvas_id, objects=0, collaborators=0):
+        """Apply counter deltas to a canvas row in the caller's transaction."""
+        db.session.query(Canvas).filter(Canvas.id == canvas_id).update({
+            Canvas.object_count: Canvas.object_count + objects,
+            Canvas.collaborator_count: Canvas.collaborator_count + collaborators,
+            # Counter bumps are not user edits; keep listing order stable
+            Canvas.updated_at: Canvas.updated_at
+        }, synchronize_session=False)
+    
+    @staticmethod
+    def bump_canvas_version(canvas_id, objects=0):
+        """Record an object mutation on the canvas row in the caller's transaction.
         
-        canvas = self.get_canvas_by_id(canvas_id)
-        if not canvas:
-            print("Canvas not found in permission check")
-            return False
+        Increments the canvas version (and object_count by objects) and
+        returns the new version.
+        """
+        stmt = update(Canvas).where(Canvas.id == canvas_id).values(
+            version=Canvas.version + 1,
+            object_count=Canvas.object_count + objects,
+            updated_at=Canvas.updated_at
+        ).execution_options(synchronize_session=False)
+        
+        if db.engine.dialect.update_returning:
+            return db.session.execute(stmt.returning(Canvas.version)).scalar()
+        db.session.execute(stmt)
+        return db.session.query(Canvas.version).filter(Canvas.id == canvas_id).scalar()
+    
+    def get_canvas_version(self, canvas_id):
+        """Current object version of a canvas (None if it does not exist)."""
+        return db.session.query(Canvas.version).filter(Canvas.id == canvas_id).scalar()
+    
+    def repair_canvas_counters(self):
+        """Recompute drifted object/collaborator counters in bulk; returns rows fixed."""
+        object_count = select(func.count(CanvasObject.id)).where(
+            CanvasObject.canvas_id == Canvas.id
+        ).scalar_subquery()
+        collaborator_count = select(func.count(CanvasPermission.id)).where(
+            CanvasPermission.canvas_id == Canvas.id
+        ).scalar_subquery()
         
-        print(f"Canvas owner ID: {canvas.owner_id}")
-        print(f"Canvas is public: {canvas.is_public}")
+        result = db.session.query(Canvas).filter(or_(
+            Canvas.object_count != object_count,
+            Canvas.collaborator_count != collaborator_count
+        )).update({
+            Canvas.object_count: object_count,
+            Canvas.collaborator_count: collaborator_count,
+            Canvas.updated_at: Canvas.updated_at
+        }, synchronize_session=False)
+        db.session.commit()
+        
+        return result
+    
+    def check_canvas_permission(self, canvas_id, user_id, permission_type='view'):
+        """Check if user has permission on canvas."""
+        access = permission_cache.get(canvas_id, user_id)
+        if access is None:
+            # Taken before the read so an invalidation landing meanwhile discards the result
+            generation = permission_cache.generation(canvas_id, user_id)
+            access = self._load_canvas_access(canvas_id, user_id)
+            if access is None:
+                return False
+            permission_cache.set(canvas_id, user_id, access, generation)
         
         # Owner has all permissions
-        if canvas.owner_id == user_id:
-            print("User is owner - permission granted")
+        if access['owner']:
             return True
         
         # Check if canvas is public (view permission only)
-        if canvas.is_public and permission_type == 'view':
+        if access['public'] and permission_type == 'view':
             return True
         
         # Check explicit permissions
-        permission = CanvasPermission.query.filter_by(
-            canvas_id=canvas_id,
-            user_id=user_id,
-            permission_type=permission_type
-        ).first()
+        return access['permission'] == permission_type
+    
+    def _load_canvas_access(self, canvas_id, user_id):
+        """Load what check_canvas_permission needs to decide for this user."""
+        canvas = self.get_canvas_by_id(canvas_id)
+        if not canvas:
+            return None
+        
+        access = {
+            'owner': canvas.owner_id == user_id,
+            'public': bool(canvas.is_public),
+            'permission': None
+        }
+        if not access['owner']:
+            permission = CanvasPermission.query.filter_by(
+                canvas_id=canvas_id,
+                user_id=user_id
+            ).first()
+            access['permission'] = permission.permission_type if permission else None
         
-        return permission is not None
+        return access
     
     def create_canvas_object(self, canvas_id, object_type, properties, created_by):
         """Create a new canvas object."""
@@ -109,11 +249,21 @@ class CanvasService:
             canvas_id=canvas_id,
             object_type=object_type,
             properties=properties,
-            created_by=created_by
+            created_by=created_by,
+            change_seq=self.bump_canvas_version(canvas_id, objects=1)
         )
+        canvas_object.refresh_geometry()
         
         db.session.add(canvas_object)
+        db.session.flush()
+        self._log_operation(canvas_id, canvas_object.change_seq, 'create', canvas_object.id,
+                            canvas_object.to_dict(), created_by)
         db.session.commit()
+        remember(canvas_object)
+        spatial_indexes.record_write(canvas_id, canvas_object.change_seq, canvas_object.id,
+                                     canvas_object.get_bounds())
+        canvas_states.record_commit(canvas_id, canvas_object.change_seq, [canvas_object])
+        self._maybe_compact(canvas_id, canvas_object.change_seq)
         
         return canvas_object
     
@@ -121,9 +271,136 @@ class CanvasService:
         """Get all objects for a canvas."""
         return CanvasObject.query.filter_by(canvas_id=canvas_id).all()
     
-    def update_canvas_object(self, object_id, **kwargs):
+    def iter_canvas_objects(self, canvas_id, batch_size=OBJECT_STREAM_BATCH_SIZE):
+        """Yield a canvas's objects in batches without materializing the full list."""
+        query = CanvasObject.query.filter_by(canvas_id=canvas_id).order_by(CanvasObject.change_seq, CanvasObject.id)
+        return query.yield_per(batch_size)
+    
+    def get_canvas_objects_in_region(self, canvas_id, bbox):
+        """Objects whose stored bounds intersect bbox (plus objects of unknown extent), in SQL."""
+        x0, y0, x1, y1 = bbox
+        return CanvasObject.query.filter(
+            CanvasObject.canvas_id == canvas_id,
+            or_(
+                CanvasObject.min_x.is_(None),
+                and_(
+                    CanvasObject.min_x <= x1,
+                    CanvasObject.max_x >= x0,
+                    CanvasObject.min_y <= y1,
+                    CanvasObject.max_y >= y0
+                )
+            )
+        ).order_by(CanvasObject.change_seq, CanvasObject.id).all()
+    
+    def get_canvas_objects_in_bbox(self, canvas_id, bbox):
+        """Objects whose bounds intersect bbox.
+        
+        Large canvases are answered from an in-memory grid index, (re)built
+        from the geometry columns when missing or behind the canvas version;
+        smaller ones go straight to the SQL region query. Returns
+        (version, objects).
+        """
+        version, object_count = db.session.query(Canvas.version, Canvas.object_count).filter(
+            Canvas.id == canvas_id
+        ).first() or (0, 0)
+        object_ids = spatial_indexes.query(canvas_id, version, bbox)
+        if object_ids is None:
+            if object_count < spatial_indexes.min_objects:
+                return version, self.get_canvas_objects_in_region(canvas_id, bbox)
+            rows = db.session.query(
+                CanvasObject.id, CanvasObject.min_x, CanvasObject.min_y, CanvasObject.max_x, CanvasObject.max_y
+            ).filter(CanvasObject.canvas_id == canvas_id)
+            object_ids = spatial_indexes.build(canvas_id, version, rows).query(bbox)
+        
+        object_ids = sorted(object_ids)
+        objects = []
+        for start in range(0, len(object_ids), OBJECT_ID_CHUNK_SIZE):
+            objects.extend(CanvasObject.query.filter(
+                CanvasObject.id.in_(object_ids[start:start + OBJECT_ID_CHUNK_SIZE])
+            ).all())
+        objects.sort(key=lambda obj: (obj.change_seq, obj.id))
+        return version, objects
+    
+    def get_canvas_extents(self, canvas_id):
+        """Bounding box of every object with a known extent ("zoom to fit"), or None."""
+        min_x, min_y, max_x, max_y = db.session.query(
+            func.min(CanvasObject.min_x), func.min(CanvasObject.min_y),
+            func.max(CanvasObject.max_x), func.max(CanvasObject.max_y)
+        ).filter(CanvasObject.canvas_id == canvas_id).one()
+        if min_x is None:
+            return None
+        return {'min_x': min_x, 'min_y': min_y, 'max_x': max_x, 'max_y': max_y}
+    
+    def backfill_object_geometry(self, batch_size=500):
+        """Recompute geometry columns for every object in id-ordered batches; returns objects updated."""
+        updated = 0
+        last_id = ''
+        while True:
+            rows = db.session.query(
+                CanvasObject.id, CanvasObject.object_type, CanvasObject.properties, CanvasObject.updated_at
+            ).filter(CanvasObject.id > last_id).order_by(CanvasObject.id).limit(batch_size).all()
+            if not rows:
+                return updated
+            
+            params = []
+            for object_id, object_type, properties, updated_at in rows:
+                try:
+                    props = json.loads(properties)
+                except (json.JSONDecodeError, TypeError):
+                    props = {}
+                # Geometry is derived data; keep updated_at as it was
+                params.append({'id': object_id, 'updated_at': updated_at, **geometry_columns(object_type, props)})
+            db.session.execute(update(CanvasObject), params)
+            db.session.commit()
+            updated += len(rows)
+            last_id = rows[-1].id
+    
+    def get_canvas_snapshot(self, canvas_id, version=None):
+        """Serialized object list of a canvas, rebuilt only when its version changes."""
+        if version is None:
+            version = self.get_canvas_version(canvas_id) or 0
+        snapshot = snapshot_cache.get(canvas_id, version)
+        if snapshot is None:
+            _, objects = self.load_canvas_state(canvas_id)
+            snapshot = snapshot_cache.build(canvas_id, version, {
+                'objects': objects,
+                'version': version
+            })
+        return snapshot
+    
+    def get_canvas_changes(self, canvas_id, since):
+        """Objects written and ids deleted after canvas version since.
+        
+        Returns (version, objects, deleted_ids), or None when only a full
+        snapshot is safe: since is ahead of the canvas (e.g. a client from
+        before a restore), or older than the history compaction kept, whose
+        delete tombstones are gone.
+        """
+        version = self.get_canvas_version(canvas_id) or 0
+        if since > version:
+            return None
+        if since == version:
+            return version, [], []
+        if since < self._compacted_floor(canvas_id):
+            return None
+        
+        objects = CanvasObject.query.filter(
+            CanvasObject.canvas_id == canvas_id,
+            CanvasObject.change_seq > since
+        ).order_by(CanvasObject.change_seq).all()
+        deleted_ids = [row.object_id for row in db.session.query(CanvasObjectTombstone.object_id).filter(
+            CanvasObjectTombstone.canvas_id == canvas_id,
+            CanvasObjectTombstone.change_seq > since
+        )]
+        return version, objects, deleted_ids
+    
+    def get_canvas_object_by_id(self, object_id):
+        """Get canvas object by ID (loaded at most once per request or socket event)."""
+        return get_by_id(CanvasObject, object_id)
+    
+    def update_canvas_object(self, object_id, actor_id=None, **kwargs):
         """Update canvas object properties."""
-        canvas_object = CanvasObject.query.filter_by(id=object_id).first()
+        canvas_object = self.get_canvas_object_by_id(object_id)
         if not canvas_object:
             return None
         
@@ -131,18 +408,348 @@ class CanvasService:
             if hasattr(canvas_object, key):
                 setattr(canvas_object, key, value)
         
+        canvas_object.refresh_geometry()
+        canvas_object.change_seq = self.bump_canvas_version(canvas_object.canvas_id)
+        # Set after the bump's autoflush so the final UPDATE carries it instead of onupdate
+        canvas_object.updated_at = datetime.utcnow()
+        self._log_operation(canvas_object.canvas_id, canvas_object.change_seq, 'update', object_id,
+                            canvas_object.to_dict(), actor_id)
+        db.session.commit()
+        spatial_indexes.record_write(canvas_object.canvas_id, canvas_object.change_seq, object_id,
+                                     canvas_object.get_bounds())
+        canvas_states.record_commit(canvas_object.canvas_id, canvas_object.change_seq, [canvas_object])
+        self._maybe_compact(canvas_object.canvas_id, canvas_object.change_seq)
+        
+        return canvas_object
+    
+    def patch_canvas_object(self, object_id, patch, actor_id=None):
+        """Merge-patch (RFC 7386) an object's properties; returns the object or None.
+        
+        The row is re-read under a row lock so concurrent patches to the same
+        object compose instead of overwriting each other.
+        """
+        canvas_object = CanvasObject.query.filter_by(id=object_id).populate_existing().with_for_update().first()
+        if not canvas_object:
+            return None
+        
+        canvas_object.set_properties(apply_merge_patch(canvas_object.get_properties(), patch))
+        canvas_object.refresh_geometry()
+        canvas_object.change_seq = self.bump_canvas_version(canvas_object.canvas_id)
+        # Set after the bump's autoflush so the final UPDATE carries it instead of onupdate
         canvas_object.updated_at = datetime.utcnow()
+        self._log_operation(canvas_object.canvas_id, canvas_object.change_seq, 'patch', object_id,
+                            {'patch': patch, 'updated_at': canvas_object.updated_at.isoformat()}, actor_id)
         db.session.commit()
+        spatial_indexes.record_write(canvas_object.canvas_id, canvas_object.change_seq, object_id,
+                                     canvas_object.get_bounds())
+        canvas_states.record_commit(canvas_object.canvas_id, canvas_object.change_seq, [canvas_object])
+        self._maybe_compact(canvas_object.canvas_id, canvas_object.change_seq)
         
         return canvas_object
     
-    def delete_canvas_object(self, object_id):
+    def delete_canvas_object(self, object_id, actor_id=None):
         """Delete a canvas object."""
-        canvas_object = CanvasObject.query.filter_by(id=object_id).first()
+        canvas_object = self.get_canvas_object_by_id(object_id)
         if not canvas_object:
             return False
         
+        version = self.bump_canvas_version(canvas_object.canvas_id, objects=-1)
         db.session.delete(canvas_object)
+        db.session.add(CanvasObjectTombstone(
+            object_id=object_id,
+            canvas_id=canvas_object.canvas_id,
+            change_seq=version
+        ))
+        self._log_operation(canvas_object.canvas_id, version, 'delete', object_id, actor_id=actor_id)
         db.session.commit()
+        spatial_indexes.record_write(canvas_object.canvas_id, version, object_id, deleted=True)
+        canvas_states.record_commit(canvas_object.canvas_id, version, deleted_ids=[object_id])
+        forget(CanvasObject, object_id)
+        self._maybe_compact(canvas_object.canvas_id, version)
         
         return True
+    
+    def apply_object_batch(self, canvas_id, operations, user_id, actors=None):
+        """Create, update, patch and delete many objects of one canvas in a single transaction.
+        
+        Each operation runs in its own savepoint, so a failing item is rolled
+        back and reported without affecting the others. All successful items
+        share one canvas version bump. Returns (version, results) where
+        results holds one entry per operation, in order. ``actors``, parallel
+        to operations, names the author logged for each one when they differ
+        (buffered socket edits); otherwise user_id is logged.
+        """
+        results = []
+        written = {}
+        deleted_ids = []
+        created = 0
+        
+        for index, operation in enumerate(operations):
+            entry = {'index': index, 'ref': operation.get('ref') if isinstance(operation, dict) else None}
+            results.append(entry)
+            try:
+                with db.session.begin_nested():
+                    op, canvas_object = self._apply_batch_operation(canvas_id, operation, user_id)
+            except Exception as e:
+                entry.update({'ok': False, 'error': str(e)})
+                continue
+            
+            entry.update({'ok': True, 'op': op, 'object_id': canvas_object.id})
+            if op == 'delete':
+                written.pop(canvas_object.id, None)
+                deleted_ids.append(canvas_object.id)
+            else:
+                written[canvas_object.id] = canvas_object
+                if op == 'patch':
+                    entry['patch'] = operation['patch']
+                created += op == 'create'
+        
+        if not written and not deleted_ids:
+            db.session.rollback()
+            return self.get_canvas_version(canvas_id) or 0, results
+        
+        version = self.bump_canvas_version(canvas_id, objects=created - len(deleted_ids))
+        now = datetime.utcnow()
+        for canvas_object in written.values():
+            canvas_object.change_seq = version
+            canvas_object.updated_at = now
+        for object_id in deleted_ids:
+            db.session.add(CanvasObjectTombstone(object_id=object_id, canvas_id=canvas_id, change_seq=version))
+        for entry in results:
+            if not entry.get('ok'):
+                continue
+            actor_id = actors[entry['index']] if actors else user_id
+            if entry['op'] == 'delete':
+                self._log_operation(canvas_id, version, 'delete', entry['object_id'], actor_id=actor_id)
+            elif entry['op'] == 'patch':
+                self._log_operation(canvas_id, version, 'patch', entry['object_id'],
+                                    {'patch': entry['patch'], 'updated_at': now.isoformat()}, actor_id)
+            elif entry['object_id'] in written:
+                # Created/updated objects are logged in their final state; later patches in
+                # the same batch replay idempotently on top of it
+                self._log_operation(canvas_id, version, entry['op'], entry['object_id'],
+                                    written[entry['object_id']].to_dict(), actor_id)
+        db.session.commit()
+        
+        for object_id in deleted_ids:
+            forget(CanvasObject, object_id)
+        spatial_indexes.record_writes(canvas_id, version, [
+            (canvas_object.id, canvas_object.get_bounds(), False) for canvas_object in written.values()
+        ] + [(object_id, None, True) for object_id in deleted_ids])
+        canvas_states.record_commit(canvas_id, version, written.values(), deleted_ids)
+        
+        self._maybe_compact(canvas_id, version)
+        
+        for entry in results:
+            if entry.get('ok') and entry['op'] in ('create', 'update') and entry['object_id'] in written:
+                entry['object'] = written[entry['object_id']].to_dict()
+        return version, results
+    
+    def _apply_batch_operation(self, canvas_id, operation, user_id):
+        """Apply one batch item inside the caller's savepoint; raises ValueError on bad input."""
+        if not isinstance(operation, dict):
+            raise ValueError('Operation must be an object')
+        op = operation.get('op')
+        if op not in BATCH_OPERATIONS:
+            raise ValueError(f"op must be one of: {', '.join(BATCH_OPERATIONS)}")
+        
+        if op == 'create':
+            object_type = operation.get('type')
+            properties = operation.get('properties', {})
+            if object_type not in OBJECT_TYPES:
+                raise ValueError(f'Invalid object type: {object_type}')
+            if not isinstance(properties, dict):
+                raise ValueError('properties must be an object')
+            canvas_object = CanvasObject(
+                id=str(uuid.uuid4()),
+                canvas_id=canvas_id,
+                object_type=object_type,
+                properties=json.dumps(properties),
+                created_by=user_id
+            )
+            canvas_object.refresh_geometry()
+            db.session.add(canvas_object)
+            db.session.flush()
+            remember(canvas_object)
+            return op, canvas_object
+        
+        canvas_object = CanvasObject.query.filter_by(
+            id=operation.get('id'), canvas_id=canvas_id
+        ).populate_existing().with_for_update().first()
+        if not canvas_object:
+            raise ValueError('Object not found')
+        
+        if op == 'delete':
+            db.session.delete(canvas_object)
+        else:
+            document = operation.get('properties' if op == 'update' else 'patch')
+            if not isinstance(document, dict):
+                raise ValueError(f"{'properties' if op == 'update' else 'patch'} must be an object")
+            if op == 'patch':
+                document = apply_merge_patch(canvas_object.get_properties(), document)
+            canvas_object.set_properties(document)
+            canvas_object.refresh_geometry()
+        db.session.flush()
+        return op, canvas_object
+    
+    @staticmethod
+    def _log_operation(canvas_id, seq, op, object_id, payload=None, actor_id=None):
+        """Append an object operation to the canvas log in the caller's transaction."""
+        db.session.add(CanvasOperation(
+            canvas_id=canvas_id,
+            seq=seq,
+            op=op,
+            object_id=object_id,
+            payload=json.dumps(payload) if payload is not None else None,
+            actor_id=actor_id
+        ))
+    
+    def _maybe_compact(self, canvas_id, version):
+        """Compact the log every OPLOG_COMPACT_EVERY versions (after the write has committed).
+        
+        Compaction reads and serializes every object of the canvas, so it
+        runs as a background task instead of on the writer's request or
+        socket thread.
+        """
+        if OPLOG_COMPACT_EVERY <= 0 or version % OPLOG_COMPACT_EVERY:
+            return
+        with _compacting_lock:
+            if canvas_id in _compacting:
+                return
+            _compacting.add(canvas_id)
+        try:
+            from flask import current_app
+            from app.extensions import socketio
+            socketio.start_background_task(
+                self._compact_in_background, current_app._get_current_object(), canvas_id
+            )
+        except Exception as e:
+            with _compacting_lock:
+                _compacting.discard(canvas_id)
+            logger.error(f"Could not schedule operation log compaction for canvas {canvas_id}: {e}")
+    
+    def _compact_in_background(self, app, canvas_id):
+        # A fresh app context gives the task its own database session
+        try:
+            with app.app_context():
+                try:
+                    self.compact_canvas_log(canvas_id)
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Operation log compaction for canvas {canvas_id} failed: {e}")
+        finally:
+            with _compacting_lock:
+                _compacting.discard(canvas_id)
+    
+    def _compacted_floor(self, canvas_id):
+        """Oldest version clients can catch up from: operations and tombstones before it were compacted away."""
+        if db.session.get(CanvasSnapshot, canvas_id) is None:
+            return 0
+        oldest = db.session.query(func.min(CanvasOperation.seq)).filter(
+            CanvasOperation.canvas_id == canvas_id
+        ).scalar()
+        # Compaction prunes operations and tombstones at the same cutoff
+        return oldest - 1 if oldest is not None else self.get_canvas_version(canvas_id) or 0
+    
+    def compact_canvas_log(self, canvas_id, retain=None):
+        """Fold the log into a compressed snapshot of the canvas at its current version.
+        
+        The canvas row is locked so no write lands between reading the
+        version and reading the objects. Operations and delete tombstones
+        older than the last ``retain`` versions are dropped; newer ones stay
+        for catch-up. Returns the snapshot, or None if the canvas does not
+        exist.
+        """
+        retain = OPLOG_RETAIN if retain is None else retain
+        canvas = Canvas.query.filter_by(id=canvas_id).with_for_update().first()
+        if not canvas:
+            db.session.rollback()
+            return None
+        
+        objects = [obj.to_dict() for obj in CanvasObject.query.filter_by(canvas_id=canvas_id).order_by(
+            CanvasObject.change_seq, CanvasObject.id
+        )]
+        snapshot = db.session.get(CanvasSnapshot, canvas_id) or CanvasSnapshot(canvas_id=canvas_id)
+        snapshot.seq = canvas.version
+        snapshot.set_objects(objects)
+        snapshot.created_at = datetime.utcnow()
+        db.session.add(snapshot)
+        
+        CanvasOperation.query.filter(
+            CanvasOperation.canvas_id == canvas_id,
+            CanvasOperation.seq <= canvas.version - retain
+        ).delete(synchronize_session=False)
+        CanvasObjectTombstone.query.filter(
+            CanvasObjectTombstone.canvas_id == canvas_id,
+            CanvasObjectTombstone.change_seq <= canvas.version - retain
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        
+        return snapshot
+    
+    def compact_all_canvas_logs(self, retain=None):
+        """Compact every canvas that has logged operations; returns the number compacted."""
+        canvas_ids = [row[0] for row in db.session.query(CanvasOperation.canvas_id).distinct()]
+        return sum(1 for canvas_id in canvas_ids if self.compact_canvas_log(canvas_id, retain) is not None)
+    
+    @staticmethod
+    def replay_operations(state, operations):
+        """Apply logged operations, in order, to a {object_id: object dict} state."""
+        for operation in operations:
+            payload = operation.get_payload()
+            if operation.op == 'delete':
+                state.pop(operation.object_id, None)
+            elif operation.op == 'patch':
+                current = state.get(operation.object_id)
+                if current is None or payload is None:
+                    continue
+                state[operation.object_id] = dict(
+                    current,
+                    properties=apply_merge_patch(current.get('properties'), payload['patch']),
+                    updated_at=payload.get('updated_at'),
+                    change_seq=operation.seq
+                )
+            elif payload is not None:
+                state[operation.object_id] = payload
+        return state
+    
+    def load_canvas_state(self, canvas_id):
+        """Current objects of a canvas as dicts: its snapshot plus the log tail, or a row scan without one.
+        
+        Returns (version, objects).
+        """
+        snapshot = db.session.get(CanvasSnapshot, canvas_id)
+        if snapshot is None:
+            version = self.get_canvas_version(canvas_id) or 0
+            return version, [obj.to_dict() for obj in self.get_canvas_objects(canvas_id)]
+        
+        tail = CanvasOperation.query.filter(
+            CanvasOperation.canvas_id == canvas_id,
+            CanvasOperation.seq > snapshot.seq
+        ).order_by(CanvasOperation.seq, CanvasOperation.id).all()
+        state = self.replay_operations({obj['id']: obj for obj in snapshot.get_objects()}, tail)
+        version = tail[-1].seq if tail else snapshot.seq
+        return version, sorted(state.values(), key=lambda obj: (obj.get('change_seq') or 0, obj['id']))
+    
+    def get_canvas_operations(self, canvas_id, since):
+        """Logged operations after canvas version since, oldest first.
+        
+        Returns (version, operations), or None when operations right after
+        since are no longer in the log (compacted, or from before it existed).
+        """
+        version = self.get_canvas_version(canvas_id) or 0
+        if since >= version:
+            return version, []
+        
+        oldest = db.session.query(func.min(CanvasOperation.seq)).filter(
+            CanvasOperation.canvas_id == canvas_id
+        ).scalar()
+        # Every version bump logs at least one operation, so the log is contiguous from its oldest seq
+        if oldest is None or since < oldest - 1:
+            return None
+        
+        operations = CanvasOperation.query.filter(
+            CanvasOperation.canvas_id == canvas_id,
+            CanvasOperation.seq > since
+        ).order_by(CanvasOperation.seq, CanvasOperation.id).all()
+        return version, operations
@@ -0,0 +1,198 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+import logging
+
+from app.services.object_write_buffer import object_write_buffer
+
+logger = logging.getLogger(__name__)
+
+CANVAS_STATE_MAX_BYTES = int(os.environ.get('CANVAS_STATE_MAX_BYTES', 64 * 1024 * 1024))
+CANVAS_STATE_MAX_CANVASES = int(os.environ.get('CANVAS_STATE_MAX_CANVASES', 256))
+
+def _object_size(object_dict: Dict) -> int:
+    return len(json.dumps(object_dict, separators=(',', ':')))
+
+class CanvasState:
+    """Objects of one active canvas held in memory, as CanvasObject.to_dict() dicts.
+
+    ``version`` is the last committed canvas version seen by this node;
+    buffered socket edits are applied to the objects straight away and only
+    reach the version once the write buffer flushes them.
+    """
+
+    __slots__ = ('canvas_id', 'version', 'objects', 'sizes', 'size', 'active', 'last_used')
+
+    def __init__(self, canvas_id: str, version: int, objects: Iterable[Dict]):
+        self.canvas_id = canvas_id
+        self.version = version
+        self.objects: Dict[str, Dict] = {}
+        self.sizes: Dict[str, int] = {}
+        self.size = 0
+        self.active = True
+        self.last_used = time.monotonic()
+        for object_dict in objects:
+            self.put(object_dict)
+
+    def put(self, object_dict: Dict) -> None:
+        object_id = object_dict['id']
+        size = _object_size(object_dict)
+        self.size += size - self.sizes.get(object_id, 0)
+        self.sizes[object_id] = size
+        self.objects[object_id] = object_dict
+
+    def remove(self, object_id: str) -> None:
+        self.size -= self.sizes.pop(object_id, 0)
+        self.objects.pop(object_id, None)
+
+    def to_list(self) -> List[Dict]:
+        return sorted(self.objects.values(), key=lambda obj: (obj.get('change_seq') or 0, obj['id']))
+
+class CanvasStateManager:
+    """In-process registry of hot canvas states for the rooms served by this node.
+
+    A canvas is loaded (snapshot plus operation log) on the first join and
+    kept current by socket edits and by every committed object write on this
+    node. When its room empties the canvas's buffered writes are flushed
+    and the state becomes idle; idle states are evicted least recently used
+    first once the memory budget or canvas limit is exceeded. Active states
+    are never evicted. A committed write that does not directly follow the
+    state's version (a write on another node) drops the state so the next
+    join reloads it.
+    """
+
+    def __init__(self, max_bytes: int = CANVAS_STATE_MAX_BYTES, max_canvases: int = CANVAS_STATE_MAX_CANVASES):
+        self.max_bytes = max_bytes
+        self.max_canvases = max_canvases
+        self._states: 'OrderedDict[str, CanvasState]' = OrderedDict()
+        self._lock = threading.RLock()
+        self.loads = 0
+        self.hits = 0
+        self.evictions = 0
+        self.gaps = 0
+
+    def acquire(self, canvas_id: str) -> CanvasState:
+        """Return the canvas's state, loading it if needed, and mark it active."""
+        with self._lock:
+            state = self._states.get(canvas_id)
+            if state is not None:
+                self.hits += 1
+                state.active = True
+                state.last_used = time.monotonic()
+                self._states.move_to_end(canvas_id)
+                return state
+
+        from app.services.canvas_service import CanvasService
+        # Load what the database holds once every buffered edit is in it
+        object_write_buffer.flush_canvas(canvas_id)
+        version, objects = CanvasService().load_canvas_state(canvas_id)
+        with self._lock:
+            state = self._states.get(canvas_id)
+            if state is None or state.version < version:
+                state = self._states[canvas_id] = CanvasState(canvas_id, version, objects)
+                self.loads += 1
+            state.active = True
+            self._states.move_to_end(canvas_id)
+            self._evict()
+            return state
+
+    def get(self, canvas_id: str) -> Optional[CanvasState]:
+        with self._lock:
+            return self._states.get(canvas_id)
+
+    def get_object(self, canvas_id: str, object_id: str) -> Optional[Dict]:
+        with self._lock:
+            state = self._states.get(canvas_id)
+            return state.objects.get(object_id) if state is not None else None
+
+    def snapshot(self, canvas_id: str) -> Optional[Dict]:
+        """{version, objects} of a loaded canvas, including edits still waiting in the write buffer."""
+        with self._lock:
+            state = self._states.get(canvas_id)
+            if state is None:
+                return None
+            state.last_used = time.monotonic()
+            return {'version': state.version, 'objects': state.to_list()}
+
+    def apply(self, canvas_id: str, object_dict: Dict) -> None:
+        """Apply a buffered (not yet committed) edit. Enqueue it in the write buffer first."""
+        with self._lock:
+            state = self._states.get(canvas_id)
+            if state is not None and object_dict['id'] in state.objects:
+                state.put(object_dict)
+                state.last_used = time.monotonic()
+
+    def record_commit(self, canvas_id: str, version: int, objects: Iterable = (),
+                      deleted_ids: Iterable[str] = ()) -> None:
+        """Apply CanvasObjects written (and object ids deleted) by the commit that produced version."""
+        with self._lock:
+            state = self._states.get(canvas_id)
+            if state is None:
+                return
+            if state.version != version - 1:
+                self.gaps += 1
+                del self._states[canvas_id]
+                return
+            for canvas_object in objects:
+                # A newer edit is still buffered (and already applied here); keep it
+                if object_write_buffer.get(canvas_id, canvas_object.id) is None:
+                    state.put(canvas_object.to_dict())
+            for object_id in deleted_ids:
+                state.remove(object_id)
+            state.version = version
+            self._evict()
+
+    def release(self, canvas_id: str) -> None:
+        """The canvas room emptied: flush its buffered writes and let the state be evicted."""
+        object_write_buffer.flush_canvas(canvas_id)
+        with self._lock:
+            state = self._states.get(canvas_id)
+            if state is not None:
+                state.active = False
+            self._evict()
+
+    def discard(self, canvas_id: str) -> None:
+        with self._lock:
+            self._states.pop(canvas_id, None)
+
+    def _evict(self) -> None:
+        total = sum(state.size for state in self._states.values())
+        for canvas_id in list(self._states):
+            if total <= self.max_bytes and len(self._states) <= self.max_canvases:
+                return
+            state = self._states[canvas_id]
+            if state.active:
+                continue
+            # Never flush here: a flush commits through record_commit, which takes this lock.
+            # Writes buffered since release stay queued and are flushed before any reload.
+            del self._states[canvas_id]
+            total -= state.size
+            self.evictions += 1
+            logger.debug(f"Evicted idle canvas state {canvas_id}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._states.clear()
+            self.loads = 0
+            self.hits = 0
+            self.evictions = 0
+            self.gaps = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'canvases': len(self._states),
+                'active': sum(1 for state in self._states.values() if state.active),
+                'objects': sum(len(state.objects) for state in self._states.values()),
+                'bytes': sum(state.size for state in self._states.values()),
+                'max_bytes': self.max_bytes,
+                'loads': self.loads,
+                'hits': self.hits,
+                'evictions': self.evictions,
+                'gaps': self.gaps
+            }
+
+canvas_states = CanvasStateManager()
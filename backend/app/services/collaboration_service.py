@@ -2,16 +2,22 @@ import uuid
 from datetime import datetime, timedelta
 from app.models import CanvasPermission, Invitation, User, Canvas
 from app.extensions import db
-from app.services.auth_service import AuthService
+from app.utils.identity_map import get_by_id
+from app.services.permission_cache import permission_cache
+from app.services.canvas_service import CanvasService
+from app.services.auth_service import get_auth_service
 from app.services.email_service import EmailService
 
 class CollaborationService:
     """Collaboration related business logic."""
     
     def __init__(self):
-        self.auth_service = AuthService()
         self.email_service = EmailService()
     
+    @property
+    def auth_service(self):
+        return get_auth_service()
+    
     def invite_user_to_canvas(self, canvas_id, inviter_id, invitee_email, permission_type='view', invitation_message=''):
         """Invite a user to collaborate on a canvas."""
         # Check if invitation already exists
@@ -25,8 +31,8 @@ class CollaborationService:
             return existing_invitation
         
         # Get canvas and inviter information
-        canvas = Canvas.query.filter_by(id=canvas_id).first()
-        inviter = User.query.filter_by(id=inviter_id).first()
+        canvas = get_by_id(Canvas, canvas_id)
+        inviter = get_by_id(User, inviter_id)
         
         if not canvas or not inviter:
             raise ValueError("Canvas or inviter not found")
@@ -67,7 +73,7 @@ class CollaborationService:
     
     def get_user_invitations(self, user_id):
         """Get all pending invitations for a user."""
-        user = User.query.filter_by(id=user_id).first()
+        user = get_by_id(User, user_id)
         if not user:
             return []
         
@@ -95,8 +101,8 @@ class CollaborationService:
             raise ValueError("Only the inviter can resend invitations")
         
         # Get canvas and inviter information
-        canvas = Canvas.query.filter_by(id=invitation.canvas_id).first()
-        inviter = User.query.filter_by(id=invitation.inviter_id).first()
+        canvas = get_by_id(Canvas, invitation.canvas_id)
+        inviter = get_by_id(User, invitation.inviter_id)
         
         if not canvas or not inviter:
             raise ValueError("Canvas or inviter not found")
@@ -144,7 +150,9 @@ class CollaborationService:
         invitation.status = 'accepted'
         
         db.session.add(permission)
+        CanvasService.adjust_canvas_counters(invitation.canvas_id, collaborators=1)
         db.session.commit()
+        permission_cache.invalidate(invitation.canvas_id, user_id)
         
         return permission
     
@@ -172,7 +180,7 @@ class CollaborationService:
         collaborators = []
         
         for permission in permissions:
-            user = User.query.filter_by(id=permission.user_id).first()
+            user = get_by_id(User, permission.user_id)
             if user:
                 collaborators.append({
                     'user': user.to_dict(),
@@ -195,6 +203,7 @@ class CollaborationService:
         permission.permission_type = new_permission_type
         permission.granted_by = updated_by
         db.session.commit()
+        permission_cache.invalidate(canvas_id, user_id)
         
         return permission
     
@@ -209,7 +218,9 @@ class CollaborationService:
             return False
         
         db.session.delete(permission)
+        CanvasService.adjust_canvas_counters(canvas_id, collaborators=-1)
         db.session.commit()
+        permission_cache.invalidate(canvas_id, user_id)
         
         return True
     
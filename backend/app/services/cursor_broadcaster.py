@@ -0,0 +1,267 @@
+import json
+import threading
+import time
+from typing import Dict, List, Optional
+import logging
+
+from app.services.ephemeral_store import EphemeralTable, EphemeralWrite, get_ephemeral_store
+
+logger = logging.getLogger(__name__)
+
+# Share of the tick interval the broadcaster may spend working before every room slows down
+CURSOR_TARGET_LOAD = 0.5
+
+class _RoomCursors:
+    __slots__ = ('cursors', 'sids', 'seen', 'changed', 'dirty', 'removed', 'next_due', 'interval')
+
+    def __init__(self):
+        self.cursors: Dict[str, Dict] = {}
+        self.sids: Dict[str, str] = {}  # user_id -> connection that last moved it (not broadcast)
+        self.seen: Dict[str, float] = {}  # user_id -> wall-clock time of the last move
+        self.changed = set()  # not yet broadcast
+        self.dirty = set()  # not yet written to the shared store
+        self.removed = set()  # to delete from the shared store
+        self.next_due = 0.0
+        self.interval = 0.0
+
+class CursorBroadcaster:
+    """This node's cursor table: coalesces moves, broadcasts them per tick and persists them lazily.
+
+    Only the latest position of each user is kept. Every tick, each room
+    whose cursors changed and whose interval has elapsed gets one
+    ``cursors_batch`` message holding all of them, instead of one
+    ``cursor_moved`` per move per member. Members are not sent the cursor
+    they moved themselves (they draw it locally). A room's interval starts at
+    ``1 / hz``, grows with the number of members past ``room_size`` and
+    with the broadcaster's own load, and never exceeds ``1 / min_hz``.
+
+    Moves never touch the network. When the ephemeral store is shared
+    (Redis), every ``persist_interval`` seconds the tick writes changed
+    cursors to it in a single batch so other nodes (and a restarted one) can
+    list them; with the in-memory store this table already is the whole
+    state. Cursors idle for ``ttl`` seconds are dropped here and ignored
+    when read back.
+    """
+
+    def __init__(self, store=None):
+        self.store = store
+        self.hz = 20.0
+        self.min_hz = 5.0
+        self.room_size = 10
+        self.ttl = 30.0
+        self.persist_interval = 1.0
+        self.table = EphemeralTable('cursors', self.ttl)
+        self.load = 0.0
+        self._rooms: Dict[str, _RoomCursors] = {}
+        self._lock = threading.Lock()
+        self._worker_started = False
+        self._next_persist = 0.0
+
+        self.moves = 0
+        self.coalesced = 0
+        self.batches = 0
+        self.cursors_sent = 0
+        self.persists = 0
+        self.persist_failures = 0
+
+    def init_app(self, app) -> None:
+        self.hz = float(app.config.get('CURSOR_TICK_HZ', 20))
+        self.min_hz = min(float(app.config.get('CURSOR_TICK_MIN_HZ', 5)), self.hz)
+        self.room_size = max(int(app.config.get('CURSOR_TICK_ROOM_SIZE', 10)), 1)
+        self.ttl = float(app.config.get('CURSOR_TTL', 30))
+        self.table = EphemeralTable('cursors', self.ttl)
+        self.persist_interval = app.config.get('CURSOR_PERSIST_INTERVAL_MS', 1000) / 1000
+        app.extensions['cursor_broadcaster'] = self
+
+    def update(self, canvas_id: str, cursor: Dict, sid: Optional[str] = None) -> None:
+        """Record a user's latest cursor (must carry user_id) for the room's next batch.
+
+        ``sid`` is the connection that moved it; that connection's batches leave it out.
+        """
+        user_id = cursor['user_id']
+        with self._lock:
+            room = self._rooms.setdefault(canvas_id, _RoomCursors())
+            if user_id in room.changed:
+                self.coalesced += 1
+            room.cursors[user_id] = cursor
+            if sid is not None:
+                room.sids[user_id] = sid
+            else:
+                room.sids.pop(user_id, None)
+            room.seen[user_id] = time.time()
+            room.changed.add(user_id)
+            room.dirty.add(user_id)
+            room.removed.discard(user_id)
+            self.moves += 1
+        self._ensure_worker()
+
+    def discard(self, canvas_id: str, user_id: str) -> None:
+        """Forget a user's cursor, e.g. because it left the canvas."""
+        with self._lock:
+            room = self._rooms.get(canvas_id)
+            if room is not None and room.cursors.pop(user_id, None) is not None:
+                room.sids.pop(user_id, None)
+                room.seen.pop(user_id, None)
+                room.changed.discard(user_id)
+                room.dirty.discard(user_id)
+                room.removed.add(user_id)
+
+    def get_cursors(self, canvas_id: str) -> List[Dict]:
+        """Live cursors of a canvas: this node's table plus those other nodes persisted to the shared store."""
+        with self._lock:
+            room = self._rooms.get(canvas_id)
+            local = dict(room.cursors) if room is not None else {}
+        store = self._store()
+        if not store.shared:
+            return list(local.values())
+
+        cursors = dict(local)
+        try:
+            stored = store.live(self.table, canvas_id)
+        except Exception as e:
+            logger.warning(f"Cursor table store read failed: {e}")
+            return list(local.values())
+        for user_id, raw in stored.items():
+            if user_id in cursors:
+                continue
+            try:
+                cursors[user_id] = json.loads(raw)
+            except ValueError:
+                continue
+        return list(cursors.values())
+
+    def interval_for(self, members: int) -> float:
+        """Seconds between batches for a room with this many members at the current load."""
+        scale = max(1.0, members / self.room_size) * max(1.0, self.load / CURSOR_TARGET_LOAD)
+        return min(scale / self.hz, 1 / self.min_hz)
+
+    def tick(self, now: Optional[float] = None) -> int:
+        """Broadcast every due room's changed cursors; returns the number of batches sent."""
+        from app.extensions import socketio
+        started = time.perf_counter()
+        now = time.monotonic() if now is None else now
+        oldest = time.time() - self.ttl
+
+        due: List = []
+        with self._lock:
+            for canvas_id, room in list(self._rooms.items()):
+                for user_id in [user_id for user_id, seen in room.seen.items() if seen < oldest]:
+                    room.cursors.pop(user_id, None)
+                    room.sids.pop(user_id, None)
+                    room.seen.pop(user_id)
+                    room.changed.discard(user_id)
+                    room.dirty.discard(user_id)
+                    room.removed.add(user_id)
+                if room.changed and now >= room.next_due:
+                    due.append((canvas_id, room, [(room.cursors[user_id], room.sids.get(user_id))
+                                                  for user_id in room.changed]))
+                    room.changed = set()
+                elif not room.cursors and not room.removed:
+                    del self._rooms[canvas_id]
+
+        for canvas_id, room, changed in due:
+            members = {sid for sid, _ in socketio.server.manager.get_participants('/', canvas_id)}
+            room.interval = self.interval_for(len(members))
+            room.next_due = now + room.interval
+            cursors = [cursor for cursor, _ in changed]
+            movers = {sid for _, sid in changed if sid in members}
+            try:
+                # One message for everyone who did not move; each mover gets the others' cursors
+                socketio.emit('cursors_batch', {'canvas_id': canvas_id, 'cursors': cursors}, room=canvas_id,
+                              skip_sid=list(movers) or None)
+                for mover in movers:
+                    others = [cursor for cursor, sid in changed if sid != mover]
+                    if others:
+                        socketio.emit('cursors_batch', {'canvas_id': canvas_id, 'cursors': others}, room=mover)
+            except Exception as e:
+                logger.warning(f"Cursor batch for canvas {canvas_id} failed: {e}")
+                continue
+            with self._lock:
+                self.batches += 1
+                self.cursors_sent += len(cursors)
+
+        if now >= self._next_persist:
+            self._next_persist = now + self.persist_interval
+            self.persist()
+
+        # Smoothed share of the base tick spent broadcasting
+        elapsed = time.perf_counter() - started
+        self.load = 0.8 * self.load + 0.2 * elapsed * self.hz
+        return len(due)
+
+    def persist(self) -> int:
+        """Write changed cursors to the shared store in one batch; returns canvases written."""
+        store = self._store()
+        writes = []
+        with self._lock:
+            for canvas_id, room in self._rooms.items():
+                if not room.dirty and not room.removed:
+                    continue
+                if store.shared:
+                    entries = {user_id: json.dumps(room.cursors[user_id]) for user_id in room.dirty}
+                    seen = {user_id: room.seen[user_id] for user_id in room.dirty}
+                    writes.append(EphemeralWrite(self.table, canvas_id, entries, seen, tuple(room.removed)))
+                room.dirty = set()
+                room.removed = set()
+        if not writes:
+            return 0
+
+        try:
+            store.write(writes)
+        except Exception as e:
+            logger.warning(f"Cursor table store write failed: {e}")
+            with self._lock:
+                self.persist_failures += 1
+                # Retry with the next persist (newer moves are already marked dirty)
+                for write in writes:
+                    room = self._rooms.get(write.scope)
+                    if room is not None:
+                        room.dirty.update(user_id for user_id in write.entries if user_id in room.cursors)
+                        room.removed.update(user_id for user_id in write.removed if user_id not in room.cursors)
+            return 0
+
+        with self._lock:
+            self.persists += 1
+        return len(writes)
+
+    def _store(self):
+        return self.store if self.store is not None else get_ephemeral_store()
+
+    def _ensure_worker(self) -> None:
+        if self._worker_started:
+            return
+        with self._lock:
+            if self._worker_started:
+                return
+            self._worker_started = True
+        from app.extensions import socketio
+        socketio.start_background_task(self._run)
+
+    def _run(self) -> None:
+        from app.extensions import socketio
+        while True:
+            socketio.sleep(1 / self.hz)
+            try:
+                self.tick()
+            except Exception as e:
+                logger.error(f"Cursor broadcast loop error: {e}")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'hz': self.hz,
+                'min_hz': self.min_hz,
+                'load': round(self.load, 3),
+                'rooms': len(self._rooms),
+                'cursors': sum(len(room.cursors) for room in self._rooms.values()),
+                'moves': self.moves,
+                'coalesced': self.coalesced,
+                'batches': self.batches,
+                'cursors_sent': self.cursors_sent,
+                'max_interval_ms': round(max((room.interval for room in self._rooms.values()), default=0) * 1000),
+                'store': self._store().backend,
+                'persists': self.persists,
+                'persist_failures': self.persist_failures
+            }
+
+cursor_broadcaster = CursorBroadcaster()
@@ -0,0 +1,256 @@
+from abc import ABC, abstractmethod
+import threading
+import time
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+import logging
+
+from app.extensions import get_redis_connection
+from app.utils.timed_hash import TimedHash
+
+logger = logging.getLogger(__name__)
+
+EPHEMERAL_STORE_BACKENDS = ('auto', 'redis', 'memory')
+
+class EphemeralTable(NamedTuple):
+    """A kind of expiring state (cursors, presence, ...): entries not written for ttl seconds are gone."""
+    name: str
+    ttl: float
+
+class EphemeralWrite(NamedTuple):
+    """Entries (member -> JSON) to store in one scope, with their last-seen times, and members to drop."""
+    table: EphemeralTable
+    scope: str
+    entries: Dict[str, str]
+    seen: Dict[str, float]
+    removed: Tuple[str, ...] = ()
+
+class EphemeralStore(ABC):
+    """Short-lived per-canvas state: for each table and scope (canvas id) a map of member -> JSON entry.
+
+    Each entry carries the time it was last written and counts as live for
+    the table's ttl. ``shared`` tells whether other nodes see the writes.
+    """
+
+    backend = 'none'
+    shared = False
+
+    @abstractmethod
+    def write(self, writes: Iterable[EphemeralWrite]) -> None:
+        """Apply several writes at once (one round-trip where the backend has one)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get(self, table: EphemeralTable, scope: str, member: str, now: Optional[float] = None) -> Optional[str]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def live(self, table: EphemeralTable, scope: str, now: Optional[float] = None) -> Dict[str, str]:
+        """Live entries of a scope, member -> JSON."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def count(self, table: EphemeralTable, scope: str, now: Optional[float] = None) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def sweep(self, table: EphemeralTable, scope: str, now: Optional[float] = None) -> int:
+        """Drop expired entries of a scope; returns how many were removed."""
+        raise NotImplementedError
+
+    def set(self, table: EphemeralTable, scope: str, member: str, entry: str, now: Optional[float] = None) -> None:
+        self.write([EphemeralWrite(table, scope, {member: entry}, {member: time.time() if now is None else now})])
+
+    def remove(self, table: EphemeralTable, scope: str, *members: str) -> None:
+        self.write([EphemeralWrite(table, scope, {}, {}, members)])
+
+    def stats(self) -> Dict:
+        return {'backend': self.backend, 'shared': self.shared}
+
+class MemoryEphemeralStore(EphemeralStore):
+    """Process-local store for single-node deployments; every call is a dict lookup under one lock.
+
+    Expired entries are skipped on read and purged, together with scopes
+    that have not been written for their ttl, at most every
+    ``purge_interval`` seconds.
+    """
+
+    backend = 'memory'
+    shared = False
+
+    def __init__(self, purge_interval: float = 30.0):
+        self.purge_interval = purge_interval
+        # (table name, scope) -> member -> (entry, last seen); plus when each scope expires as a whole
+        self._scopes: Dict[Tuple[str, str], Dict[str, Tuple[str, float]]] = {}
+        self._expires: Dict[Tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+        self._next_purge = 0.0
+        self.purged = 0
+
+    def write(self, writes: Iterable[EphemeralWrite]) -> None:
+        now = time.time()
+        with self._lock:
+            for write in writes:
+                key = (write.table.name, write.scope)
+                scope = self._scopes.setdefault(key, {})
+                for member, entry in write.entries.items():
+                    scope[member] = (entry, write.seen.get(member, now))
+                for member in write.removed:
+                    scope.pop(member, None)
+                if write.entries:
+                    self._expires[key] = now + write.table.ttl
+                if not scope:
+                    del self._scopes[key]
+                    self._expires.pop(key, None)
+            if now >= self._next_purge:
+                self._next_purge = now + self.purge_interval
+                self._purge(now)
+
+    def _purge(self, now: float) -> None:
+        for key, expires_at in list(self._expires.items()):
+            if expires_at <= now:
+                self.purged += len(self._scopes.pop(key, ()))
+                del self._expires[key]
+
+    def get(self, table: EphemeralTable, scope: str, member: str, now: Optional[float] = None) -> Optional[str]:
+        cutoff = (time.time() if now is None else now) - table.ttl
+        with self._lock:
+            item = self._scopes.get((table.name, scope), {}).get(member)
+        if item is None or item[1] < cutoff:
+            return None
+        return item[0]
+
+    def live(self, table: EphemeralTable, scope: str, now: Optional[float] = None) -> Dict[str, str]:
+        cutoff = (time.time() if now is None else now) - table.ttl
+        with self._lock:
+            items = list(self._scopes.get((table.name, scope), {}).items())
+        return {member: entry for member, (entry, seen) in items if seen >= cutoff}
+
+    def count(self, table: EphemeralTable, scope: str, now: Optional[float] = None) -> int:
+        return len(self.live(table, scope, now))
+
+    def sweep(self, table: EphemeralTable, scope: str, now: Optional[float] = None) -> int:
+        cutoff = (time.time() if now is None else now) - table.ttl
+        key = (table.name, scope)
+        with self._lock:
+            entries = self._scopes.get(key)
+            if not entries:
+                return 0
+            expired = [member for member, (_, seen) in entries.items() if seen < cutoff]
+            for member in expired:
+                del entries[member]
+            if not entries:
+                del self._scopes[key]
+                self._expires.pop(key, None)
+            self.purged += len(expired)
+            return len(expired)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._scopes.clear()
+            self._expires.clear()
+            self.purged = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'backend': self.backend,
+                'shared': self.shared,
+                'scopes': len(self._scopes),
+                'entries': sum(len(entries) for entries in self._scopes.values()),
+                'purged': self.purged
+            }
+
+class RedisEphemeralStore(EphemeralStore):
+    """Store shared by every node: one Redis hash plus last-seen sorted set per table and scope (TimedHash).
+
+    Uses the app's pooled connection. While Redis is unavailable (not
+    reachable or circuit breaker open) calls go to ``fallback`` when one is
+    given, so the node keeps working on its own state; otherwise reads are
+    empty and writes are dropped.
+    """
+
+    backend = 'redis'
+    shared = True
+
+    def __init__(self, fallback: Optional[EphemeralStore] = None):
+        self.fallback = fallback
+        self._hashes: Dict[EphemeralTable, TimedHash] = {}
+        self.fallbacks = 0
+
+    def _hash(self, table: EphemeralTable) -> TimedHash:
+        timed_hash = self._hashes.get(table)
+        if timed_hash is None:
+            timed_hash = self._hashes[table] = TimedHash(table.name, table.ttl)
+        return timed_hash
+
+    def _client(self):
+        client = get_redis_connection()
+        if client is None:
+            self.fallbacks += 1
+        return client
+
+    def write(self, writes: Iterable[EphemeralWrite]) -> None:
+        writes = list(writes)
+        client = self._client()
+        if client is None:
+            if self.fallback is not None:
+                self.fallback.write(writes)
+            return
+        pipe = client.pipeline(transaction=False)
+        for write in writes:
+            timed_hash = self._hash(write.table)
+            timed_hash.stage_set(pipe, write.scope, write.entries, write.seen)
+            timed_hash.stage_remove(pipe, write.scope, write.removed)
+        pipe.execute()
+
+    def get(self, table: EphemeralTable, scope: str, member: str, now: Optional[float] = None) -> Optional[str]:
+        client = self._client()
+        if client is None:
+            return self.fallback.get(table, scope, member, now) if self.fallback is not None else None
+        return self._hash(table).get(client, scope, member, now)
+
+    def live(self, table: EphemeralTable, scope: str, now: Optional[float] = None) -> Dict[str, str]:
+        client = self._client()
+        if client is None:
+            return self.fallback.live(table, scope, now) if self.fallback is not None else {}
+        return self._hash(table).live(client, scope, now)
+
+    def count(self, table: EphemeralTable, scope: str, now: Optional[float] = None) -> int:
+        client = self._client()
+        if client is None:
+            return self.fallback.count(table, scope, now) if self.fallback is not None else 0
+        return self._hash(table).count(client, scope, now)
+
+    def sweep(self, table: EphemeralTable, scope: str, now: Optional[float] = None) -> int:
+        client = self._client()
+        if client is None:
+            return self.fallback.sweep(table, scope, now) if self.fallback is not None else 0
+        return self._hash(table).sweep(client, scope, now)
+
+    def stats(self) -> Dict:
+        stats = {'backend': self.backend, 'shared': self.shared, 'fallbacks': self.fallbacks}
+        if self.fallback is not None:
+            stats['fallback'] = self.fallback.stats()
+        return stats
+
+_ephemeral_store: EphemeralStore = MemoryEphemeralStore()
+
+def init_ephemeral_store(app) -> EphemeralStore:
+    """Pick the backend named by EPHEMERAL_STORE; "auto" means Redis when REDIS_URL is set, else memory."""
+    global _ephemeral_store
+    from app.extensions import redis_manager
+    backend = app.config.get('EPHEMERAL_STORE', 'auto')
+    if backend not in EPHEMERAL_STORE_BACKENDS:
+        raise ValueError(f"EPHEMERAL_STORE must be one of: {', '.join(EPHEMERAL_STORE_BACKENDS)}")
+    if backend == 'redis' or (backend == 'auto' and redis_manager.enabled):
+        # In auto mode an outage degrades to node-local state instead of turning the features off
+        fallback = MemoryEphemeralStore() if backend == 'auto' else None
+        _ephemeral_store = RedisEphemeralStore(fallback=fallback)
+    else:
+        _ephemeral_store = MemoryEphemeralStore()
+    app.extensions['ephemeral_store'] = _ephemeral_store
+    logger.info(f"Ephemeral state backend: {_ephemeral_store.backend}")
+    return _ephemeral_store
+
+def get_ephemeral_store() -> EphemeralStore:
+    return _ephemeral_store
@@ -0,0 +1,217 @@
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import urllib.request
+from typing import Dict, Optional
+import logging
+
+import jwt
+from cryptography import x509
+from cryptography.hazmat.primitives import serialization
+
+logger = logging.getLogger(__name__)
+
+FIREBASE_CERTS_URL = 'https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com'
+FIREBASE_ISSUER_PREFIX = 'https://securetoken.google.com/'
+
+class FirebaseTokenVerifier:
+    """Verifies Firebase ID tokens locally against a cached set of Google signing keys.
+
+    Keys are held in memory and mirrored to disk so a restarted process can
+    verify immediately. They are refreshed in a background thread before the
+    ``Cache-Control: max-age`` of the last fetch runs out. When ``keys_file``
+    is given (tests, air-gapped runs) it is used as a static key set instead.
+
+    Verification never fetches or waits on the caller's thread. A token
+    whose ``kid`` is unknown (cold start with no disk cache, or a key
+    rotation) triggers the background refresh and is rejected at once:
+    definitively when the key set is current, and as a retryable failure
+    while the refresh is still due or running. Callers that can afford to
+    block (scripts, not request or socket handlers) may set
+    ``key_wait_timeout`` to wait that long for the refresh instead.
+    """
+
+    def __init__(self, project_id: str, cache_path: Optional[str] = None,
+                 keys_file: Optional[str] = None, certs_url: str = FIREBASE_CERTS_URL,
+                 fetch_timeout: float = 5.0, refresh_margin: float = 300.0,
+                 min_refresh_interval: float = 60.0, clock_skew: int = 5,
+                 key_wait_timeout: float = 0.0):
+        self.project_id = project_id
+        self.issuer = f'{FIREBASE_ISSUER_PREFIX}{project_id}'
+        self.cache_path = cache_path
+        self.keys_file = keys_file
+        self.certs_url = certs_url
+        self.fetch_timeout = fetch_timeout
+        self.refresh_margin = refresh_margin
+        self.min_refresh_interval = min_refresh_interval
+        self.clock_skew = clock_skew
+        self.key_wait_timeout = key_wait_timeout
+
+        self._keys: Dict[str, object] = {}
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._last_refresh_started = 0.0
+        self._last_refresh_ok = 0.0
+        self._refreshed = threading.Event()
+        self._refreshed.set()
+
+        self.local_verifications = 0
+        self.refresh_count = 0
+        self.refresh_failures = 0
+        self.key_waits = 0
+        self.unavailable = 0
+
+        if keys_file:
+            with open(keys_file) as f:
+                self._set_keys(json.load(f), float('inf'))
+        else:
+            self._load_disk_cache()
+            self._maybe_refresh()
+
+    @staticmethod
+    def parse_max_age(cache_control: Optional[str]) -> Optional[int]:
+        """Extract max-age seconds from a Cache-Control header value."""
+        if not cache_control:
+            return None
+        match = re.search(r'max-age=(\d+)', cache_control)
+        return int(match.group(1)) if match else None
+
+    @staticmethod
+    def _load_public_key(pem: str):
+        data = pem.encode('utf-8')
+        if b'BEGIN CERTIFICATE' in data:
+            return x509.load_pem_x509_certificate(data).public_key()
+        return serialization.load_pem_public_key(data)
+
+    def _set_keys(self, pems: Dict[str, str], expires_at: float) -> None:
+        keys = {kid: self._load_public_key(pem) for kid, pem in pems.items()}
+        with self._lock:
+            self._keys = keys
+            self._expires_at = expires_at
+
+    def _load_disk_cache(self) -> None:
+        """Load the last fetched key set from disk, even if it is past max-age."""
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path) as f:
+                cached = json.load(f)
+            self._set_keys(cached['keys'], float(cached['expires_at']))
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable Firebase key cache {self.cache_path}: {e}")
+
+    def _save_disk_cache(self, pems: Dict[str, str], expires_at: float) -> None:
+        if not self.cache_path:
+            return
+        try:
+            directory = os.path.dirname(os.path.abspath(self.cache_path))
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.firebase_keys_')
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'keys': pems, 'expires_at': expires_at}, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logger.warning(f"Could not write Firebase key cache {self.cache_path}: {e}")
+
+    def refresh(self) -> None:
+        """Fetch the current signing certificates and replace the key set."""
+        try:
+            with urllib.request.urlopen(self.certs_url, timeout=self.fetch_timeout) as response:
+                pems = json.loads(response.read().decode('utf-8'))
+                max_age = self.parse_max_age(response.headers.get('Cache-Control')) or 3600
+            expires_at = time.time() + max_age
+            self._set_keys(pems, expires_at)
+            self._save_disk_cache(pems, expires_at)
+            self._last_refresh_ok = time.time()
+            self.refresh_count += 1
+        except Exception as e:
+            self.refresh_failures += 1
+            logger.error(f"Failed to refresh Firebase signing keys: {e}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+            self._refreshed.set()
+
+    def _maybe_refresh(self, force: bool = False) -> None:
+        """Start a background refresh when the key set is close to expiry."""
+        if self.keys_file:
+            return
+        with self._lock:
+            now = time.time()
+            if self._refreshing or now - self._last_refresh_started < self.min_refresh_interval:
+                return
+            if not force and now < self._expires_at - self.refresh_margin:
+                return
+            self._refreshing = True
+            self._last_refresh_started = now
+            self._refreshed.clear()
+        threading.Thread(target=self.refresh, name='firebase-key-refresh', daemon=True).start()
+
+    def _wait_for_key(self, kid: Optional[str]):
+        """Key for kid once the background refresh has it; waits only when key_wait_timeout is set."""
+        # Keys may have rotated since the last fetch
+        self._maybe_refresh(force=True)
+        if self.key_wait_timeout > 0 and not self._refreshed.is_set():
+            self.key_waits += 1
+            self._refreshed.wait(self.key_wait_timeout)
+        key = self._keys.get(kid)
+        if key is not None:
+            return key
+        if self.keys_file or (self._refreshed.is_set()
+                              and time.time() - self._last_refresh_ok < self.min_refresh_interval):
+            raise jwt.InvalidTokenError(f"Unknown signing key id: {kid}")
+        self.unavailable += 1
+        raise Exception('Firebase signing keys are not available yet; retry shortly')
+
+    def verify(self, id_token: str) -> Dict:
+        """Verify id_token locally and return its claims (with ``uid`` set).
+
+        Raises PyJWT errors for tokens that are invalid, and a plain
+        Exception when the signing key could not be obtained in time (the
+        caller should retry rather than remember the rejection).
+        """
+        header = jwt.get_unverified_header(id_token)
+        if header.get('alg') != 'RS256':
+            raise jwt.InvalidAlgorithmError(f"Unexpected token algorithm: {header.get('alg')}")
+
+        self._maybe_refresh()
+        key = self._keys.get(header.get('kid'))
+        if key is None:
+            key = self._wait_for_key(header.get('kid'))
+
+        claims = jwt.decode(
+            id_token,
+            key=key,
+            algorithms=['RS256'],
+            audience=self.project_id,
+            issuer=self.issuer,
+            leeway=self.clock_skew,
+            options={'require': ['exp', 'iat', 'aud', 'iss', 'sub']}
+        )
+
+        subject = claims.get('sub')
+        if not isinstance(subject, str) or not subject or len(subject) > 128:
+            raise jwt.InvalidTokenError('Token has an invalid sub claim')
+        auth_time = claims.get('auth_time')
+        if auth_time is not None and auth_time > time.time() + self.clock_skew:
+            raise jwt.ImmatureSignatureError('Token auth_time is in the future')
+
+        claims['uid'] = subject
+        self.local_verifications += 1
+        return claims
+
+    def stats(self) -> Dict:
+        """Return key-set freshness and verification counters."""
+        return {
+            'keys': len(self._keys),
+            'expires_in': round(self._expires_at - time.time(), 1) if self._keys and not self.keys_file else None,
+            'static_keys': bool(self.keys_file),
+            'local_verifications': self.local_verifications,
+            'refresh_count': self.refresh_count,
+            'refresh_failures': self.refresh_failures,
+            'key_waits': self.key_waits,
+            'unavailable': self.unavailable
+        }
@@ -0,0 +1,204 @@
+import atexit
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import logging
+
+from flask import has_app_context
+
+logger = logging.getLogger(__name__)
+
+WRITE_DURABILITY_MODES = ('sync', 'buffered')
+
+def _expire_canvas_rows(canvas_id: str) -> None:
+    """Make the caller's session reload the canvas and objects a flush just rewrote (unmodified ones only)."""
+    from app.extensions import db
+    from app.models import Canvas, CanvasObject
+    session = db.session
+    for instance in list(session.identity_map.values()):
+        if instance in session.dirty:
+            continue
+        if (isinstance(instance, CanvasObject) and instance.canvas_id == canvas_id) or \
+                (isinstance(instance, Canvas) and instance.id == canvas_id):
+            session.expire(instance)
+
+class ObjectWriteBuffer:
+    """Coalesces high-frequency object property updates and writes them in batches.
+
+    In ``buffered`` mode socket updates are broadcast straight away and only
+    the latest state of each object is kept here. A flush writes a canvas's
+    pending objects through the batch path (one transaction, one version
+    bump). Flushes run every ``interval`` seconds, when a room empties, before
+    any read or synchronous write of the canvas, and at interpreter exit.
+    ``sync`` mode disables buffering; updates then commit one by one.
+
+    A flush always commits in a session of its own, never in the session of
+    the request or socket event that triggered it, and each object's
+    operation-log entry names the user whose edit it holds (the latest one
+    when edits were coalesced).
+    """
+
+    def __init__(self):
+        self.app = None
+        self.durability = 'sync'
+        self.interval = 0.25
+        self.max_pending = 10000
+        self._pending: Dict[str, 'OrderedDict[str, Tuple[Dict, Optional[str]]]'] = {}
+        self._depth = 0
+        self._lock = threading.Lock()
+        # Held for a whole flush so a caller never reads or writes a canvas mid-flush
+        self._flush_lock = threading.RLock()
+        self._worker_started = False
+        self._atexit_registered = False
+
+        self.enqueued = 0
+        self.coalesced = 0
+        self.flushes = 0
+        self.rows_written = 0
+        self.flush_failures = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    def init_app(self, app) -> None:
+        durability = app.config.get('OBJECT_WRITE_DURABILITY', 'sync')
+        if durability not in WRITE_DURABILITY_MODES:
+            raise ValueError(f"OBJECT_WRITE_DURABILITY must be one of: {', '.join(WRITE_DURABILITY_MODES)}")
+        self.app = app
+        self.durability = durability
+        self.interval = app.config.get('OBJECT_WRITE_FLUSH_INTERVAL_MS', 250) / 1000
+        self.max_pending = app.config.get('OBJECT_WRITE_BUFFER_MAX', 10000)
+        app.extensions['object_write_buffer'] = self
+        if not self._atexit_registered:
+            atexit.register(self.flush_all)
+            self._atexit_registered = True
+
+    @property
+    def enabled(self) -> bool:
+        return self.durability == 'buffered'
+
+    def enqueue(self, canvas_id: str, object_dict: Dict, actor_id: Optional[str] = None) -> None:
+        """Record the latest state (shaped like CanvasObject.to_dict()) of an object awaiting write, and its author."""
+        with self._lock:
+            canvas = self._pending.setdefault(canvas_id, OrderedDict())
+            if object_dict['id'] in canvas:
+                self.coalesced += 1
+            else:
+                self._depth += 1
+            canvas[object_dict['id']] = (object_dict, actor_id)
+            self.enqueued += 1
+            over_budget = self._depth >= self.max_pending
+
+        self._ensure_worker()
+        if over_budget:
+            # Backpressure: never let the buffer grow without bound
+            self.flush_all()
+
+    def get(self, canvas_id: str, object_id: str) -> Optional[Dict]:
+        with self._lock:
+            pending = self._pending.get(canvas_id, {}).get(object_id)
+        return pending[0] if pending is not None else None
+
+    def discard(self, canvas_id: str, object_id: str) -> None:
+        """Drop a pending write, e.g. because the object is being deleted."""
+        with self._lock:
+            canvas = self._pending.get(canvas_id)
+            if canvas is not None and canvas.pop(object_id, None) is not None:
+                self._depth -= 1
+                if not canvas:
+                    del self._pending[canvas_id]
+
+    def has_pending(self, canvas_id: str) -> bool:
+        return canvas_id in self._pending
+
+    def flush_canvas(self, canvas_id: str) -> int:
+        """Write a canvas's pending objects now; returns the number written."""
+        with self._flush_lock:
+            with self._lock:
+                writes = self._pending.pop(canvas_id, None)
+                if writes:
+                    self._depth -= len(writes)
+            if not writes:
+                return 0
+            return self._write(canvas_id, writes)
+
+    def flush_all(self) -> int:
+        return sum(self.flush_canvas(canvas_id) for canvas_id in list(self._pending))
+
+    def _write(self, canvas_id: str, writes: 'OrderedDict[str, Tuple[Dict, Optional[str]]]') -> int:
+        from app.services.canvas_service import CanvasService
+        operations = [
+            {'op': 'update', 'id': object_id, 'properties': state['properties']}
+            for object_id, (state, _) in writes.items()
+        ]
+        actors = [actor_id for _, actor_id in writes.values()]
+        started = time.perf_counter()
+        try:
+            if self.app is None:
+                CanvasService().apply_object_batch(canvas_id, operations, None, actors=actors)
+            else:
+                # A fresh app context gets a fresh scoped session: the flush neither commits
+                # nor rolls back whatever the triggering request has pending
+                with self.app.app_context():
+                    CanvasService().apply_object_batch(canvas_id, operations, None, actors=actors)
+                if has_app_context():
+                    _expire_canvas_rows(canvas_id)
+        except Exception as e:
+            logger.error(f"Write-behind flush for canvas {canvas_id} failed: {e}")
+            with self._lock:
+                self.flush_failures += 1
+                # Requeue unless a newer state arrived while we were writing
+                canvas = self._pending.setdefault(canvas_id, OrderedDict())
+                for object_id, pending in writes.items():
+                    if object_id not in canvas:
+                        canvas[object_id] = pending
+                        self._depth += 1
+            return 0
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.flushes += 1
+            self.rows_written += len(writes)
+            self.last_flush_ms = elapsed_ms
+            self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+            self._total_flush_ms += elapsed_ms
+        return len(writes)
+
+    def _ensure_worker(self) -> None:
+        if self._worker_started:
+            return
+        with self._lock:
+            if self._worker_started:
+                return
+            self._worker_started = True
+        from app.extensions import socketio
+        socketio.start_background_task(self._run)
+
+    def _run(self) -> None:
+        from app.extensions import socketio
+        while True:
+            socketio.sleep(self.interval)
+            try:
+                self.flush_all()
+            except Exception as e:
+                logger.error(f"Write-behind flush loop error: {e}")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'durability': self.durability,
+                'interval_ms': round(self.interval * 1000),
+                'queue_depth': self._depth,
+                'canvases': len(self._pending),
+                'enqueued': self.enqueued,
+                'coalesced': self.coalesced,
+                'flushes': self.flushes,
+                'rows_written': self.rows_written,
+                'flush_failures': self.flush_failures,
+                'last_flush_ms': round(self.last_flush_ms, 2),
+                'avg_flush_ms': round(self._total_flush_ms / self.flushes, 2) if self.flushes else 0.0,
+                'max_flush_ms': round(self.max_flush_ms, 2)
+            }
+
+object_write_buffer = ObjectWriteBuffer()
@@ -0,0 +1,171 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, Hashable, Optional, Tuple
+import logging
+
+from app.utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+PERMISSION_CACHE_SIZE = int(os.environ.get('PERMISSION_CACHE_SIZE', 10000))
+PERMISSION_CACHE_TTL = float(os.environ.get('PERMISSION_CACHE_TTL', 30))
+PERMISSION_CACHE_REDIS = os.environ.get('PERMISSION_CACHE_REDIS', 'false').lower() == 'true'
+
+class PermissionCache:
+    """Caches a user's effective access to a canvas.
+
+    An entry records whether the user owns the canvas, whether the canvas is
+    public and the user's explicit permission type (if any), which is enough
+    to answer every ``check_canvas_permission`` call. Invalidation bumps a
+    generation, per canvas or per canvas and user, and entries only count
+    under the generations they were written with. Callers take
+    ``generation()`` before reading the database and pass it to ``set()``,
+    so a decision loaded while an invalidation landed is never served.
+    When a Redis client is given (or ``shared_redis`` is set, for the app's
+    pooled connection) entries and generations live only in Redis, one hash
+    per canvas, and the per-process level is bypassed: a node never answers
+    from a copy that another node's invalidation cannot reach. While Redis
+    is unavailable in that mode nothing is cached and every check goes to
+    the database.
+    """
+
+    def __init__(self, max_size: int = PERMISSION_CACHE_SIZE, ttl: float = PERMISSION_CACHE_TTL,
+                 redis_client=None, shared_redis: bool = False):
+        self.ttl = ttl
+        self.redis_client = redis_client
+        self.shared_redis = shared_redis
+        self._local = TTLCache(max_size=max_size, default_ttl=ttl)
+        # canvas_id or (canvas_id, user_id) -> (generation, when it was bumped); forgotten
+        # once every entry written under an older generation has expired
+        self._generations: Dict[Hashable, Tuple[int, float]] = {}
+        self._next_generation = 0
+        self._next_prune = 0.0
+        self._lock = threading.Lock()
+        self.invalidations = 0
+        self.stale_writes = 0
+
+    @property
+    def shared(self) -> bool:
+        return self.redis_client is not None or self.shared_redis
+
+    def _redis(self):
+        if self.redis_client is not None or not self.shared_redis:
+            return self.redis_client
+        from app.extensions import get_redis_connection
+        return get_redis_connection()
+
+    @staticmethod
+    def _redis_key(canvas_id: str) -> str:
+        return f'perm:{canvas_id}'
+
+    @staticmethod
+    def _generation_fields(user_id: str) -> Tuple[str, str]:
+        return '#gen', f'#gen:{user_id}'
+
+    def _local_generation(self, canvas_id: str, user_id: str) -> Tuple[int, int]:
+        with self._lock:
+            return (self._generations.get(canvas_id, (0, 0.0))[0],
+                    self._generations.get((canvas_id, user_id), (0, 0.0))[0])
+
+    def generation(self, canvas_id: str, user_id: str) -> Optional[Tuple[int, int]]:
+        """Token to pass to ``set()``; take it before loading the access it will store."""
+        if not self.shared:
+            return self._local_generation(canvas_id, user_id)
+        redis_client = self._redis()
+        if not redis_client:
+            return None
+        try:
+            generations = redis_client.hmget(self._redis_key(canvas_id), *self._generation_fields(user_id))
+        except Exception as e:
+            logger.warning(f"Permission cache Redis read failed: {e}")
+            return None
+        return tuple(int(value or 0) for value in generations)
+
+    def get(self, canvas_id: str, user_id: str) -> Optional[Dict]:
+        if not self.shared:
+            return self._local.get((canvas_id, self._local_generation(canvas_id, user_id), user_id))
+        redis_client = self._redis()
+        if not redis_client:
+            return None
+        try:
+            raw, *generations = redis_client.hmget(
+                self._redis_key(canvas_id), user_id, *self._generation_fields(user_id)
+            )
+        except Exception as e:
+            logger.warning(f"Permission cache Redis read failed: {e}")
+            return None
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        if entry.get('generation') != [int(value or 0) for value in generations]:
+            return None
+        return entry['access']
+
+    def set(self, canvas_id: str, user_id: str, access: Dict, generation: Optional[Tuple[int, int]]) -> None:
+        """Store access loaded after ``generation(canvas_id, user_id)`` returned generation."""
+        if generation is None:
+            return
+        if not self.shared:
+            current = self._local_generation(canvas_id, user_id)
+            if current != tuple(generation):
+                # Invalidated while the access was being loaded: it may already be stale
+                self.stale_writes += 1
+                return
+            # A bump from here on changes the key, so this entry is never read
+            self._local.set((canvas_id, current, user_id), access)
+            return
+        redis_client = self._redis()
+        if redis_client:
+            try:
+                # Written with the generations it was loaded under; get() ignores it once they move on
+                entry = {'access': access, 'generation': list(generation)}
+                pipe = redis_client.pipeline()
+                pipe.hset(self._redis_key(canvas_id), user_id, json.dumps(entry))
+                pipe.expire(self._redis_key(canvas_id), int(self.ttl))
+                pipe.execute()
+            except Exception as e:
+                logger.warning(f"Permission cache Redis write failed: {e}")
+
+    def invalidate(self, canvas_id: str, user_id: Optional[str] = None) -> None:
+        """Forget one user's access to a canvas, or everyone's when user_id is None."""
+        now = time.monotonic()
+        with self._lock:
+            self.invalidations += 1
+            self._next_generation += 1
+            self._generations[canvas_id if user_id is None else (canvas_id, user_id)] = (self._next_generation, now)
+            if now >= self._next_prune:
+                self._next_prune = now + self.ttl
+                for key in [key for key, (_, bumped) in self._generations.items() if bumped + self.ttl < now]:
+                    del self._generations[key]
+        redis_client = self._redis()
+        if redis_client:
+            try:
+                pipe = redis_client.pipeline()
+                if user_id is None:
+                    pipe.hincrby(self._redis_key(canvas_id), '#gen', 1)
+                else:
+                    pipe.hdel(self._redis_key(canvas_id), user_id)
+                    pipe.hincrby(self._redis_key(canvas_id), self._generation_fields(user_id)[1], 1)
+                pipe.expire(self._redis_key(canvas_id), int(self.ttl))
+                pipe.execute()
+            except Exception as e:
+                logger.warning(f"Permission cache Redis invalidation failed: {e}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._local.clear()
+            self._generations.clear()
+            self.invalidations = 0
+            self.stale_writes = 0
+
+    def stats(self) -> Dict:
+        stats = self._local.stats()
+        stats['invalidations'] = self.invalidations
+        stats['stale_writes'] = self.stale_writes
+        stats['generations'] = len(self._generations)
+        stats['redis'] = self.shared
+        return stats
+
+permission_cache = PermissionCache(shared_redis=PERMISSION_CACHE_REDIS)
@@ -1,28 +1,33 @@
 import json
-import redis
-from datetime import datetime, timedelta
+import time
+from datetime import datetime
 from typing import List, Dict, Optional
 from app.models import User
-from app.extensions import get_redis_connection
+from app.services.ephemeral_store import EphemeralTable, EphemeralWrite, get_ephemeral_store
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Users not seen for the ttl are offline; activity is kept for longer tracking
+PRESENCE_TABLE = EphemeralTable('presence', 60)
+ACTIVITY_TABLE = EphemeralTable('activity', 300)
+
 class PresenceService:
-    """Service for managing user presence and activity tracking."""
+    """Service for managing user presence and activity tracking.
+    
+    Presence and activity live in the app's ephemeral store (Redis shared by
+    every node, or process memory on a single node), per canvas, so listing,
+    counting and expiring users only touches that canvas's entries.
+    """
     
-    def __init__(self):
-        self.redis_client = get_redis_connection()
-        self.presence_ttl = 60  # 60 seconds
-        self.activity_ttl = 300  # 5 minutes
+    def __init__(self, store=None):
+        self.store = store or get_ephemeral_store()
+        self.presence_ttl = PRESENCE_TABLE.ttl
+        self.activity_ttl = ACTIVITY_TABLE.ttl
     
     def update_user_presence(self, user_id: str, canvas_id: str, status: str = 'online', activity: str = 'viewing') -> bool:
         """Update user presence information."""
         try:
-            if not self.redis_client:
-                logger.warning("Redis not available, skipping presence update")
-                return False
-            
             # Get user information
             user = User.query.filter_by(id=user_id).first()
             if not user:
@@ -31,7 +36,7 @@ class PresenceService:
             # Create presence data
             presence_data = {
                 'user_id': user_id,
-                'user_name': user.display_name or user.email,
+                'user_name': user.name or user.email,
                 'user_email': user.email,
                 'avatar_url': user.avatar_url,
                 'canvas_id': canvas_id,
@@ -41,24 +46,15 @@ class PresenceService:
                 'timestamp': datetime.utcnow().timestamp()
             }
             
-            # Store presence data
-            presence_key = f"presence:{canvas_id}:{user_id}"
-            self.redis_client.setex(
-                presence_key, 
-                self.presence_ttl, 
-                json.dumps(presence_data)
-            )
-            
-            # Store activity data separately for longer tracking
-            activity_key = f"activity:{canvas_id}:{user_id}"
-            self.redis_client.setex(
-                activity_key,
-                self.activity_ttl,
-                json.dumps({
+            # Store presence data, and activity separately for longer tracking, in one round-trip
+            now = time.time()
+            self.store.write([
+                EphemeralWrite(PRESENCE_TABLE, canvas_id, {user_id: json.dumps(presence_data)}, {user_id: now}),
+                EphemeralWrite(ACTIVITY_TABLE, canvas_id, {user_id: json.dumps({
                     'activity': activity,
-                    'timestamp': datetime.utcnow().timestamp()
-                })
-            )
+                    'timestamp': presence_data['timestamp']
+                })}, {user_id: now})
+            ])
             
             logger.debug(f"Updated presence for user {user_id} on canvas {canvas_id}")
             return True
@@ -70,24 +66,13 @@ class PresenceService:
     def get_canvas_presence(self, canvas_id: str) -> List[Dict]:
         """Get all active users for a canvas."""
         try:
-            if not self.redis_client:
-                return []
-            
-            # Get all presence keys for this canvas
-            presence_keys = self.redis_client.keys(f"presence:{canvas_id}:*")
+            # Only this canvas's live entries, in one round-trip
             active_users = []
-            
-            for key in presence_keys:
+            for user_id, presence_data in self.store.live(PRESENCE_TABLE, canvas_id).items():
                 try:
-                    presence_data = self.redis_client.get(key)
-                    if presence_data:
-                        user_data = json.loads(presence_data)
-                        # Check if presence is still valid
-                        last_seen = datetime.fromisoformat(user_data['last_seen'])
-                        if datetime.utcnow() - last_seen < timedelta(seconds=self.presence_ttl):
-                            active_users.append(user_data)
-                except (json.JSONDecodeError, KeyError, ValueError) as e:
-                    logger.warning(f"Invalid presence data for key {key}: {str(e)}")
+                    active_users.append(json.loads(presence_data))
+                except json.JSONDecodeError as e:
+                    logger.warning(f"Invalid presence data for user {user_id}: {str(e)}")
                     continue
             
             # Sort by last seen (most recent first)
@@ -101,11 +86,7 @@ class PresenceService:
     def get_user_activity(self, user_id: str, canvas_id: str) -> Optional[Dict]:
         """Get user's current activity."""
         try:
-            if not self.redis_client:
-                return None
-            
-            activity_key = f"activity:{canvas_id}:{user_id}"
-            activity_data = self.redis_client.get(activity_key)
+            activity_data = self.store.get(ACTIVITY_TABLE, canvas_id, user_id)
             
             if activity_data:
                 return json.loads(activity_data)
@@ -118,15 +99,11 @@ class PresenceService:
     def remove_user_presence(self, user_id: str, canvas_id: str) -> bool:
         """Remove user presence from canvas."""
         try:
-            if not self.redis_client:
-                return False
-            
             # Remove presence and activity data
-            presence_key = f"presence:{canvas_id}:{user_id}"
-            activity_key = f"activity:{canvas_id}:{user_id}"
-            
-            self.redis_client.delete(presence_key)
-            self.redis_client.delete(activity_key)
+            self.store.write([
+                EphemeralWrite(PRESENCE_TABLE, canvas_id, {}, {}, (user_id,)),
+                EphemeralWrite(ACTIVITY_TABLE, canvas_id, {}, {}, (user_id,))
+            ])
             
             logger.debug(f"Removed presence for user {user_id} from canvas {canvas_id}")
             return True
@@ -138,31 +115,9 @@ class PresenceService:
     def cleanup_expired_presence(self, canvas_id: str) -> int:
         """Clean up expired presence data for a canvas."""
         try:
-            if not self.redis_client:
-                return 0
-            
-            presence_keys = self.redis_client.keys(f"presence:{canvas_id}:*")
-            cleaned_count = 0
-            
-            for key in presence_keys:
-                try:
-                    presence_data = self.redis_client.get(key)
-                    if presence_data:
-                        user_data = json.loads(presence_data)
-                        last_seen = datetime.fromisoformat(user_data['last_seen'])
-                        
-                        # If presence is expired, remove it
-                        if datetime.utcnow() - last_seen >= timedelta(seconds=self.presence_ttl):
-                            self.redis_client.delete(key)
-                            # Also remove corresponding activity
-                            user_id = user_data['user_id']
-                            activity_key = f"activity:{canvas_id}:{user_id}"
-                            self.redis_client.delete(activity_key)
-                            cleaned_count += 1
-                except (json.JSONDecodeError, KeyError, ValueError):
-                    # Remove invalid data
-                    self.redis_client.delete(key)
-                    cleaned_count += 1
+            # Only this canvas's expired entries; activity outlives presence by design
+            cleaned_count = self.store.sweep(PRESENCE_TABLE, canvas_id)
+            self.store.sweep(ACTIVITY_TABLE, canvas_id)
             
             if cleaned_count > 0:
                 logger.info(f"Cleaned up {cleaned_count} expired presence records for canvas {canvas_id}")
@@ -203,3 +158,11 @@ class PresenceService:
                 'by_activity': {},
                 'last_updated': datetime.utcnow().isoformat()
             }
+    
+    def count_canvas_presence(self, canvas_id: str) -> int:
+        """Number of users online on a canvas."""
+        try:
+            return self.store.count(PRESENCE_TABLE, canvas_id)
+        except Exception as e:
+            logger.error(f"Failed to count canvas presence: {str(e)}")
+            return 0
@@ -0,0 +1,102 @@
+import os
+import threading
+import uuid
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional
+
+ROOM_EVENT_BUFFER_SIZE = int(os.environ.get('ROOM_EVENT_BUFFER_SIZE', 256))
+ROOM_EVENT_BUFFER_CANVASES = int(os.environ.get('ROOM_EVENT_BUFFER_CANVASES', 1024))
+
+class _RoomBuffer:
+    __slots__ = ('epoch', 'seq', 'events')
+
+    def __init__(self, size: int):
+        # A new epoch tells reconnecting clients that seqs from an older buffer mean nothing here
+        self.epoch = uuid.uuid4().hex[:12]
+        self.seq = 0
+        self.events = deque(maxlen=size)
+
+class RoomEventLog:
+    """Per-canvas sequence numbers and a ring buffer of recent object broadcasts.
+
+    Every object broadcast is stamped with ``seq`` (strictly increasing per
+    room) and ``epoch`` (identifies this buffer). A client that reconnects
+    with the last seq it applied gets the missed events back, provided they
+    are still in the buffer and the epoch matches; otherwise it must resync
+    from the REST snapshot. Buffers live in process memory, so a restart or
+    an eviction starts a new epoch.
+    """
+
+    def __init__(self, size: int = ROOM_EVENT_BUFFER_SIZE, max_canvases: int = ROOM_EVENT_BUFFER_CANVASES):
+        self.size = size
+        self.max_canvases = max_canvases
+        self._rooms: 'OrderedDict[str, _RoomBuffer]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.replays = 0
+        self.replayed_events = 0
+        self.resyncs = 0
+
+    def _room(self, canvas_id: str) -> _RoomBuffer:
+        room = self._rooms.get(canvas_id)
+        if room is None:
+            room = self._rooms[canvas_id] = _RoomBuffer(self.size)
+            while len(self._rooms) > self.max_canvases:
+                self._rooms.popitem(last=False)
+        self._rooms.move_to_end(canvas_id)
+        return room
+
+    def record(self, canvas_id: str, event: str, payload: Dict) -> Dict:
+        """Stamp payload with the room's next seq and epoch and keep it for replay; returns payload."""
+        with self._lock:
+            room = self._room(canvas_id)
+            room.seq += 1
+            payload['seq'] = room.seq
+            payload['epoch'] = room.epoch
+            room.events.append((room.seq, event, payload))
+            self.recorded += 1
+        return payload
+
+    def position(self, canvas_id: str) -> Dict:
+        """Current seq and epoch of a room, for clients to start counting from."""
+        with self._lock:
+            room = self._room(canvas_id)
+            return {'seq': room.seq, 'epoch': room.epoch}
+
+    def since(self, canvas_id: str, epoch: Optional[str], last_seq: int) -> Optional[List[Dict]]:
+        """Events after last_seq as {event, data} dicts, or None when the gap cannot be replayed."""
+        with self._lock:
+            room = self._room(canvas_id)
+            if epoch != room.epoch or last_seq > room.seq:
+                self.resyncs += 1
+                return None
+            oldest = room.events[0][0] if room.events else room.seq + 1
+            if last_seq < oldest - 1:
+                self.resyncs += 1
+                return None
+            missed = [{'event': event, 'data': payload} for seq, event, payload in room.events if seq > last_seq]
+            self.replays += 1
+            self.replayed_events += len(missed)
+            return missed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._rooms.clear()
+            self.recorded = 0
+            self.replays = 0
+            self.replayed_events = 0
+            self.resyncs = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'canvases': len(self._rooms),
+                'buffer_size': self.size,
+                'events': sum(len(room.events) for room in self._rooms.values()),
+                'recorded': self.recorded,
+                'replays': self.replays,
+                'replayed_events': self.replayed_events,
+                'resyncs': self.resyncs
+            }
+
+room_events = RoomEventLog()
@@ -0,0 +1,161 @@
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import threading
+import time
+import uuid
+from typing import Dict, Optional, Tuple
+
+from app.config import DEFAULT_SECRET_KEY
+
+logger = logging.getLogger(__name__)
+
+SESSION_TOKEN_PREFIX = 'cs1'
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+class SessionTokenService:
+    """Issues and verifies compact HMAC-SHA256 session tokens.
+
+    Tokens look like ``cs1.<payload>.<signature>`` where the payload carries
+    the uid, issue and expiry times, the signing key id and a token id. Keys
+    are looked up by id so old keys keep verifying while a new one signs.
+    Revocation is an in-process denylist of token ids plus per-user cutoffs.
+    Without keys the service is disabled: it issues nothing and rejects every token.
+    """
+
+    def __init__(self, keys: Dict[str, bytes], active_kid: Optional[str], ttl: int = 900):
+        if keys and active_kid not in keys:
+            raise ValueError(f"Active session key '{active_kid}' is not configured")
+        self.keys = keys
+        self.active_kid = active_kid
+        self.ttl = ttl
+        self._revoked_tokens: Dict[str, float] = {}
+        self._revoked_users: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.issued = 0
+        self.verified = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_config(cls, secret_key: str, keys_spec: Optional[str] = None, ttl: int = 900):
+        """Build from a ``kid:secret,kid:secret`` spec (first entry signs).
+
+        Without a spec a single key derived from the app SECRET_KEY is used,
+        unless SECRET_KEY is missing or the public default: then anyone could
+        sign tokens, so the service is disabled.
+        """
+        keys = {}
+        active_kid = None
+        if keys_spec:
+            for entry in keys_spec.split(','):
+                kid, _, secret = entry.strip().partition(':')
+                if kid and secret:
+                    keys[kid] = secret.encode('utf-8')
+                    active_kid = active_kid or kid
+        if not keys:
+            if not secret_key or secret_key == DEFAULT_SECRET_KEY:
+                logger.warning("Session tokens disabled: set SECRET_KEY or SESSION_TOKEN_KEYS to enable them")
+                return cls({}, None, ttl)
+            active_kid = 'default'
+            keys[active_kid] = hmac.new(secret_key.encode('utf-8'), b'session-token', hashlib.sha256).digest()
+        return cls(keys, active_kid, ttl)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.keys)
+
+    @staticmethod
+    def is_session_token(token: Optional[str]) -> bool:
+        return bool(token) and token.startswith(SESSION_TOKEN_PREFIX + '.')
+
+    def _sign(self, kid: str, signing_input: bytes) -> bytes:
+        return hmac.new(self.keys[kid], signing_input, hashlib.sha256).digest()
+
+    def issue(self, uid: str) -> Tuple[str, int]:
+        """Return a new session token for uid and its expiry timestamp."""
+        if not self.enabled:
+            raise Exception('Session tokens are disabled')
+        now = int(time.time())
+        expires_at = now + self.ttl
+        payload = {'u': uid, 'i': now, 'e': expires_at, 'k': self.active_kid, 'j': uuid.uuid4().hex}
+        encoded = _b64encode(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+        signing_input = f'{SESSION_TOKEN_PREFIX}.{encoded}'.encode('ascii')
+        self.issued += 1
+        return f'{SESSION_TOKEN_PREFIX}.{encoded}.{_b64encode(self._sign(self.active_kid, signing_input))}', expires_at
+
+    def verify(self, token: str) -> Dict:
+        """Verify token and return its claims; raises on any failure."""
+        try:
+            prefix, encoded, signature = token.split('.')
+            payload = json.loads(_b64decode(encoded))
+            signature = _b64decode(signature)
+            kid = payload['k']
+        except (ValueError, KeyError, TypeError):
+            self.rejected += 1
+            raise Exception('Malformed session token')
+
+        if prefix != SESSION_TOKEN_PREFIX or kid not in self.keys:
+            self.rejected += 1
+            raise Exception('Unknown session token key')
+
+        expected = self._sign(kid, f'{prefix}.{encoded}'.encode('ascii'))
+        if not hmac.compare_digest(expected, signature):
+            self.rejected += 1
+            raise Exception('Invalid session token signature')
+
+        now = time.time()
+        if payload['e'] <= now:
+            self.rejected += 1
+            raise Exception('Session token expired')
+        if payload['j'] in self._revoked_tokens or payload['i'] < self._revoked_users.get(payload['u'], 0):
+            self.rejected += 1
+            raise Exception('Session token revoked')
+
+        self.verified += 1
+        return {
+            'uid': payload['u'],
+            'iat': payload['i'],
+            'exp': payload['e'],
+            'kid': kid,
+            'jti': payload['j'],
+            'session': True
+        }
+
+    def revoke(self, jti: str, expires_at: float) -> None:
+        """Deny a single token until it would have expired anyway."""
+        with self._lock:
+            self._revoked_tokens[jti] = expires_at
+            self._prune(time.time())
+
+    def revoke_user(self, uid: str) -> None:
+        """Deny every token issued to uid up to now."""
+        with self._lock:
+            self._revoked_users[uid] = time.time() + 1
+            self._prune(time.time())
+
+    def _prune(self, now: float) -> None:
+        expired = [jti for jti, exp in self._revoked_tokens.items() if exp <= now]
+        for jti in expired:
+            del self._revoked_tokens[jti]
+        # Every token issued before a cutoff older than ttl has expired by now
+        stale = [uid for uid, cutoff in self._revoked_users.items() if cutoff + self.ttl <= now]
+        for uid in stale:
+            del self._revoked_users[uid]
+
+    def stats(self) -> Dict:
+        return {
+            'enabled': self.enabled,
+            'active_kid': self.active_kid,
+            'key_ids': list(self.keys),
+            'issued': self.issued,
+            'verified': self.verified,
+            'rejected': self.rejected,
+            'denylist_size': len(self._revoked_tokens)
+        }
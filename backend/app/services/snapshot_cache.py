@@ -0,0 +1,100 @@
+import gzip
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_CACHE_SIZE = int(os.environ.get('SNAPSHOT_CACHE_SIZE', 256))
+SNAPSHOT_CACHE_MAX_BYTES = int(os.environ.get('SNAPSHOT_CACHE_MAX_BYTES', 2 * 1024 * 1024))
+SNAPSHOT_GZIP_MIN_BYTES = 1024
+
+class SnapshotBody:
+    """Serialized object list of a canvas at one version."""
+
+    __slots__ = ('canvas_id', 'version', 'body', 'gzipped')
+
+    def __init__(self, canvas_id: str, version: int, body: bytes, gzipped: Optional[bytes]):
+        self.canvas_id = canvas_id
+        self.version = version
+        self.body = body
+        self.gzipped = gzipped
+
+def canvas_etag(canvas_id: str, version: int) -> str:
+    """Opaque (unquoted) entity tag for a canvas object list at version."""
+    return f'{canvas_id}-{version}'
+
+class SnapshotCache:
+    """LRU of serialized (and pre-gzipped) canvas object snapshots.
+
+    Entries are keyed by canvas id and carry the canvas version they were
+    built from, so a version bump makes the entry stale without any explicit
+    invalidation. Bodies larger than ``max_body_bytes`` are not cached.
+    """
+
+    def __init__(self, max_entries: int = SNAPSHOT_CACHE_SIZE, max_body_bytes: int = SNAPSHOT_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_body_bytes = max_body_bytes
+        self._entries: 'OrderedDict[str, SnapshotBody]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.builds = 0
+
+    def get(self, canvas_id: str, version: int) -> Optional[SnapshotBody]:
+        with self._lock:
+            snapshot = self._entries.get(canvas_id)
+            if snapshot is None or snapshot.version != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(canvas_id)
+            self.hits += 1
+            return snapshot
+
+    def build(self, canvas_id: str, version: int, payload: Dict) -> SnapshotBody:
+        """Serialize payload once, gzip it and cache the result for this version."""
+        body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        gzipped = gzip.compress(body, compresslevel=6) if len(body) >= SNAPSHOT_GZIP_MIN_BYTES else None
+        snapshot = SnapshotBody(canvas_id, version, body, gzipped)
+        self.builds += 1
+
+        if len(body) <= self.max_body_bytes:
+            with self._lock:
+                current = self._entries.get(canvas_id)
+                # A concurrent request may already have cached a newer version
+                if current is None or current.version <= version:
+                    self._entries[canvas_id] = snapshot
+                    self._entries.move_to_end(canvas_id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return snapshot
+
+    def invalidate(self, canvas_id: str) -> None:
+        with self._lock:
+            self._entries.pop(canvas_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.builds = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            size_bytes = sum(len(s.body) + len(s.gzipped or b'') for s in self._entries.values())
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_entries,
+                'bytes': size_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'builds': self.builds,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0
+            }
+
+snapshot_cache = SnapshotCache()
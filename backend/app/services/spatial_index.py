@@ -0,0 +1,174 @@
+import math
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from app.utils.geometry import Bounds, intersects
+
+SPATIAL_INDEX_CANVASES = int(os.environ.get('SPATIAL_INDEX_CANVASES', 64))
+SPATIAL_INDEX_CELL_SIZE = float(os.environ.get('SPATIAL_INDEX_CELL_SIZE', 256))
+# Smaller canvases are answered by an SQL region query instead of building a grid
+SPATIAL_INDEX_MIN_OBJECTS = int(os.environ.get('SPATIAL_INDEX_MIN_OBJECTS', 500))
+# Objects covering more cells than this are kept in a short list scanned on every query
+SPATIAL_INDEX_MAX_CELLS = 64
+
+class GridIndex:
+    """Uniform grid over object bounding boxes for one canvas.
+
+    Each object is registered in every cell its bounds overlap; objects
+    without known bounds (or spanning too many cells) are kept aside and
+    checked on every query.
+    """
+
+    def __init__(self, version: int, cell_size: float = SPATIAL_INDEX_CELL_SIZE):
+        self.version = version
+        self.cell_size = cell_size
+        self._cells: Dict[Tuple[int, int], Set[str]] = {}
+        self._bounds: Dict[str, Optional[Bounds]] = {}
+        self._large: Set[str] = set()
+        self._unbounded: Set[str] = set()
+
+    def _cell_range(self, bounds: Bounds):
+        size = self.cell_size
+        return (math.floor(bounds[0] / size), math.floor(bounds[1] / size),
+                math.floor(bounds[2] / size), math.floor(bounds[3] / size))
+
+    def insert(self, object_id: str, bounds: Optional[Bounds]) -> None:
+        self.remove(object_id)
+        self._bounds[object_id] = bounds
+        if bounds is None:
+            self._unbounded.add(object_id)
+            return
+        cx0, cy0, cx1, cy1 = self._cell_range(bounds)
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > SPATIAL_INDEX_MAX_CELLS:
+            self._large.add(object_id)
+            return
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                self._cells.setdefault((cx, cy), set()).add(object_id)
+
+    def remove(self, object_id: str) -> None:
+        if object_id not in self._bounds:
+            return
+        bounds = self._bounds.pop(object_id)
+        self._unbounded.discard(object_id)
+        self._large.discard(object_id)
+        if bounds is None:
+            return
+        cx0, cy0, cx1, cy1 = self._cell_range(bounds)
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > SPATIAL_INDEX_MAX_CELLS:
+            return
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                cell = self._cells.get((cx, cy))
+                if cell is not None:
+                    cell.discard(object_id)
+                    if not cell:
+                        del self._cells[(cx, cy)]
+
+    def query(self, bbox: Bounds) -> Set[str]:
+        """Ids of objects whose bounds intersect bbox (plus every unbounded object)."""
+        result = set(self._unbounded)
+        candidates = set(self._large)
+        cx0, cy0, cx1, cy1 = self._cell_range(bbox)
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(self._cells):
+            # Viewport larger than the populated area: walk the populated cells instead
+            for (cx, cy), ids in self._cells.items():
+                if cx0 <= cx <= cx1 and cy0 <= cy <= cy1:
+                    candidates.update(ids)
+        else:
+            for cx in range(cx0, cx1 + 1):
+                for cy in range(cy0, cy1 + 1):
+                    candidates.update(self._cells.get((cx, cy), ()))
+        result.update(object_id for object_id in candidates if intersects(self._bounds[object_id], bbox))
+        return result
+
+    def __len__(self) -> int:
+        return len(self._bounds)
+
+class SpatialIndexRegistry:
+    """LRU of per-canvas grid indexes, each valid for one canvas version.
+
+    Writes that follow the index's version directly are applied in place;
+    any gap (a write on another node, an evicted index) leaves the index
+    stale so the next query rebuilds it from the database.
+    """
+
+    def __init__(self, max_canvases: int = SPATIAL_INDEX_CANVASES, min_objects: int = SPATIAL_INDEX_MIN_OBJECTS):
+        self.max_canvases = max_canvases
+        self.min_objects = min_objects
+        self._indexes: 'OrderedDict[str, GridIndex]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.builds = 0
+        self.incremental_updates = 0
+
+    def build(self, canvas_id: str, version: int, rows: Iterable[Tuple]) -> GridIndex:
+        """Index (id, min_x, min_y, max_x, max_y) rows as of version."""
+        index = GridIndex(version)
+        for object_id, min_x, min_y, max_x, max_y in rows:
+            index.insert(object_id, (min_x, min_y, max_x, max_y) if min_x is not None else None)
+        with self._lock:
+            self.builds += 1
+            self._indexes[canvas_id] = index
+            self._indexes.move_to_end(canvas_id)
+            while len(self._indexes) > self.max_canvases:
+                self._indexes.popitem(last=False)
+        return index
+
+    def query(self, canvas_id: str, version: int, bbox: Bounds) -> Optional[Set[str]]:
+        with self._lock:
+            index = self._indexes.get(canvas_id)
+            if index is None or index.version != version:
+                return None
+            self._indexes.move_to_end(canvas_id)
+            self.hits += 1
+            return index.query(bbox)
+
+    def record_write(self, canvas_id: str, version: int, object_id: str,
+                     bounds: Optional[Bounds] = None, deleted: bool = False) -> None:
+        """Apply an object write that produced canvas version to a cached index."""
+        self.record_writes(canvas_id, version, [(object_id, bounds, deleted)])
+
+    def record_writes(self, canvas_id: str, version: int,
+                      writes: Iterable[Tuple[str, Optional[Bounds], bool]]) -> None:
+        """Apply (object_id, bounds, deleted) writes that together produced canvas version."""
+        with self._lock:
+            index = self._indexes.get(canvas_id)
+            if index is None:
+                return
+            if index.version != version - 1:
+                del self._indexes[canvas_id]
+                return
+            for object_id, bounds, deleted in writes:
+                if deleted:
+                    index.remove(object_id)
+                else:
+                    index.insert(object_id, bounds)
+            index.version = version
+            self.incremental_updates += 1
+
+    def invalidate(self, canvas_id: str) -> None:
+        with self._lock:
+            self._indexes.pop(canvas_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._indexes.clear()
+            self.hits = 0
+            self.builds = 0
+            self.incremental_updates = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'canvases': len(self._indexes),
+                'max_canvases': self.max_canvases,
+                'objects': sum(len(index) for index in self._indexes.values()),
+                'hits': self.hits,
+                'builds': self.builds,
+                'incremental_updates': self.incremental_updates
+            }
+
+spatial_indexes = SpatialIndexRegistry()
@@ -1,37 +1,17 @@
 from flask_socketio import emit, join_room, leave_room
-from app.services.auth_service import AuthService
-from app.services.canvas_service import CanvasService
-from app.extensions import redis_client
+from app.services.canvas_service import CanvasService, BATCH_MAX_OPERATIONS
+from app.services.object_write_buffer import object_write_buffer
+from app.services.room_event_log import room_events
+from app.services.canvas_state import canvas_states
+from app.socket_handlers.session import get_socket_user
+from app.socket_handlers.rooms import room_is_empty
+from app.utils.merge_patch import apply_merge_patch
+from datetime import datetime
 import json
 
 def register_canvas_handlers(socketio):
     """Register canvas-related Socket.IO event handlers."""
     
-    def authenticate_socket_user(id_token):
-        """Authenticate user for Socket.IO events."""
-        try:
-            print(f"=== Socket.IO Authentication Debug ===")
-            print(f"Token length: {len(id_token) if id_token else 0}")
-            print(f"Token starts with: {id_token[:50] if id_token else 'None'}...")
-            
-            auth_service = AuthService()
-            decoded_token = auth_service.verify_token(id_token)
-            print(f"Token verified for user: {decoded_token.get('uid', 'unknown')}")
-            
-            user = auth_service.get_user_by_id(decoded_token['uid'])
-            if not user:
-                print("User not found in database, registering...")
-                user = auth_service.register_user(id_token)
-                print(f"User registered: {user.email}")
-            else:
-                print(f"User found in database: {user.email}")
-            
-            return user
-        except Exception as e:
-            print(f"Socket.IO authentication failed: {str(e)}")
-            print(f"Exception type: {type(e)}")
-            raise e
-    
     @socketio.on('join_canvas')
     def handle_join_canvas(data):
         """Handle user joining a canvas room."""
@@ -43,13 +23,13 @@ def register_canvas_handlers(socketio):
             print(f"Canvas ID: {canvas_id}")
             print(f"Token provided: {bool(id_token)}")
             
-            if not canvas_id or not id_token:
-                emit('error', {'message': 'canvas_id and id_token are required'})
+            if not canvas_id:
+                emit('error', {'message': 'canvas_id is required'})
                 return
             
-            # Verify authentication
+            # Verify authentication (binds the user to this connection)
             try:
-                user = authenticate_socket_user(id_token)
+                user = get_socket_user(data)
             except Exception as e:
                 emit('error', {'message': f'Authentication failed: {str(e)}'})
                 return
@@ -60,14 +40,35 @@ def register_canvas_handlers(socketio):
                 emit('error', {'message': 'Access denied to canvas'})
                 return
             
-            # Join the canvas room
+            # Join the canvas room; the first member loads the canvas into memory
             join_room(canvas_id)
+            canvas_states.acquire(canvas_id)
             
             # Store user info in session
-            emit('joined_canvas', {
+            joined = {
                 'canvas_id': canvas_id,
-                'user': user.to_dict()
-            })
+                'user': user.to_dict(),
+                **room_events.position(canvas_id)
+            }
+            snapshot = None
+            if data.get('with_objects'):
+                # Served from memory, including edits the write buffer has not persisted yet
+                snapshot = canvas_states.snapshot(canvas_id)
+                if snapshot is not None:
+                    joined.update(snapshot)
+            emit('joined_canvas', joined)
+            
+            # Reconnecting clients send the last seq they applied; replay what they missed.
+            # A snapshot already holds those events (clients restart from its seq), so it needs no replay.
+            # Events broadcast since join_room may arrive twice, so clients skip seqs already applied.
+            last_seq = data.get('last_seq')
+            if snapshot is None and isinstance(last_seq, int) and not isinstance(last_seq, bool):
+                missed = room_events.since(canvas_id, data.get('epoch'), last_seq)
+                if missed is None:
+                    # Gap no longer buffered (or another server epoch): reload over REST
+                    emit('canvas_resync', {'canvas_id': canvas_id, **room_events.position(canvas_id)})
+                else:
+                    emit('canvas_replay', {'canvas_id': canvas_id, 'events': missed})
             
             # Notify others in the room
             emit('user_joined', {
@@ -77,27 +78,32 @@ def register_canvas_handlers(socketio):
         except Exception as e:
             emit('error', {'message': str(e)})
     
+    def _broadcast(canvas_id, event, payload):
+        """Emit an object event to the canvas room, stamped with seq/epoch and kept for replay."""
+        emit(event, room_events.record(canvas_id, event, payload), room=canvas_id, include_self=True)
+    
     @socketio.on('leave_canvas')
     def handle_leave_canvas(data):
         """Handle user leaving a canvas room."""
         try:
             canvas_id = data.get('canvas_id')
-            id_token = data.get('id_token')
             
-            if not canvas_id or not id_token:
+            if not canvas_id:
                 return
             
             # Verify authentication
-            auth_service = AuthService()
             try:
-                decoded_token = auth_service.verify_token(id_token)
-                user = auth_service.get_user_by_id(decoded_token['uid'])
+                user = get_socket_user(data)
             except Exception:
                 return
             
             # Leave the canvas room
             leave_room(canvas_id)
             
+            # Write out buffered updates and let the hot state go once the last member has left
+            if room_is_empty(canvas_id):
+                canvas_states.release(canvas_id)
+            
             # Notify others in the room
             emit('user_left', {
                 'user_id': user.id,
@@ -112,18 +118,15 @@ def register_canvas_handlers(socketio):
         """Handle canvas object creation."""
         try:
             canvas_id = data.get('canvas_id')
-            id_token = data.get('id_token')
             object_data = data.get('object')
             
-            if not all([canvas_id, id_token, object_data]):
-                emit('error', {'message': 'canvas_id, id_token, and object are required'})
+            if not all([canvas_id, object_data]):
+                emit('error', {'message': 'canvas_id and object are required'})
                 return
             
             # Verify authentication
-            auth_service = AuthService()
             try:
-                decoded_token = auth_service.verify_token(id_token)
-                user = auth_service.get_user_by_id(decoded_token['uid'])
+                user = get_socket_user(data)
             except Exception as e:
                 emit('error', {'message': f'Authentication failed: {str(e)}'})
                 return
@@ -143,31 +146,32 @@ def register_canvas_handlers(socketio):
             )
             
             # Broadcast to all users in the canvas room (including the creator)
-            emit('object_created', {
+            _broadcast(canvas_id, 'object_created', {
                 'object': canvas_object.to_dict()
-            }, room=canvas_id, include_self=True)
+            })
             
         except Exception as e:
             emit('error', {'message': str(e)})
     
     @socketio.on('object_updated')
     def handle_object_updated(data):
-        """Handle canvas object update."""
+        """Handle canvas object update (full properties, or a merge patch)."""
         try:
             canvas_id = data.get('canvas_id')
-            id_token = data.get('id_token')
             object_id = data.get('object_id')
             properties = data.get('properties')
+            patch = data.get('patch')
             
-            if not all([canvas_id, id_token, object_id, properties]):
-                emit('error', {'message': 'canvas_id, id_token, object_id, and properties are required'})
+            if not all([canvas_id, object_id]) or (properties is None and patch is None):
+                emit('error', {'message': 'canvas_id, object_id, and properties or patch are required'})
+                return
+            if patch is not None and not isinstance(patch, dict):
+                emit('error', {'message': 'patch must be an object'})
                 return
             
             # Verify authentication
-            auth_service = AuthService()
             try:
-                decoded_token = auth_service.verify_token(id_token)
-                user = auth_service.get_user_by_id(decoded_token['uid'])
+                user = get_socket_user(data)
             except Exception as e:
                 emit('error', {'message': f'Authentication failed: {str(e)}'})
                 return
@@ -178,38 +182,91 @@ def register_canvas_handlers(socketio):
                 emit('error', {'message': 'Edit permission required'})
                 return
             
+            if object_write_buffer.enabled:
+                _buffer_object_update(canvas_service, canvas_id, object_id, properties, patch, user.id)
+                return
+            
+            if patch is not None:
+                canvas_object = canvas_service.get_canvas_object_by_id(object_id)
+                if not canvas_object or canvas_object.canvas_id != canvas_id:
+                    emit('error', {'message': 'Object not found'})
+                    return
+                
+                patched_object = canvas_service.patch_canvas_object(object_id, patch, actor_id=user.id)
+                
+                # Broadcast only the changed keys; clients apply them to their copy
+                _broadcast(canvas_id, 'object_patched', {
+                    'object_id': object_id,
+                    'canvas_id': canvas_id,
+                    'patch': patch,
+                    'version': patched_object.change_seq,
+                    'updated_at': patched_object.updated_at.isoformat()
+                })
+                return
+            
             # Update object in database
             updated_object = canvas_service.update_canvas_object(
                 object_id=object_id,
+                actor_id=user.id,
                 properties=json.dumps(properties)
             )
             
             if updated_object:
                 # Broadcast to all users in the canvas room (including the updater)
-                emit('object_updated', {
+                _broadcast(canvas_id, 'object_updated', {
                     'object': updated_object.to_dict()
-                }, room=canvas_id, include_self=True)
+                })
             
         except Exception as e:
             emit('error', {'message': str(e)})
     
+    def _buffer_object_update(canvas_service, canvas_id, object_id, properties, patch, actor_id):
+        """Broadcast an update now and leave the database write to the write-behind buffer."""
+        # The hot canvas state (or a pending write) avoids a database read per edit
+        current = object_write_buffer.get(canvas_id, object_id) or canvas_states.get_object(canvas_id, object_id)
+        if current is None:
+            canvas_object = canvas_service.get_canvas_object_by_id(object_id)
+            if not canvas_object or canvas_object.canvas_id != canvas_id:
+                emit('error', {'message': 'Object not found'})
+                return
+            current = canvas_object.to_dict()
+        
+        if patch is not None:
+            properties = apply_merge_patch(current['properties'], patch)
+        updated_at = datetime.utcnow().isoformat()
+        updated = dict(current, properties=properties, updated_at=updated_at)
+        # Buffer first: a concurrent flush then never overwrites the state with an older copy
+        object_write_buffer.enqueue(canvas_id, updated, actor_id)
+        canvas_states.apply(canvas_id, updated)
+        
+        # The canvas version is assigned when the buffer flushes
+        if patch is not None:
+            _broadcast(canvas_id, 'object_patched', {
+                'object_id': object_id,
+                'canvas_id': canvas_id,
+                'patch': patch,
+                'version': None,
+                'updated_at': updated_at
+            })
+        else:
+            _broadcast(canvas_id, 'object_updated', {
+                'object': updated
+            })
+    
     @socketio.on('object_deleted')
     def handle_object_deleted(data):
         """Handle canvas object deletion."""
         try:
             canvas_id = data.get('canvas_id')
-            id_token = data.get('id_token')
             object_id = data.get('object_id')
             
-            if not all([canvas_id, id_token, object_id]):
-                emit('error', {'message': 'canvas_id, id_token, and object_id are required'})
+            if not all([canvas_id, object_id]):
+                emit('error', {'message': 'canvas_id and object_id are required'})
                 return
             
             # Verify authentication
-            auth_service = AuthService()
             try:
-                decoded_token = auth_service.verify_token(id_token)
-                user = auth_service.get_user_by_id(decoded_token['uid'])
+                user = get_socket_user(data)
             except Exception as e:
                 emit('error', {'message': f'Authentication failed: {str(e)}'})
                 return
@@ -220,14 +277,74 @@ def register_canvas_handlers(socketio):
                 emit('error', {'message': 'Edit permission required'})
                 return
             
-            # Delete object from database
-            success = canvas_service.delete_canvas_object(object_id)
+            # Delete object from database (any buffered update is moot)
+            object_write_buffer.discard(canvas_id, object_id)
+            success = canvas_service.delete_canvas_object(object_id, actor_id=user.id)
             
             if success:
                 # Broadcast to all users in the canvas room (including the deleter)
-                emit('object_deleted', {
+                _broadcast(canvas_id, 'object_deleted', {
                     'object_id': object_id
-                }, room=canvas_id, include_self=True)
+                })
+            
+        except Exception as e:
+            emit('error', {'message': str(e)})
+    
+    @socketio.on('objects_batch')
+    def handle_objects_batch(data):
+        """Handle many object creates/updates/patches/deletes as one transaction and one broadcast."""
+        try:
+            canvas_id = data.get('canvas_id')
+            operations = data.get('operations')
+            
+            if not canvas_id or not isinstance(operations, list):
+                emit('error', {'message': 'canvas_id and an operations list are required'})
+                return
+            if len(operations) > BATCH_MAX_OPERATIONS:
+                emit('error', {'message': f'At most {BATCH_MAX_OPERATIONS} operations per batch'})
+                return
+            
+            # Verify authentication
+            try:
+                user = get_socket_user(data)
+            except Exception as e:
+                emit('error', {'message': f'Authentication failed: {str(e)}'})
+                return
+            
+            # Check edit permission once for the whole batch
+            canvas_service = CanvasService()
+            if not canvas_service.check_canvas_permission(canvas_id, user.id, 'edit'):
+                emit('error', {'message': 'Edit permission required'})
+                return
+            
+            object_write_buffer.flush_canvas(canvas_id)
+            version, results = canvas_service.apply_object_batch(canvas_id, operations, user.id)
+            
+            # Per-item outcome for the sender only
+            emit('objects_batch_result', {
+                'canvas_id': canvas_id,
+                'batch_id': data.get('batch_id'),
+                'version': version,
+                'results': results
+            })
+            
+            applied = []
+            for result in results:
+                if not result['ok']:
+                    continue
+                change = {'op': result['op'], 'object_id': result['object_id']}
+                if 'object' in result:
+                    change['object'] = result['object']
+                if 'patch' in result:
+                    change['patch'] = result['patch']
+                applied.append(change)
+            if applied:
+                # One message for the whole batch, applied by clients in order
+                _broadcast(canvas_id, 'objects_batch', {
+                    'canvas_id': canvas_id,
+                    'version': version,
+                    'changes': applied
+                })
             
         except Exception as e:
             emit('error', {'message': str(e)})
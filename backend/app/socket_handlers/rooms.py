@@ -0,0 +1,15 @@
+from app.extensions import socketio
+from app.services.canvas_state import canvas_states
+
+def room_is_empty(room: str, leaving_sid: str = None, namespace: str = '/') -> bool:
+    """True when no connection other than leaving_sid is in room (on this node)."""
+    for sid, _ in socketio.server.manager.get_participants(namespace, room):
+        if sid != leaving_sid:
+            return False
+    return True
+
+def release_rooms_left_empty(sid: str, namespace: str = '/') -> None:
+    """Release (flush and mark idle) the hot state of every canvas room that sid was the last member of."""
+    for room in list(socketio.server.manager.get_rooms(sid, namespace)):
+        if room != sid and room_is_empty(room, sid, namespace):
+            canvas_states.release(room)
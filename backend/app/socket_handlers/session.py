@@ -0,0 +1,100 @@
+import threading
+import time
+from typing import Dict, Optional
+from flask import request
+from app.services.auth_service import get_auth_service
+
+# Connections authenticated without an exp claim (e.g. mock tokens) stay bound this long.
+DEFAULT_SESSION_TTL = 3600
+
+class SocketIdentity:
+    """Snapshot of the authenticated user bound to a Socket.IO connection."""
+
+    __slots__ = ('id', 'email', 'name', 'avatar_url', 'expires_at', '_user_dict')
+
+    def __init__(self, user, expires_at: float):
+        self.id = user.id
+        self.email = user.email
+        self.name = user.name
+        self.avatar_url = user.avatar_url
+        self.expires_at = expires_at
+        self._user_dict = user.to_dict()
+
+    def is_expired(self) -> bool:
+        return time.time() >= self.expires_at
+
+    def to_dict(self) -> Dict:
+        return dict(self._user_dict)
+
+class SocketSessionStore:
+    """Maps Socket.IO session ids to the identity authenticated on that connection."""
+
+    def __init__(self):
+        self._sessions: Dict[str, SocketIdentity] = {}
+        self._lock = threading.Lock()
+
+    def bind(self, sid: str, user, expires_at: float) -> SocketIdentity:
+        identity = SocketIdentity(user, expires_at)
+        with self._lock:
+            self._sessions[sid] = identity
+        return identity
+
+    def get(self, sid: str) -> Optional[SocketIdentity]:
+        with self._lock:
+            return self._sessions.get(sid)
+
+    def unbind(self, sid: str) -> Optional[SocketIdentity]:
+        with self._lock:
+            return self._sessions.pop(sid, None)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+socket_sessions = SocketSessionStore()
+
+def _token_expiry(decoded_token) -> float:
+    exp = decoded_token.get('exp')
+    return float(exp) if exp is not None else time.time() + DEFAULT_SESSION_TTL
+
+def authenticate_socket(id_token: str, sid: Optional[str] = None) -> SocketIdentity:
+    """Verify id_token, load (or register) the user and bind them to the connection."""
+    auth_service = get_auth_service()
+    decoded_token = auth_service.verify_token(id_token)
+
+    user = auth_service.get_user_by_id(decoded_token['uid'])
+    if not user:
+        user = auth_service.register_user(id_token)
+
+    return socket_sessions.bind(sid or request.sid, user, _token_expiry(decoded_token))
+
+def refresh_socket_token(id_token: str, sid: Optional[str] = None) -> SocketIdentity:
+    """Extend the bound session with a rotated token for the same user."""
+    sid = sid or request.sid
+    identity = socket_sessions.get(sid)
+    decoded_token = get_auth_service().verify_token(id_token)
+
+    if identity is None:
+        return authenticate_socket(id_token, sid)
+    if decoded_token['uid'] != identity.id:
+        raise Exception('Refreshed token belongs to a different user')
+
+    identity.expires_at = _token_expiry(decoded_token)
+    return identity
+
+def get_socket_user(data: Optional[Dict] = None) -> SocketIdentity:
+    """Return the identity bound to this connection.
+
+    Falls back to an ``id_token`` in the event payload for clients that have
+    not authenticated the connection (or whose session has expired).
+    """
+    identity = socket_sessions.get(request.sid)
+    if identity is not None and not identity.is_expired():
+        return identity
+
+    id_token = (data or {}).get('id_token')
+    if not id_token:
+        if identity is not None:
+            raise Exception('Session expired, send refresh_token')
+        raise Exception('Authentication required')
+
+    return authenticate_socket(id_token)
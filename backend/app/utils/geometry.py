@@ -0,0 +1,126 @@
+import math
+from typing import Dict, Optional, Tuple
+
+Bounds = Tuple[float, float, float, float]  # (min_x, min_y, max_x, max_y)
+
+# Sizes the frontend uses when a property is missing
+DEFAULT_SHAPE_SIZE = 40
+DEFAULT_STICKY_NOTE_SIZE = 200
+DEFAULT_FONT_SIZE = 16
+DEFAULT_LINE_POINTS = (0, 0, 100, 0)
+# Rough advance width of a glyph relative to font size, used to size text without a renderer
+TEXT_CHAR_WIDTH = 0.6
+TEXT_LINE_HEIGHT = 1.2
+
+def _number(value, default: float = 0.0) -> float:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return default
+    return number if math.isfinite(number) else default
+
+def _rotate_bounds(bounds: Bounds, origin_x: float, origin_y: float, degrees: float) -> Bounds:
+    """Axis-aligned bounds of bounds rotated about (origin_x, origin_y), as Konva rotates a node."""
+    radians = math.radians(degrees)
+    cos, sin = math.cos(radians), math.sin(radians)
+    min_x, min_y, max_x, max_y = bounds
+    xs, ys = [], []
+    for x, y in ((min_x, min_y), (max_x, min_y), (max_x, max_y), (min_x, max_y)):
+        dx, dy = x - origin_x, y - origin_y
+        xs.append(origin_x + dx * cos - dy * sin)
+        ys.append(origin_y + dx * sin + dy * cos)
+    return min(xs), min(ys), max(xs), max(ys)
+
+def _local_bounds(object_type: str, props: Dict, x: float, y: float) -> Optional[Bounds]:
+    if object_type == 'rectangle':
+        width, height = _number(props.get('width')), _number(props.get('height'))
+        # Konva allows negative sizes, which extend left/up from the origin
+        return min(x, x + width), min(y, y + height), max(x, x + width), max(y, y + height)
+
+    if object_type == 'sticky-note':
+        width = abs(_number(props.get('width'), DEFAULT_STICKY_NOTE_SIZE))
+        height = abs(_number(props.get('height'), DEFAULT_STICKY_NOTE_SIZE))
+        return x, y, x + width, y + height
+
+    if object_type == 'circle':
+        radius = abs(_number(props.get('radius')))
+        return x - radius, y - radius, x + radius, y + radius
+
+    if object_type in ('star', 'diamond'):
+        # Drawn as regular polygons centred on (x, y) with radius width / 2
+        radius = abs(_number(props.get('width'), DEFAULT_SHAPE_SIZE)) / 2
+        return x - radius, y - radius, x + radius, y + radius
+
+    if object_type == 'heart':
+        # Two lobes at +-0.3w and a point at +0.3h; reaches at most half the larger side plus the point
+        width = abs(_number(props.get('width'), DEFAULT_SHAPE_SIZE))
+        height = abs(_number(props.get('height'), DEFAULT_SHAPE_SIZE))
+        half = max(width, height) / 2
+        return x - half, y - half, x + half, y + max(half, 0.3 * height + 0.3 * width)
+
+    if object_type in ('line', 'arrow', 'pen'):
+        points = props.get('points') or DEFAULT_LINE_POINTS
+        if not isinstance(points, (list, tuple)) or len(points) < 2:
+            points = DEFAULT_LINE_POINTS
+        xs = [_number(v) for v in points[0::2]]
+        ys = [_number(v) for v in points[1::2]]
+        pad = _number(props.get('pointerLength'), 10) if object_type == 'arrow' else 0
+        return x + min(xs) - pad, y + min(ys) - pad, x + max(xs) + pad, y + max(ys) + pad
+
+    if object_type == 'text':
+        font_size = abs(_number(props.get('fontSize'), DEFAULT_FONT_SIZE))
+        lines = str(props.get('text') or '').split('\n')
+        width = props.get('width')
+        width = abs(_number(width)) if width is not None else font_size * TEXT_CHAR_WIDTH * max(len(line) for line in lines)
+        return x, y, x + width, y + font_size * TEXT_LINE_HEIGHT * len(lines)
+
+    return None
+
+def object_bounds(object_type: str, props: Optional[Dict]) -> Optional[Bounds]:
+    """Conservative axis-aligned bounding box of a canvas object in canvas coordinates.
+
+    Covers every shape the toolbar creates and includes stroke width and
+    rotation. Returns None for object types whose extent is unknown, which
+    callers should treat as "always visible".
+    """
+    if not isinstance(props, dict):
+        return None
+    x, y = _number(props.get('x')), _number(props.get('y'))
+    bounds = _local_bounds(object_type, props, x, y)
+    if bounds is None:
+        return None
+
+    rotation = _number(props.get('rotation'))
+    if rotation % 360:
+        bounds = _rotate_bounds(bounds, x, y, rotation)
+
+    stroke = abs(_number(props.get('strokeWidth'))) / 2
+    min_x, min_y, max_x, max_y = bounds
+    return min_x - stroke, min_y - stroke, max_x + stroke, max_y + stroke
+
+def geometry_columns(object_type: str, props: Optional[Dict]) -> Dict:
+    """Values for CanvasObject's typed geometry columns, derived from its properties."""
+    props = props if isinstance(props, dict) else {}
+    bounds = object_bounds(object_type, props)
+    min_x, min_y, max_x, max_y = bounds if bounds is not None else (None, None, None, None)
+    return {
+        'min_x': min_x,
+        'min_y': min_y,
+        'max_x': max_x,
+        'max_y': max_y,
+        'z_index': int(_number(props.get('zIndex', props.get('z_index')))),
+        'rotation': _number(props.get('rotation')) % 360
+    }
+
+def parse_bbox(value: str) -> Bounds:
+    """Parse an ``x0,y0,x1,y1`` query value; raises ValueError when malformed."""
+    parts = value.split(',')
+    if len(parts) != 4:
+        raise ValueError('bbox must be x0,y0,x1,y1')
+    x0, y0, x1, y1 = (float(part) for part in parts)
+    if not all(math.isfinite(v) for v in (x0, y0, x1, y1)):
+        raise ValueError('bbox must be finite numbers')
+    return min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)
+
+def intersects(a: Bounds, b: Bounds) -> bool:
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
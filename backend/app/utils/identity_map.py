@@ -0,0 +1,73 @@
+import logging
+import threading
+from typing import Any, Dict, Optional
+from flask import g, has_request_context, request
+from app.extensions import db
+
+logger = logging.getLogger(__name__)
+
+class IdentityMapStats:
+    """Process-wide counters for request-scoped primary-key lookups."""
+
+    def __init__(self):
+        self.lookups = 0
+        self.deduplicated = 0
+        self._lock = threading.Lock()
+
+    def record(self, deduplicated: bool) -> None:
+        with self._lock:
+            self.lookups += 1
+            if deduplicated:
+                self.deduplicated += 1
+
+    def to_dict(self) -> Dict[str, int]:
+        return {'lookups': self.lookups, 'deduplicated': self.deduplicated}
+
+identity_map_stats = IdentityMapStats()
+
+def _current_map() -> Optional[Dict]:
+    """Return the memo for the current request or socket event.
+
+    The memo is tied to the request object so a long-lived app context (CLI
+    commands, background tasks, tests) never serves rows from an earlier
+    unit of work. Outside a request there is no memo.
+    """
+    if not has_request_context():
+        return None
+    owner = request._get_current_object()
+    state = g.get('_identity_map')
+    if state is None or state[0] is not owner:
+        state = (owner, {})
+        g._identity_map = state
+    return state[1]
+
+def get_by_id(model, pk) -> Any:
+    """Load model by primary key, at most once per request or socket event."""
+    if pk is None:
+        return None
+    memo = _current_map()
+    if memo is None:
+        return db.session.get(model, pk)
+
+    key = (model, pk)
+    if key in memo:
+        identity_map_stats.record(deduplicated=True)
+        logger.debug(f"Identity map hit for {model.__name__} {pk}")
+        return memo[key]
+
+    identity_map_stats.record(deduplicated=False)
+    instance = db.session.get(model, pk)
+    memo[key] = instance
+    return instance
+
+def remember(instance) -> None:
+    """Record a newly created row so later lookups in this unit of work reuse it."""
+    memo = _current_map()
+    if memo is not None:
+        memo[(type(instance), instance.id)] = instance
+
+def forget(model, pk) -> None:
+    """Drop a row (e.g. after deleting it) from the current unit of work."""
+    memo = _current_map()
+    if memo is not None:
+        memo.pop((model, pk), None)
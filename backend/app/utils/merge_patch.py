@@ -0,0 +1,20 @@
+from typing import Any, Dict
+
+MERGE_PATCH_MIMETYPE = 'application/merge-patch+json'
+
+def apply_merge_patch(target: Any, patch: Any) -> Any:
+    """Apply a JSON merge patch (RFC 7386) to target and return the result.
+
+    Objects are merged key by key, ``null`` removes a key, and any other
+    value (including arrays) replaces what was there. target is not modified.
+    """
+    if not isinstance(patch, dict):
+        return patch
+
+    result: Dict = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = apply_merge_patch(result.get(key), value)
+    return result
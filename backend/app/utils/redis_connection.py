@@ -0,0 +1,236 @@
+import threading
+import time
+from typing import Any, Dict, List, Optional
+import logging
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+class RedisUnavailable(redis.ConnectionError):
+    """Raised instead of sending a command while the circuit breaker is open."""
+
+class MeteredPipeline:
+    """Pipeline that times its round-trips and splits long non-transactional batches.
+
+    Commands are staged on the wrapped redis-py pipeline as usual. Without
+    MULTI, every ``max_batch`` staged commands are sent straight away so one
+    huge batch never monopolises Redis; ``execute()`` sends the rest and
+    returns the replies of every chunk in order.
+    """
+
+    def __init__(self, manager: 'RedisConnectionManager', pipe, transaction: bool, max_batch: int):
+        self._manager = manager
+        self._pipe = pipe
+        self._split = not transaction and max_batch > 0
+        self._max_batch = max_batch
+        self._results: List[Any] = []
+
+    def __len__(self) -> int:
+        return len(self._pipe)
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._pipe, name)
+        if not callable(attr):
+            return attr
+
+        def stage(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            if self._split and len(self._pipe) >= self._max_batch:
+                self._results.extend(self._send())
+            return self if result is self._pipe else result
+        return stage
+
+    def _send(self) -> List[Any]:
+        return self._manager.call('PIPELINE', self._pipe.execute, batch=len(self._pipe))
+
+    def execute(self) -> List[Any]:
+        results, self._results = self._results, []
+        if len(self._pipe):
+            results.extend(self._send())
+        return results
+
+class MeteredRedis:
+    """redis.Redis stand-in whose commands are timed and guarded by the manager's breaker."""
+
+    def __init__(self, manager: 'RedisConnectionManager', client: redis.Redis):
+        self._manager = manager
+        self._client = client
+
+    def pipeline(self, transaction: bool = True, max_batch: Optional[int] = None) -> MeteredPipeline:
+        max_batch = self._manager.pipeline_max_commands if max_batch is None else max_batch
+        return MeteredPipeline(self._manager, self._client.pipeline(transaction=transaction), transaction, max_batch)
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+        command = name.upper()
+
+        def call(*args, **kwargs):
+            return self._manager.call(command, attr, *args, **kwargs)
+        return call
+
+class RedisConnectionManager:
+    """App-managed Redis access: one bounded connection pool, lazy health checks and a circuit breaker.
+
+    Nothing connects at import or start-up. The first ``client()`` call
+    pings Redis (bounded by the connect timeout); after that pooled
+    connections are re-checked by redis-py every ``health_check_interval``
+    seconds of idleness. ``breaker_threshold`` consecutive connection
+    errors, timeouts or commands slower than ``slow_ms`` open the breaker:
+    for ``breaker_cooldown`` seconds ``client()`` returns None (callers
+    fall back exactly as they do without Redis) and commands on clients
+    already handed out raise RedisUnavailable without touching the
+    network. The next ``client()`` call after the cooldown pings again and
+    closes the breaker if Redis answers in time.
+
+    Every command and pipeline round-trip is timed per command name.
+    """
+
+    def __init__(self):
+        self.url: Optional[str] = None
+        self.pool: Optional[redis.ConnectionPool] = None
+        self._client: Optional[MeteredRedis] = None
+        self.max_connections = 50
+        self.socket_timeout = 0.5
+        self.connect_timeout = 0.5
+        self.slow_ms = 250.0
+        self.breaker_threshold = 5
+        self.breaker_cooldown = 10.0
+        self.pipeline_max_commands = 1000
+        self._lock = threading.Lock()
+        self._reset_state()
+
+    def _reset_state(self) -> None:
+        self.state = 'unchecked'  # then 'closed' (healthy) or 'open' (failing)
+        self._open_until = 0.0
+        self._probing = False
+        self.failures = 0
+        self.trips = 0
+        self.rejected = 0
+        self._commands: Dict[str, List[float]] = {}  # name -> [calls, errors, total_ms, max_ms]
+        self.pipelined_commands = 0
+
+    def init_app(self, app) -> None:
+        self.url = app.config.get('REDIS_URL')
+        self.max_connections = int(app.config.get('REDIS_MAX_CONNECTIONS', 50))
+        self.socket_timeout = app.config.get('REDIS_SOCKET_TIMEOUT_MS', 500) / 1000
+        self.connect_timeout = app.config.get('REDIS_CONNECT_TIMEOUT_MS', 500) / 1000
+        self.slow_ms = float(app.config.get('REDIS_SLOW_COMMAND_MS', 250))
+        self.breaker_threshold = max(int(app.config.get('REDIS_BREAKER_THRESHOLD', 5)), 1)
+        self.breaker_cooldown = float(app.config.get('REDIS_BREAKER_COOLDOWN', 10))
+        self.pipeline_max_commands = int(app.config.get('REDIS_PIPELINE_MAX_COMMANDS', 1000))
+        if self.pool is not None:
+            self.pool.disconnect()
+        self.pool = None
+        self._client = None
+        with self._lock:
+            self._reset_state()
+        if self.url:
+            self.pool = redis.ConnectionPool.from_url(
+                self.url,
+                max_connections=self.max_connections,
+                socket_timeout=self.socket_timeout,
+                socket_connect_timeout=self.connect_timeout,
+                health_check_interval=int(app.config.get('REDIS_HEALTH_CHECK_INTERVAL', 30))
+            )
+            self._client = MeteredRedis(self, redis.Redis(connection_pool=self.pool))
+        app.extensions['redis'] = self
+
+    @property
+    def enabled(self) -> bool:
+        return self._client is not None
+
+    def client(self) -> Optional[MeteredRedis]:
+        """The shared client, or None when Redis is not configured or the breaker is open."""
+        if self._client is None:
+            return None
+        with self._lock:
+            if self.state == 'closed':
+                return self._client
+            if self._probing or (self.state == 'open' and time.monotonic() < self._open_until):
+                self.rejected += 1
+                return None
+            self._probing = True
+
+        try:
+            self._client.ping()
+        except redis.RedisError as e:
+            logger.warning(f"Redis health check failed: {e}")
+        finally:
+            with self._lock:
+                self._probing = False
+        return self._client if self.state == 'closed' else None
+
+    def call(self, command: str, func, *args, batch: int = 0, **kwargs):
+        """Run one Redis round-trip, recording its latency and feeding the breaker."""
+        with self._lock:
+            if self.state == 'open' and time.monotonic() < self._open_until:
+                self.rejected += 1
+                raise RedisUnavailable('Redis circuit breaker is open')
+
+        started = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except (redis.ConnectionError, redis.TimeoutError):
+            self._record(command, (time.perf_counter() - started) * 1000, batch, error=True, failure=True)
+            raise
+        except redis.RedisError:
+            # A command error (wrong type, script error) says nothing about Redis's health
+            self._record(command, (time.perf_counter() - started) * 1000, batch, error=True, failure=False)
+            raise
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self._record(command, elapsed_ms, batch, error=False, failure=elapsed_ms > self.slow_ms)
+        return result
+
+    def _record(self, command: str, elapsed_ms: float, batch: int, error: bool, failure: bool) -> None:
+        with self._lock:
+            entry = self._commands.setdefault(command, [0, 0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += int(error)
+            entry[2] += elapsed_ms
+            entry[3] = max(entry[3], elapsed_ms)
+            self.pipelined_commands += batch
+
+            if not failure:
+                self.failures = 0
+                self.state = 'closed'
+                return
+            self.failures += 1
+            # A failed health check opens the breaker at once; live traffic needs a run of failures
+            if self.state == 'unchecked' or self._probing or self.failures >= self.breaker_threshold:
+                if self.state != 'open':
+                    self.trips += 1
+                    logger.warning(f"Redis circuit breaker opened for {self.breaker_cooldown:g}s "
+                                   f"after {self.failures} failure(s), last: {command}")
+                self.state = 'open'
+                self._open_until = time.monotonic() + self.breaker_cooldown
+
+    def stats(self) -> Dict:
+        with self._lock:
+            commands = {
+                command: {
+                    'calls': int(calls),
+                    'errors': int(errors),
+                    'avg_ms': round(total_ms / calls, 2) if calls else 0.0,
+                    'max_ms': round(max_ms, 2)
+                }
+                for command, (calls, errors, total_ms, max_ms) in sorted(self._commands.items())
+            }
+            stats = {
+                'enabled': self.enabled,
+                'state': self.state if self.enabled else 'disabled',
+                'consecutive_failures': self.failures,
+                'trips': self.trips,
+                'rejected': self.rejected,
+                'pipelined_commands': self.pipelined_commands,
+                'commands': commands
+            }
+        if self.pool is not None:
+            stats['pool'] = {
+                'max_connections': self.max_connections,
+                'in_use': len(getattr(self.pool, '_in_use_connections', ())),
+                'idle': len(getattr(self.pool, '_available_connections', ()))
+            }
+        return stats
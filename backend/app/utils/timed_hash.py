@@ -0,0 +1,97 @@
+import time
+from typing import Dict, Iterable, Optional
+
+def _text(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+class TimedHash:
+    """Per-scope Redis hash of JSON entries plus a sorted set of their last-seen times.
+
+    For a scope (a canvas id) the entries live in ``{prefix}:{scope}`` and
+    the sorted set ``{prefix}:{scope}:seen`` scores each member by the epoch
+    second it was last written. Listing live members, counting them and
+    sweeping expired ones therefore touch only that scope's keys, never the
+    whole keyspace. Both keys also expire ``ttl`` seconds after the last
+    write so abandoned scopes disappear on their own.
+
+    Write methods only stage commands on a pipeline so callers can batch
+    several scopes into one round-trip.
+    """
+
+    def __init__(self, prefix: str, ttl: float):
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def keys(self, scope: str):
+        return f'{self.prefix}:{scope}', f'{self.prefix}:{scope}:seen'
+
+    def stage_set(self, pipe, scope: str, entries: Dict[str, str], seen: Dict[str, float]) -> None:
+        """Stage writing entries (member -> JSON) last seen at seen[member]."""
+        if not entries:
+            return
+        hash_key, seen_key = self.keys(scope)
+        pipe.hset(hash_key, mapping=entries)
+        pipe.zadd(seen_key, seen)
+        pipe.expire(hash_key, int(self.ttl))
+        pipe.expire(seen_key, int(self.ttl))
+
+    def stage_remove(self, pipe, scope: str, members: Iterable[str]) -> None:
+        members = list(members)
+        if not members:
+            return
+        hash_key, seen_key = self.keys(scope)
+        pipe.hdel(hash_key, *members)
+        pipe.zrem(seen_key, *members)
+
+    def set(self, client, scope: str, member: str, entry: str, now: Optional[float] = None) -> None:
+        pipe = client.pipeline(transaction=False)
+        self.stage_set(pipe, scope, {member: entry}, {member: time.time() if now is None else now})
+        pipe.execute()
+
+    def remove(self, client, scope: str, *members: str) -> None:
+        pipe = client.pipeline(transaction=False)
+        self.stage_remove(pipe, scope, members)
+        pipe.execute()
+
+    def get(self, client, scope: str, member: str, now: Optional[float] = None) -> Optional[str]:
+        """One member's entry, or None when it is missing or expired."""
+        hash_key, seen_key = self.keys(scope)
+        pipe = client.pipeline(transaction=False)
+        pipe.hget(hash_key, member)
+        pipe.zscore(seen_key, member)
+        entry, seen = pipe.execute()
+        cutoff = (time.time() if now is None else now) - self.ttl
+        if entry is None or seen is None or seen < cutoff:
+            return None
+        return _text(entry)
+
+    def live(self, client, scope: str, now: Optional[float] = None) -> Dict[str, str]:
+        """Entries seen within ttl, member -> JSON, in one round-trip."""
+        hash_key, seen_key = self.keys(scope)
+        cutoff = (time.time() if now is None else now) - self.ttl
+        pipe = client.pipeline(transaction=False)
+        pipe.zrangebyscore(seen_key, cutoff, '+inf')
+        pipe.hgetall(hash_key)
+        members, entries = pipe.execute()
+        live_members = {_text(member) for member in members}
+        return {
+            _text(member): _text(entry) for member, entry in entries.items()
+            if _text(member) in live_members
+        }
+
+    def count(self, client, scope: str, now: Optional[float] = None) -> int:
+        cutoff = (time.time() if now is None else now) - self.ttl
+        return client.zcount(self.keys(scope)[1], cutoff, '+inf')
+
+    def sweep(self, client, scope: str, now: Optional[float] = None) -> int:
+        """Delete entries not seen within ttl; returns how many were removed."""
+        hash_key, seen_key = self.keys(scope)
+        cutoff = (time.time() if now is None else now) - self.ttl
+        expired = [_text(member) for member in client.zrangebyscore(seen_key, '-inf', f'({cutoff}')]
+        if expired:
+            # A member refreshed in between loses its entry until its next write; live() skips it meanwhile
+            pipe = client.pipeline(transaction=False)
+            pipe.hdel(hash_key, *expired)
+            pipe.zremrangebyscore(seen_key, '-inf', f'({cutoff}')
+            pipe.execute()
+        return len(expired)
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Benchmark CanvasService.check_canvas_permission with and without the
+permission decision cache.
+
+Usage: python benchmarks/permission_check.py [iterations]
+"""
+
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('FLASK_ENV', 'testing')
+
+from app import create_app
+from app.config import TestingConfig
+from app.extensions import db
+from app.models import User, Canvas, CanvasPermission
+from app.services.canvas_service import CanvasService
+from app.services.permission_cache import permission_cache
+
+def setup_data():
+    owner = User(id='bench-owner', email='owner@bench.local', name='Owner')
+    editor = User(id='bench-editor', email='editor@bench.local', name='Editor')
+    canvas = Canvas(id=str(uuid.uuid4()), title='Bench', owner_id=owner.id, is_public=False)
+    db.session.add_all([owner, editor, canvas])
+    db.session.flush()
+    db.session.add(CanvasPermission(
+        canvas_id=canvas.id, user_id=editor.id, permission_type='edit', granted_by=owner.id
+    ))
+    db.session.commit()
+    return canvas.id, editor.id
+
+def run(service, canvas_id, user_id, iterations, cached):
+    permission_cache.clear()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        if not cached:
+            permission_cache.clear()
+        assert service.check_canvas_permission(canvas_id, user_id, 'edit')
+    return (time.perf_counter() - started) / iterations * 1e6
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    app = create_app(TestingConfig)
+    with app.app_context():
+        canvas_id, user_id = setup_data()
+        service = CanvasService()
+        uncached = run(service, canvas_id, user_id, iterations, cached=False)
+        cached = run(service, canvas_id, user_id, iterations, cached=True)
+
+    print(f"check_canvas_permission over {iterations} events")
+    print(f"  without cache: {uncached:8.1f} us/event")
+    print(f"  with cache:    {cached:8.1f} us/event")
+    print(f"  speedup:       {uncached / cached:8.1f}x")
+
+if __name__ == '__main__':
+    main()
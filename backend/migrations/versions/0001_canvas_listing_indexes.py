@@ -0,0 +1,41 @@
+"""Indexes for single-query, keyset-paginated canvas listings
+
+Revision ID: 0001_canvas_listing_indexes
+Revises: 
+Create Date: 2026-10-16 09:00:00.000000
+
+Tables were historically created by db.create_all(), which already builds
+these indexes on fresh databases, so each one is only created if missing.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001_canvas_listing_indexes'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_canvases_owner_id', 'canvases', ['owner_id']),
+    ('ix_canvases_is_public', 'canvases', ['is_public']),
+    ('ix_canvases_updated_at_id', 'canvases', ['updated_at', 'id']),
+    ('ix_canvas_permissions_user_id', 'canvas_permissions', ['user_id']),
+]
+
+
+def _existing_indexes(table):
+    return {index['name'] for index in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        if name not in _existing_indexes(table):
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        if name in _existing_indexes(table):
+            op.drop_index(name, table_name=table)
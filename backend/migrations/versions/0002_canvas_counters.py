@@ -0,0 +1,46 @@
+"""Denormalized object and collaborator counters on canvases
+
+Revision ID: 0002_canvas_counters
+Revises: 0001_canvas_listing_indexes
+Create Date: 2026-10-16 10:00:00.000000
+
+Columns are only added when db.create_all() has not created them already;
+counters are then backfilled from the current rows.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_canvas_counters'
+down_revision = '0001_canvas_listing_indexes'
+branch_labels = None
+depends_on = None
+
+COLUMNS = ['object_count', 'collaborator_count']
+
+
+def _existing_columns(table):
+    return {column['name'] for column in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade():
+    existing = _existing_columns('canvases')
+    with op.batch_alter_table('canvases') as batch_op:
+        for name in COLUMNS:
+            if name not in existing:
+                batch_op.add_column(sa.Column(name, sa.Integer(), nullable=False, server_default='0'))
+
+    op.execute(
+        "UPDATE canvases SET "
+        "object_count = (SELECT COUNT(*) FROM canvas_objects WHERE canvas_objects.canvas_id = canvases.id), "
+        "collaborator_count = (SELECT COUNT(*) FROM canvas_permissions WHERE canvas_permissions.canvas_id = canvases.id)"
+    )
+
+
+def downgrade():
+    existing = _existing_columns('canvases')
+    with op.batch_alter_table('canvases') as batch_op:
+        for name in reversed(COLUMNS):
+            if name in existing:
+                batch_op.drop_column(name)
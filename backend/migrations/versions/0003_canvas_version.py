@@ -0,0 +1,33 @@
+"""Object version counter on canvases
+
+Revision ID: 0003_canvas_version
+Revises: 0002_canvas_counters
+Create Date: 2026-10-16 11:00:00.000000
+
+The column is only added when db.create_all() has not created it already.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_canvas_version'
+down_revision = '0002_canvas_counters'
+branch_labels = None
+depends_on = None
+
+
+def _existing_columns(table):
+    return {column['name'] for column in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade():
+    if 'version' not in _existing_columns('canvases'):
+        with op.batch_alter_table('canvases') as batch_op:
+            batch_op.add_column(sa.Column('version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    if 'version' in _existing_columns('canvases'):
+        with op.batch_alter_table('canvases') as batch_op:
+            batch_op.drop_column('version')
@@ -0,0 +1,58 @@
+"""Per-object change sequence and delete tombstones for delta sync
+
+Revision ID: 0004_object_change_seq
+Revises: 0003_canvas_version
+Create Date: 2026-10-16 12:00:00.000000
+
+Existing objects are stamped with their canvas's current version so any
+client holding an older version receives them on its next delta.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004_object_change_seq'
+down_revision = '0003_canvas_version'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    columns = {column['name'] for column in inspector.get_columns('canvas_objects')}
+    indexes = {index['name'] for index in inspector.get_indexes('canvas_objects')}
+
+    if 'change_seq' not in columns:
+        with op.batch_alter_table('canvas_objects') as batch_op:
+            batch_op.add_column(sa.Column('change_seq', sa.Integer(), nullable=False, server_default='0'))
+        op.execute(
+            "UPDATE canvas_objects SET change_seq = "
+            "(SELECT canvases.version FROM canvases WHERE canvases.id = canvas_objects.canvas_id)"
+        )
+    if 'ix_canvas_objects_canvas_seq' not in indexes:
+        op.create_index('ix_canvas_objects_canvas_seq', 'canvas_objects', ['canvas_id', 'change_seq'])
+
+    if 'canvas_object_tombstones' not in inspector.get_table_names():
+        op.create_table(
+            'canvas_object_tombstones',
+            sa.Column('object_id', sa.String(length=36), primary_key=True),
+            sa.Column('canvas_id', sa.String(length=36), sa.ForeignKey('canvases.id'), nullable=False),
+            sa.Column('change_seq', sa.Integer(), nullable=False),
+            sa.Column('deleted_at', sa.DateTime(), nullable=True)
+        )
+        op.create_index('ix_canvas_object_tombstones_canvas_seq', 'canvas_object_tombstones', ['canvas_id', 'change_seq'])
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'canvas_object_tombstones' in inspector.get_table_names():
+        op.drop_table('canvas_object_tombstones')
+
+    indexes = {index['name'] for index in inspector.get_indexes('canvas_objects')}
+    if 'ix_canvas_objects_canvas_seq' in indexes:
+        op.drop_index('ix_canvas_objects_canvas_seq', table_name='canvas_objects')
+    columns = {column['name'] for column in inspector.get_columns('canvas_objects')}
+    if 'change_seq' in columns:
+        with op.batch_alter_table('canvas_objects') as batch_op:
+            batch_op.drop_column('change_seq')
@@ -0,0 +1,66 @@
+"""Typed, indexed geometry columns on canvas objects
+
+Revision ID: 0005_object_geometry
+Revises: 0004_object_change_seq
+Create Date: 2026-10-16 13:00:00.000000
+
+Columns and indexes are only created when db.create_all() has not created
+them already. Existing rows keep NULL bounds, which viewport queries treat
+as always visible, until `flask backfill-object-geometry` derives them from
+their properties; the derivation lives in the app so it is not frozen here.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005_object_geometry'
+down_revision = '0004_object_change_seq'
+branch_labels = None
+depends_on = None
+
+COLUMNS = [
+    ('min_x', sa.Float(), None),
+    ('min_y', sa.Float(), None),
+    ('max_x', sa.Float(), None),
+    ('max_y', sa.Float(), None),
+    ('z_index', sa.Integer(), '0'),
+    ('rotation', sa.Float(), '0'),
+]
+
+INDEXES = {
+    'ix_canvas_objects_canvas_x': ['canvas_id', 'min_x', 'max_x'],
+    'ix_canvas_objects_canvas_y': ['canvas_id', 'min_y', 'max_y'],
+    'ix_canvas_objects_canvas_z': ['canvas_id', 'z_index'],
+}
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    existing = {column['name'] for column in inspector.get_columns('canvas_objects')}
+    missing = [column for column in COLUMNS if column[0] not in existing]
+    if missing:
+        with op.batch_alter_table('canvas_objects') as batch_op:
+            for name, type_, server_default in missing:
+                batch_op.add_column(sa.Column(name, type_, nullable=server_default is None,
+                                              server_default=server_default))
+
+    indexes = {index['name'] for index in inspector.get_indexes('canvas_objects')}
+    for name, columns in INDEXES.items():
+        if name not in indexes:
+            op.create_index(name, 'canvas_objects', columns)
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    indexes = {index['name'] for index in inspector.get_indexes('canvas_objects')}
+    for name in INDEXES:
+        if name in indexes:
+            op.drop_index(name, table_name='canvas_objects')
+
+    existing = {column['name'] for column in inspector.get_columns('canvas_objects')}
+    with op.batch_alter_table('canvas_objects') as batch_op:
+        for name, _, _ in reversed(COLUMNS):
+            if name in existing:
+                batch_op.drop_column(name)
@@ -0,0 +1,54 @@
+"""Append-only canvas operation log and compacted canvas snapshots
+
+Revision ID: 0006_canvas_operation_log
+Revises: 0005_object_geometry
+Create Date: 2026-10-16 14:00:00.000000
+
+Both tables start empty: canvases without a snapshot are loaded from their
+object rows, and the first compaction writes one.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006_canvas_operation_log'
+down_revision = '0005_object_geometry'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    tables = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'canvas_operations' not in tables:
+        op.create_table(
+            'canvas_operations',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('canvas_id', sa.String(length=36), sa.ForeignKey('canvases.id'), nullable=False),
+            sa.Column('seq', sa.Integer(), nullable=False),
+            sa.Column('op', sa.String(length=10), nullable=False),
+            sa.Column('object_id', sa.String(length=36), nullable=False),
+            sa.Column('payload', sa.Text(), nullable=True),
+            sa.Column('actor_id', sa.String(length=128), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True)
+        )
+        op.create_index('ix_canvas_operations_canvas_seq', 'canvas_operations', ['canvas_id', 'seq'])
+
+    if 'canvas_snapshots' not in tables:
+        op.create_table(
+            'canvas_snapshots',
+            sa.Column('canvas_id', sa.String(length=36), sa.ForeignKey('canvases.id'), primary_key=True),
+            sa.Column('seq', sa.Integer(), nullable=False),
+            sa.Column('object_count', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('data', sa.LargeBinary(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True)
+        )
+
+
+def downgrade():
+    tables = set(sa.inspect(op.get_bind()).get_table_names())
+    if 'canvas_snapshots' in tables:
+        op.drop_table('canvas_snapshots')
+    if 'canvas_operations' in tables:
+        op.drop_table('canvas_operations')
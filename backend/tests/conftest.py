@@ -63,3 +63,120 @@ def sample_canvas(sample_user):
         is_public=False
     )
     return canvas
+
+class FakeRedis:
+    """In-process stand-in for the Redis commands the app uses (hashes, sorted sets, expiry, pipelines).
+    
+    Replies are bytes like redis-py's. Pipelines record each executed batch in
+    ``executed`` so tests can assert how many round-trips were made.
+    """
+    
+    def __init__(self):
+        self.data = {}
+        self.executed = []
+    
+    @staticmethod
+    def _bytes(value):
+        return value if isinstance(value, bytes) else str(value).encode()
+    
+    @staticmethod
+    def _bound(value):
+        value = value.decode() if isinstance(value, bytes) else str(value)
+        if value in ('-inf', '+inf'):
+            return float(value), False
+        if value.startswith('('):
+            return float(value[1:]), True
+        return float(value), False
+    
+    def _in_range(self, score, low, high):
+        (low, low_open), (high, high_open) = self._bound(low), self._bound(high)
+        return (score > low if low_open else score >= low) and (score < high if high_open else score <= high)
+    
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+    
+    def hset(self, key, field=None, value=None, mapping=None):
+        entries = dict(mapping or {})
+        if field is not None:
+            entries[field] = value
+        bucket = self.data.setdefault(key, {})
+        added = sum(1 for name in entries if name not in bucket)
+        bucket.update({name: self._bytes(entry) for name, entry in entries.items()})
+        return added
+    
+    def hget(self, key, field):
+        return self.data.get(key, {}).get(field)
+    
+    def hgetall(self, key):
+        return {name.encode(): entry for name, entry in self.data.get(key, {}).items()}
+    
+    def hmget(self, key, *fields):
+        return [self.hget(key, field) for field in fields]
+    
+    def hincrby(self, key, field, amount=1):
+        bucket = self.data.setdefault(key, {})
+        value = int(bucket.get(field, b'0')) + amount
+        bucket[field] = self._bytes(value)
+        return value
+    
+    def hdel(self, key, *fields):
+        bucket = self.data.get(key, {})
+        return sum(1 for field in fields if bucket.pop(field, None) is not None)
+    
+    def zadd(self, key, mapping):
+        scores = self.data.setdefault(key, {})
+        added = sum(1 for member in mapping if member not in scores)
+        scores.update({member: float(score) for member, score in mapping.items()})
+        return added
+    
+    def zrem(self, key, *members):
+        scores = self.data.get(key, {})
+        return sum(1 for member in members if scores.pop(member, None) is not None)
+    
+    def zscore(self, key, member):
+        return self.data.get(key, {}).get(member)
+    
+    def zrangebyscore(self, key, low, high):
+        scores = self.data.get(key, {})
+        return [member.encode() for member, score in sorted(scores.items(), key=lambda item: item[1])
+                if self._in_range(score, low, high)]
+    
+    def zcount(self, key, low, high):
+        return len(self.zrangebyscore(key, low, high))
+    
+    def zremrangebyscore(self, key, low, high):
+        scores = self.data.get(key, {})
+        expired = [member for member, score in scores.items() if self._in_range(score, low, high)]
+        for member in expired:
+            del scores[member]
+        return len(expired)
+    
+    def expire(self, key, seconds):
+        return key in self.data
+    
+    def delete(self, *keys):
+        return sum(1 for key in keys if self.data.pop(key, None) is not None)
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+    
+    def __len__(self):
+        return len(self.commands)
+    
+    def __getattr__(self, name):
+        def stage(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+            return self
+        return stage
+    
+    def execute(self):
+        commands, self.commands = self.commands, []
+        self.redis.executed.append([name for name, _, _ in commands])
+        return [getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in commands]
+
+@pytest.fixture
+def fake_redis():
+    """A fresh FakeRedis."""
+    return FakeRedis()
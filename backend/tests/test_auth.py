@@ -62,3 +62,272 @@ class TestAuthService:
         assert user is not None
         assert user.email == 'test@example.com'
         assert user.id == 'test-user-id'
+
+class TestTokenCache:
+    """Test the verified-token cache in front of AuthService.verify_token."""
+    
+    def setup_method(self):
+        AuthService.clear_token_cache()
+    
+    def test_repeat_verification_is_served_from_cache(self):
+        """Test that a second verification of the same token is a cache hit."""
+        auth_service = AuthService()
+        calls = []
+        original = auth_service._verify_token_uncached
+        auth_service._verify_token_uncached = lambda token: calls.append(token) or original(token)
+        
+        first = auth_service.verify_token('valid-token')
+        second = auth_service.verify_token('valid-token')
+        
+        assert first == second
+        assert calls == ['valid-token']
+        stats = AuthService.get_token_cache_stats()
+        assert stats['hits'] == 1
+        assert stats['misses'] == 1
+    
+    def test_invalid_token_is_negatively_cached(self):
+        """Test that invalid tokens are rejected from cache without re-verifying."""
+        auth_service = AuthService()
+        calls = []
+        original = auth_service._verify_token_uncached
+        auth_service._verify_token_uncached = lambda token: calls.append(token) or original(token)
+        
+        for _ in range(3):
+            with pytest.raises(Exception):
+                auth_service.verify_token('invalid-token')
+        
+        assert calls == ['invalid-token']
+    
+    def test_transient_failure_is_not_cached(self):
+        """Test that a failure unrelated to the token itself is retried on the next call."""
+        import jwt
+        from app.services.auth_service import _is_definitive_rejection
+        auth_service = AuthService()
+        calls = []
+        
+        def verify(token):
+            calls.append(token)
+            if len(calls) == 1:
+                raise Exception('Token verification unavailable: certificate fetch timed out')
+            return {'uid': 'u1'}
+        auth_service._verify_token_uncached = verify
+        
+        with pytest.raises(Exception):
+            auth_service.verify_token('blip-token')
+        assert auth_service.verify_token('blip-token')['uid'] == 'u1'
+        assert len(calls) == 2
+        
+        assert _is_definitive_rejection(jwt.ExpiredSignatureError('expired'))
+        assert _is_definitive_rejection(jwt.InvalidSignatureError('bad signature'))
+        assert not _is_definitive_rejection(jwt.ImmatureSignatureError('used too early'))
+        assert not _is_definitive_rejection(OSError('network unreachable'))
+    
+    def test_entry_expires_with_token_exp(self):
+        """Test that a token whose exp has passed is not served from cache."""
+        import time
+        auth_service = AuthService()
+        auth_service._verify_token_uncached = lambda token: {'uid': 'u1', 'exp': time.time() - 1}
+        
+        auth_service.verify_token('expired-token')
+        auth_service.verify_token('expired-token')
+        
+        assert AuthService.get_token_cache_stats()['hits'] == 0
+
+class TestAuthServiceSingleton:
+    """Test the app-scoped AuthService."""
+    
+    def test_get_auth_service_is_app_scoped(self, app):
+        """Test that the service is created once and registered on the app."""
+        from app.services.auth_service import get_auth_service
+        
+        with app.app_context():
+            first = get_auth_service()
+            second = get_auth_service()
+        
+        assert first is second
+        assert app.extensions['auth_service'] is first
+    
+    def test_firebase_initialized_lazily(self):
+        """Test that construction does not initialize Firebase."""
+        before = AuthService.get_init_stats()['firebase_init_count']
+        auth_service = AuthService()
+        assert AuthService.get_init_stats()['firebase_init_count'] == before
+        
+        AuthService.clear_token_cache()
+        auth_service.verify_token('valid-token')
+        assert auth_service.is_mock
+        assert AuthService.get_init_stats()['firebase_init_count'] == before + 1
+
+class TestFirebaseTokenVerifier:
+    """Test local Firebase ID-token verification against a static key file."""
+    
+    @pytest.fixture
+    def signing_key(self, tmp_path):
+        import json
+        from cryptography.hazmat.primitives.asymmetric import rsa
+        from cryptography.hazmat.primitives import serialization
+        
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        public_pem = private_key.public_key().public_bytes(
+            serialization.Encoding.PEM,
+            serialization.PublicFormat.SubjectPublicKeyInfo
+        ).decode('utf-8')
+        keys_file = tmp_path / 'keys.json'
+        keys_file.write_text(json.dumps({'test-kid': public_pem}))
+        return private_key, str(keys_file)
+    
+    def _make_token(self, private_key, kid='test-kid', **overrides):
+        import time
+        import jwt
+        now = int(time.time())
+        claims = {
+            'iss': 'https://securetoken.google.com/test-project',
+            'aud': 'test-project',
+            'sub': 'firebase-uid',
+            'iat': now,
+            'auth_time': now,
+            'exp': now + 3600,
+            'email': 'user@example.com'
+        }
+        claims.update(overrides)
+        return jwt.encode(claims, private_key, algorithm='RS256', headers={'kid': kid})
+    
+    def test_verifies_valid_token(self, signing_key):
+        """Test that a correctly signed token is verified locally."""
+        from app.services.firebase_token_verifier import FirebaseTokenVerifier
+        private_key, keys_file = signing_key
+        verifier = FirebaseTokenVerifier('test-project', keys_file=keys_file)
+        
+        claims = verifier.verify(self._make_token(private_key))
+        
+        assert claims['uid'] == 'firebase-uid'
+        assert claims['email'] == 'user@example.com'
+        assert verifier.stats()['local_verifications'] == 1
+    
+    def test_rejects_wrong_audience_and_expired(self, signing_key):
+        """Test that claim checks are enforced."""
+        import time
+        from app.services.firebase_token_verifier import FirebaseTokenVerifier
+        private_key, keys_file = signing_key
+        verifier = FirebaseTokenVerifier('test-project', keys_file=keys_file)
+        
+        with pytest.raises(Exception):
+            verifier.verify(self._make_token(private_key, aud='other-project'))
+        with pytest.raises(Exception):
+            verifier.verify(self._make_token(private_key, exp=int(time.time()) - 60))
+    
+    def test_unknown_kid_is_rejected(self, signing_key):
+        """Test that a token signed with a key outside a current key set is invalid."""
+        import jwt
+        from app.services.firebase_token_verifier import FirebaseTokenVerifier
+        private_key, keys_file = signing_key
+        verifier = FirebaseTokenVerifier('test-project', keys_file=keys_file)
+        
+        with pytest.raises(jwt.InvalidTokenError):
+            verifier.verify(self._make_token(private_key, kid='rotated-kid'))
+    
+    def test_cold_start_without_keys_does_not_block(self, signing_key):
+        """Test that verification with no keys yet fails fast and retryably instead of fetching inline."""
+        import time
+        import jwt
+        from app.services.firebase_token_verifier import FirebaseTokenVerifier
+        private_key, _ = signing_key
+        verifier = FirebaseTokenVerifier('test-project', certs_url='http://127.0.0.1:1/certs', fetch_timeout=0.5)
+        
+        started = time.monotonic()
+        with pytest.raises(Exception) as excinfo:
+            verifier.verify(self._make_token(private_key))
+        assert time.monotonic() - started < 0.1
+        assert not isinstance(excinfo.value, jwt.InvalidTokenError)
+        stats = verifier.stats()
+        assert stats['unavailable'] == 1
+        assert stats['key_waits'] == 0
+    
+    def test_parse_max_age(self):
+        """Test Cache-Control max-age parsing."""
+        from app.services.firebase_token_verifier import FirebaseTokenVerifier
+        
+        assert FirebaseTokenVerifier.parse_max_age('public, max-age=19204, must-revalidate') == 19204
+        assert FirebaseTokenVerifier.parse_max_age('no-cache') is None
+        assert FirebaseTokenVerifier.parse_max_age(None) is None
+
+class TestSessionTokens:
+    """Test backend-issued HMAC session tokens."""
+    
+    def _service(self, spec='k2:new-secret,k1:old-secret'):
+        from app.services.session_token_service import SessionTokenService
+        return SessionTokenService.from_config('unused', keys_spec=spec, ttl=60)
+    
+    def test_issue_and_verify(self):
+        """Test that an issued token verifies and carries the uid and key id."""
+        service = self._service()
+        token, expires_at = service.issue('user-1')
+        
+        claims = service.verify(token)
+        assert claims['uid'] == 'user-1'
+        assert claims['kid'] == 'k2'
+        assert claims['exp'] == expires_at
+    
+    def test_tampered_token_is_rejected(self):
+        """Test that changing the payload invalidates the signature."""
+        service = self._service()
+        token, _ = service.issue('user-1')
+        prefix, payload, signature = token.split('.')
+        
+        other_token, _ = service.issue('user-2')
+        forged = '.'.join([prefix, other_token.split('.')[1], signature])
+        with pytest.raises(Exception):
+            service.verify(forged)
+    
+    def test_key_rotation_keeps_old_tokens_valid(self):
+        """Test that tokens signed by a retired key still verify while it is configured."""
+        old_service = self._service('k1:old-secret')
+        token, _ = old_service.issue('user-1')
+        
+        rotated = self._service('k2:new-secret,k1:old-secret')
+        assert rotated.verify(token)['kid'] == 'k1'
+        
+        with pytest.raises(Exception):
+            self._service('k2:new-secret').verify(token)
+    
+    def test_revocation(self):
+        """Test per-token and per-user revocation."""
+        service = self._service()
+        token, _ = service.issue('user-1')
+        claims = service.verify(token)
+        
+        service.revoke(claims['jti'], claims['exp'])
+        with pytest.raises(Exception):
+            service.verify(token)
+        
+        other_token, _ = service.issue('user-2')
+        service.revoke_user('user-2')
+        with pytest.raises(Exception):
+            service.verify(other_token)
+    
+    def test_default_secret_key_disables_session_tokens(self):
+        """Test that the public default SECRET_KEY neither issues nor accepts session tokens."""
+        import hashlib
+        import hmac
+        from app.config import DEFAULT_SECRET_KEY
+        from app.services.session_token_service import SessionTokenService
+        service = SessionTokenService.from_config(DEFAULT_SECRET_KEY)
+        assert not service.enabled
+        with pytest.raises(Exception):
+            service.issue('user-1')
+        
+        # A token signed with the key the default secret would derive
+        derived = hmac.new(DEFAULT_SECRET_KEY.encode('utf-8'), b'session-token', hashlib.sha256).digest()
+        forged, _ = SessionTokenService({'default': derived}, 'default').issue('user-1')
+        with pytest.raises(Exception):
+            service.verify(forged)
+        assert SessionTokenService.from_config('a-real-secret').enabled
+    
+    def test_auth_service_accepts_session_tokens(self, app):
+        """Test that AuthService.verify_token takes the session-token fast path."""
+        auth_service = AuthService()
+        token, _ = auth_service.issue_session_token('test-user-id')
+        
+        decoded = auth_service.verify_token(token)
+        assert decoded['uid'] == 'test-user-id'
+        assert decoded['session'] is True
@@ -1,6 +1,7 @@
 import pytest
 from app.services.canvas_service import CanvasService
 from app.models import User, Canvas, CanvasObject
+from app.services.spatial_index import SPATIAL_INDEX_MIN_OBJECTS
 
 class TestCanvasService:
     """Test canvas service."""
@@ -38,8 +39,9 @@ class TestCanvasService:
         session.commit()
         
         canvas_service = CanvasService()
-        canvases = canvas_service.get_user_canvases(sample_user.id)
+        canvases, next_cursor = canvas_service.get_user_canvases_page(sample_user.id)
         
+        assert next_cursor is None
         assert len(canvases) == 1
         assert canvases[0].id == 'test-canvas-id'
     
@@ -176,3 +178,563 @@ class TestCanvasService:
         # Verify object is deleted
         objects = canvas_service.get_canvas_objects('test-canvas-id')
         assert len(objects) == 0
+
+class TestCanvasRoutes:
+    """Test canvas REST endpoints."""
+    
+    auth_headers = {'Authorization': 'Bearer valid-token'}
+    
+    def _create_canvas(self, client, **fields):
+        payload = {'title': 'Route Canvas'}
+        payload.update(fields)
+        response = client.post('/api/canvas', json=payload, headers=self.auth_headers)
+        assert response.status_code == 201
+        return response.get_json()['canvas']
+    
+    def test_get_canvas_loads_canvas_once(self, client):
+        """Test that the permission check reuses the canvas loaded by the route."""
+        from app.utils.identity_map import identity_map_stats
+        canvas = self._create_canvas(client)
+        
+        before = identity_map_stats.deduplicated
+        response = client.get(f"/api/canvas/{canvas['id']}", headers=self.auth_headers)
+        
+        assert response.status_code == 200
+        assert identity_map_stats.deduplicated > before
+
+class TestPermissionCache:
+    """Test cached permission decisions and their invalidation."""
+    
+    def test_collaborator_changes_invalidate_cached_decision(self, app):
+        """Test that permission updates and removal are seen immediately."""
+        import uuid
+        from app.extensions import db
+        from app.models import CanvasPermission
+        from app.services.collaboration_service import CollaborationService
+        
+        owner_id, editor_id = f'owner-{uuid.uuid4()}', f'editor-{uuid.uuid4()}'
+        db.session.add_all([
+            User(id=owner_id, email=f'{owner_id}@example.com', name='Owner'),
+            User(id=editor_id, email=f'{editor_id}@example.com', name='Editor')
+        ])
+        db.session.commit()
+        
+        canvas_service = CanvasService()
+        canvas = canvas_service.create_canvas('Cached', '', owner_id)
+        db.session.add(CanvasPermission(
+            canvas_id=canvas.id, user_id=editor_id, permission_type='edit', granted_by=owner_id
+        ))
+        db.session.commit()
+        
+        assert canvas_service.check_canvas_permission(canvas.id, editor_id, 'edit')
+        
+        collaboration_service = CollaborationService()
+        collaboration_service.update_collaborator_permission(canvas.id, editor_id, 'view', owner_id)
+        assert not canvas_service.check_canvas_permission(canvas.id, editor_id, 'edit')
+        assert canvas_service.check_canvas_permission(canvas.id, editor_id, 'view')
+        
+        collaboration_service.remove_collaborator(canvas.id, editor_id)
+        assert not canvas_service.check_canvas_permission(canvas.id, editor_id, 'view')
+        
+        canvas_service.update_canvas(canvas.id, is_public=True)
+        assert canvas_service.check_canvas_permission(canvas.id, editor_id, 'view')
+
+    def test_invalidation_reaches_other_nodes(self, fake_redis):
+        """Test that a revocation on one node is seen at once by another node sharing Redis."""
+        from app.services.permission_cache import PermissionCache
+        node_a = PermissionCache(redis_client=fake_redis)
+        node_b = PermissionCache(redis_client=fake_redis)
+        access = {'owner': False, 'public': False, 'permission': 'edit'}
+        
+        node_a.set('canvas-1', 'editor', access, node_a.generation('canvas-1', 'editor'))
+        assert node_a.get('canvas-1', 'editor') == access
+        assert node_b.get('canvas-1', 'editor') == access
+        
+        node_b.invalidate('canvas-1', 'editor')
+        assert node_a.get('canvas-1', 'editor') is None
+        
+        node_a.set('canvas-1', 'editor', access, node_a.generation('canvas-1', 'editor'))
+        node_b.invalidate('canvas-1')
+        assert node_a.get('canvas-1', 'editor') is None
+        
+        # A load that started before another node's invalidation is not served
+        generation = node_a.generation('canvas-1', 'editor')
+        node_b.invalidate('canvas-1', 'editor')
+        node_a.set('canvas-1', 'editor', access, generation)
+        assert node_a.get('canvas-1', 'editor') is None
+        assert node_b.get('canvas-1', 'editor') is None
+    
+    def test_invalidation_during_load_discards_loaded_access(self, app, monkeypatch):
+        """Test that a revocation racing a permission load is not undone by caching the stale result."""
+        import uuid
+        from app.extensions import db
+        from app.models import CanvasPermission
+        from app.services.collaboration_service import CollaborationService
+        from app.services.permission_cache import permission_cache
+        
+        owner_id, editor_id = f'owner-{uuid.uuid4()}', f'editor-{uuid.uuid4()}'
+        db.session.add_all([
+            User(id=owner_id, email=f'{owner_id}@example.com', name='Owner'),
+            User(id=editor_id, email=f'{editor_id}@example.com', name='Editor')
+        ])
+        db.session.commit()
+        canvas_service = CanvasService()
+        canvas = canvas_service.create_canvas('Raced', '', owner_id)
+        db.session.add(CanvasPermission(
+            canvas_id=canvas.id, user_id=editor_id, permission_type='edit', granted_by=owner_id
+        ))
+        db.session.commit()
+        
+        load = CanvasService._load_canvas_access
+        
+        def load_then_revoke(service, canvas_id, user_id):
+            access = load(service, canvas_id, user_id)
+            # The collaborator is removed after the read but before the result is cached
+            CollaborationService().remove_collaborator(canvas_id, user_id)
+            return access
+        
+        monkeypatch.setattr(CanvasService, '_load_canvas_access', load_then_revoke)
+        assert canvas_service.check_canvas_permission(canvas.id, editor_id, 'edit')
+        monkeypatch.setattr(CanvasService, '_load_canvas_access', load)
+        assert permission_cache.get(canvas.id, editor_id) is None
+        assert not canvas_service.check_canvas_permission(canvas.id, editor_id, 'edit')
+    
+    def test_generations_are_pruned(self):
+        """Test that generations are forgotten once entries under older ones have expired."""
+        from app.services.permission_cache import PermissionCache
+        cache = PermissionCache(ttl=0)
+        for index in range(50):
+            cache.invalidate(f'canvas-{index}')
+            cache.invalidate(f'canvas-{index}', 'user')
+        assert cache.stats()['generations'] <= 2
+
+class TestCanvasListing:
+    """Test keyset-paginated canvas listing."""
+    
+    auth_headers = {'Authorization': 'Bearer valid-token'}
+    
+    def test_pages_cover_every_canvas_once(self, client):
+        """Test that following next_cursor returns each canvas exactly once, newest first."""
+        created = []
+        for i in range(5):
+            response = client.post('/api/canvas', json={'title': f'Paged {i}'}, headers=self.auth_headers)
+            created.append(response.get_json()['canvas']['id'])
+        
+        seen = []
+        cursor = None
+        while True:
+            url = '/api/canvas?filter=owned&limit=2' + (f'&cursor={cursor}' if cursor else '')
+            body = client.get(url, headers=self.auth_headers).get_json()
+            assert len(body['canvases']) <= 2
+            seen.extend(canvas['id'] for canvas in body['canvases'])
+            cursor = body['next_cursor']
+            if not cursor:
+                break
+        
+        assert len(seen) == len(set(seen))
+        assert set(created) <= set(seen)
+        positions = [seen.index(canvas_id) for canvas_id in created]
+        assert positions == sorted(positions, reverse=True)
+    
+    def test_invalid_filter_and_cursor_are_rejected(self, client):
+        """Test request validation."""
+        assert client.get('/api/canvas?filter=mine', headers=self.auth_headers).status_code == 400
+        assert client.get('/api/canvas?cursor=garbage', headers=self.auth_headers).status_code == 400
+
+class TestCanvasCounters:
+    """Test denormalized object and collaborator counters."""
+    
+    auth_headers = {'Authorization': 'Bearer valid-token'}
+    
+    def test_counters_follow_object_writes_and_repair(self, client, runner):
+        """Test that object writes maintain object_count and the repair command fixes drift."""
+        from app.extensions import db
+        
+        canvas = client.post('/api/canvas', json={'title': 'Counted'}, headers=self.auth_headers).get_json()['canvas']
+        assert canvas['object_count'] == 0
+        
+        object_ids = []
+        for x in (10, 20):
+            response = client.post('/api/objects/', json={
+                'canvas_id': canvas['id'],
+                'object_type': 'rectangle',
+                'properties': {'x': x, 'y': 0, 'width': 5, 'height': 5}
+            }, headers=self.auth_headers)
+            object_ids.append(response.get_json()['object']['id'])
+        client.delete(f'/api/objects/{object_ids[0]}', headers=self.auth_headers)
+        
+        body = client.get(f"/api/canvas/{canvas['id']}", headers=self.auth_headers).get_json()
+        assert body['canvas']['object_count'] == 1
+        
+        db.session.query(Canvas).filter_by(id=canvas['id']).update({'object_count': 42})
+        db.session.commit()
+        result = runner.invoke(args=['repair-canvas-counters'])
+        assert 'Repaired counters' in result.output
+        
+        body = client.get(f"/api/canvas/{canvas['id']}", headers=self.auth_headers).get_json()
+        assert body['canvas']['object_count'] == 1
+
+class TestCanvasObjectSnapshot:
+    """Test versioned, conditional object snapshots."""
+    
+    auth_headers = {'Authorization': 'Bearer valid-token'}
+    
+    def test_etag_tracks_object_writes(self, client):
+        """Test that If-None-Match returns 304 until an object changes."""
+        import gzip
+        from app.services.snapshot_cache import snapshot_cache
+        snapshot_cache.clear()
+        
+        canvas = client.post('/api/canvas', json={'title': 'Snapshot'}, headers=self.auth_headers).get_json()['canvas']
+        url = f"/api/canvas/{canvas['id']}/objects"
+        for x in range(30):
+            created = client.post('/api/objects/', json={
+                'canvas_id': canvas['id'],
+                'object_type': 'rectangle',
+                'properties': {'x': x, 'y': 0, 'width': 5, 'height': 5}
+            }, headers=self.auth_headers).get_json()['object']
+        
+        first = client.get(url, headers=self.auth_headers)
+        assert first.status_code == 200
+        assert first.get_json()['version'] == 30
+        assert len(first.get_json()['objects']) == 30
+        etag = first.headers['ETag']
+        
+        not_modified = client.get(url, headers={**self.auth_headers, 'If-None-Match': etag})
+        assert not_modified.status_code == 304
+        assert not_modified.headers['ETag'] == etag
+        
+        zipped = client.get(url, headers={**self.auth_headers, 'Accept-Encoding': 'gzip'})
+        assert zipped.headers['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(zipped.data) == first.data
+        assert snapshot_cache.stats()['builds'] == 1
+        
+        client.put(f"/api/objects/{created['id']}", json={'properties': {'x': 99}}, headers=self.auth_headers)
+        changed = client.get(url, headers={**self.auth_headers, 'If-None-Match': etag})
+        assert changed.status_code == 200
+        assert changed.headers['ETag'] != etag
+        assert changed.get_json()['version'] == 31
+    
+    def test_delta_since_version(self, client):
+        """Test that ?since returns only objects written or deleted after that version."""
+        canvas = client.post('/api/canvas', json={'title': 'Delta'}, headers=self.auth_headers).get_json()['canvas']
+        url = f"/api/canvas/{canvas['id']}/objects"
+        object_ids = []
+        for x in range(5):
+            object_ids.append(client.post('/api/objects/', json={
+                'canvas_id': canvas['id'],
+                'object_type': 'rectangle',
+                'properties': {'x': x, 'y': 0, 'width': 5, 'height': 5}
+            }, headers=self.auth_headers).get_json()['object']['id'])
+        
+        base = client.get(url, headers=self.auth_headers).get_json()['version']
+        client.put(f'/api/objects/{object_ids[1]}', json={'properties': {'x': 50}}, headers=self.auth_headers)
+        client.delete(f'/api/objects/{object_ids[2]}', headers=self.auth_headers)
+        
+        delta = client.get(f'{url}?since={base}', headers=self.auth_headers).get_json()
+        assert [obj['id'] for obj in delta['objects']] == [object_ids[1]]
+        assert delta['deleted'] == [object_ids[2]]
+        assert delta['version'] == base + 2
+        
+        empty = client.get(f"{url}?since={delta['version']}", headers=self.auth_headers).get_json()
+        assert empty['objects'] == [] and empty['deleted'] == []
+        
+        ahead = client.get(f'{url}?since=1000', headers=self.auth_headers).get_json()
+        assert 'deleted' not in ahead and len(ahead['objects']) == 4
+        
+        assert client.get(f'{url}?since=abc', headers=self.auth_headers).status_code == 400
+    
+    def test_streamed_objects(self, client):
+        """Test NDJSON and chunked JSON streaming of a canvas's objects."""
+        import json
+        canvas = client.post('/api/canvas', json={'title': 'Streamed'}, headers=self.auth_headers).get_json()['canvas']
+        url = f"/api/canvas/{canvas['id']}/objects"
+        for x in range(3):
+            client.post('/api/objects/', json={
+                'canvas_id': canvas['id'],
+                'object_type': 'rectangle',
+                'properties': {'x': x, 'y': 0, 'width': 5, 'height': 5}
+            }, headers=self.auth_headers)
+        
+        ndjson = client.get(f'{url}?stream=ndjson', headers=self.auth_headers)
+        assert ndjson.mimetype == 'application/x-ndjson'
+        lines = [json.loads(line) for line in ndjson.get_data(as_text=True).splitlines()]
+        assert [obj['properties']['x'] for obj in lines] == [0, 1, 2]
+        assert ndjson.headers['X-Canvas-Version'] == '3'
+        
+        chunked = client.get(f'{url}?stream=json', headers=self.auth_headers).get_json()
+        assert chunked['version'] == 3
+        assert chunked['objects'] == lines
+        
+        assert client.get(f'{url}?stream=xml', headers=self.auth_headers).status_code == 400
+    
+    def test_bbox_query_uses_spatial_index(self, client):
+        """Test that ?bbox returns intersecting objects and follows later writes."""
+        from app.services.spatial_index import spatial_indexes
+        spatial_indexes.clear()
+        spatial_indexes.min_objects = 0
+        
+        canvas = client.post('/api/canvas', json={'title': 'Viewport'}, headers=self.auth_headers).get_json()['canvas']
+        url = f"/api/canvas/{canvas['id']}/objects"
+        near = client.post('/api/objects/', json={
+            'canvas_id': canvas['id'],
+            'object_type': 'rectangle',
+            'properties': {'x': 10, 'y': 10, 'width': 50, 'height': 50}
+        }, headers=self.auth_headers).get_json()['object']
+        client.post('/api/objects/', json={
+            'canvas_id': canvas['id'],
+            'object_type': 'circle',
+            'properties': {'x': 5000, 'y': 5000, 'radius': 20}
+        }, headers=self.auth_headers)
+        
+        body = client.get(f'{url}?bbox=0,0,100,100', headers=self.auth_headers).get_json()
+        assert [obj['id'] for obj in body['objects']] == [near['id']]
+        
+        client.put(f"/api/objects/{near['id']}", json={'properties': {'x': 4990, 'y': 4990, 'width': 5, 'height': 5}},
+                   headers=self.auth_headers)
+        assert client.get(f'{url}?bbox=0,0,100,100', headers=self.auth_headers).get_json()['objects'] == []
+        assert len(client.get(f'{url}?bbox=4900,4900,5100,5100', headers=self.auth_headers).get_json()['objects']) == 2
+        assert spatial_indexes.stats()['builds'] == 1
+        
+        assert client.get(f'{url}?bbox=1,2,3', headers=self.auth_headers).status_code == 400
+        spatial_indexes.min_objects = SPATIAL_INDEX_MIN_OBJECTS
+    
+    def test_geometry_columns_region_and_extents(self, client, runner):
+        """Test geometry derived on write, the SQL region query, extents and the backfill command."""
+        from app.extensions import db
+        canvas = client.post('/api/canvas', json={'title': 'Extents'}, headers=self.auth_headers).get_json()['canvas']
+        url = f"/api/canvas/{canvas['id']}"
+        assert client.get(f'{url}/extents', headers=self.auth_headers).get_json()['extents'] is None
+        
+        rect = client.post('/api/objects/', json={
+            'canvas_id': canvas['id'],
+            'object_type': 'rectangle',
+            'properties': {'x': -10, 'y': 0, 'width': 20, 'height': 30, 'zIndex': 3}
+        }, headers=self.auth_headers).get_json()['object']
+        client.post('/api/objects/', json={
+            'canvas_id': canvas['id'],
+            'object_type': 'circle',
+            'properties': {'x': 1000, 'y': 500, 'radius': 10}
+        }, headers=self.auth_headers)
+        
+        stored = db.session.get(CanvasObject, rect['id'])
+        assert (stored.min_x, stored.min_y, stored.max_x, stored.max_y, stored.z_index) == (-10, 0, 10, 30, 3)
+        
+        extents = client.get(f'{url}/extents', headers=self.auth_headers).get_json()['extents']
+        assert extents == {'min_x': -10, 'min_y': 0, 'max_x': 1010, 'max_y': 510}
+        
+        body = client.get(f'{url}/objects?bbox=-5,-5,5,5', headers=self.auth_headers).get_json()
+        assert [obj['id'] for obj in body['objects']] == [rect['id']]
+        
+        db.session.query(CanvasObject).filter_by(id=rect['id']).update({'min_x': None, 'max_x': None})
+        db.session.commit()
+        result = runner.invoke(args=['backfill-object-geometry'])
+        assert 'Backfilled geometry' in result.output
+        db.session.expire_all()
+        assert db.session.get(CanvasObject, rect['id']).max_x == 10
+
+class TestGeometry:
+    """Test object bounding boxes for toolbar shapes."""
+    
+    def test_shape_bounds(self):
+        """Test bounds of centred, point-based and rotated shapes."""
+        from app.utils.geometry import object_bounds
+        assert object_bounds('rectangle', {'x': 10, 'y': 20, 'width': 30, 'height': 40}) == (10, 20, 40, 60)
+        assert object_bounds('circle', {'x': 0, 'y': 0, 'radius': 5, 'strokeWidth': 2}) == (-6, -6, 6, 6)
+        assert object_bounds('star', {'x': 100, 'y': 100, 'width': 40}) == (80, 80, 120, 120)
+        assert object_bounds('line', {'x': 10, 'y': 10, 'points': [0, 0, 100, -50]}) == (10, -40, 110, 10)
+        assert object_bounds('line', {'x': 10, 'y': 10}) == (10, 10, 110, 10)
+        assert object_bounds('arrow', {'x': 0, 'y': 0, 'points': 'bad'}) == (-10, -10, 110, 10)
+        assert object_bounds('pen', {'x': 0, 'y': 0, 'points': [5, 5, 1, 9, 7, 2]}) == (1, 2, 7, 9)
+        assert object_bounds('sticky-note', {'x': 0, 'y': 0}) == (0, 0, 200, 200)
+        assert object_bounds('text', {'x': 0, 'y': 0, 'text': 'ab\ncd', 'fontSize': 10}) == (0, 0, 12, 24)
+        min_x, min_y, max_x, max_y = object_bounds('rectangle', {'x': 0, 'y': 0, 'width': 10, 'height': 10, 'rotation': 90})
+        assert (round(min_x), round(min_y), round(max_x), round(max_y)) == (-10, 0, 0, 10)
+        assert object_bounds('image', {'x': 0, 'y': 0}) is None
+
+class TestMergePatch:
+    """Test merge-patch object updates."""
+    
+    auth_headers = {'Authorization': 'Bearer valid-token'}
+    
+    def test_apply_merge_patch(self):
+        """Test RFC 7386 semantics."""
+        from app.utils.merge_patch import apply_merge_patch
+        target = {'a': 1, 'b': {'c': 2, 'd': 3}, 'points': [0, 0, 1, 1]}
+        patched = apply_merge_patch(target, {'a': None, 'b': {'c': 5}, 'points': [9]})
+        assert patched == {'b': {'c': 5, 'd': 3}, 'points': [9]}
+        assert target['a'] == 1
+    
+    def test_rest_patch(self, client):
+        """Test PATCH and merge-patch+json PUT keep untouched properties."""
+        import json
+        canvas = client.post('/api/canvas', json={'title': 'Patch'}, headers=self.auth_headers).get_json()['canvas']
+        created = client.post('/api/objects/', json={
+            'canvas_id': canvas['id'],
+            'object_type': 'circle',
+            'properties': {'x': 0, 'y': 0, 'radius': 5, 'fill': 'blue'}
+        }, headers=self.auth_headers).get_json()['object']
+        url = f"/api/objects/{created['id']}"
+        
+        body = client.patch(url, json={'x': 7}, headers=self.auth_headers).get_json()
+        assert body['object']['properties'] == {'x': 7, 'y': 0, 'radius': 5, 'fill': 'blue'}
+        
+        response = client.put(url, data=json.dumps({'fill': None}), content_type='application/merge-patch+json',
+                              headers=self.auth_headers)
+        assert response.get_json()['object']['properties'] == {'x': 7, 'y': 0, 'radius': 5}
+        assert response.get_json()['object']['change_seq'] == 3
+        
+        assert client.patch(url, json=[1, 2], headers=self.auth_headers).status_code == 400
+        assert client.patch(url, headers=self.auth_headers).status_code == 400
+        assert client.patch(url, data='not json', content_type='application/json',
+                            headers=self.auth_headers).status_code == 400
+        assert client.put(url, json='text', headers=self.auth_headers).status_code == 400
+
+class TestObjectBatch:
+    """Test batched object operations."""
+    
+    auth_headers = {'Authorization': 'Bearer valid-token'}
+    
+    def test_batch_reports_per_item_results(self, client):
+        """Test that one batch applies good items, isolates bad ones and bumps the version once."""
+        canvas = client.post('/api/canvas', json={'title': 'Batch'}, headers=self.auth_headers).get_json()['canvas']
+        existing = client.post('/api/objects/', json={
+            'canvas_id': canvas['id'],
+            'object_type': 'rectangle',
+            'properties': {'x': 0, 'y': 0, 'width': 10, 'height': 10}
+        }, headers=self.auth_headers).get_json()['object']
+        doomed = client.post('/api/objects/', json={
+            'canvas_id': canvas['id'],
+            'object_type': 'circle',
+            'properties': {'x': 0, 'y': 0, 'radius': 3}
+        }, headers=self.auth_headers).get_json()['object']
+        
+        response = client.post('/api/objects/batch', json={
+            'canvas_id': canvas['id'],
+            'operations': [
+                {'op': 'create', 'ref': 'a', 'type': 'star', 'properties': {'x': 5, 'y': 5, 'width': 10}},
+                {'op': 'patch', 'id': existing['id'], 'patch': {'x': 50}},
+                {'op': 'delete', 'id': doomed['id']},
+                {'op': 'update', 'id': 'missing', 'properties': {}},
+                {'op': 'create', 'type': 'hexagon'}
+            ]
+        }, headers=self.auth_headers)
+        body = response.get_json()
+        
+        assert response.status_code == 200
+        assert [result['ok'] for result in body['results']] == [True, True, True, False, False]
+        assert body['results'][0]['ref'] == 'a'
+        assert body['results'][0]['object']['change_seq'] == body['version'] == 3
+        
+        objects = client.get(f"/api/canvas/{canvas['id']}/objects", headers=self.auth_headers).get_json()['objects']
+        by_id = {obj['id']: obj for obj in objects}
+        assert set(by_id) == {existing['id'], body['results'][0]['object_id']}
+        assert by_id[existing['id']]['properties']['x'] == 50
+        
+        detail = client.get(f"/api/canvas/{canvas['id']}", headers=self.auth_headers).get_json()['canvas']
+        assert detail['object_count'] == 2
+        
+        delta = client.get(f"/api/canvas/{canvas['id']}/objects?since=2", headers=self.auth_headers).get_json()
+        assert delta['deleted'] == [doomed['id']]
+
+class TestOperationLog:
+    """Test the per-canvas operation log and snapshot compaction."""
+    
+    auth_headers = {'Authorization': 'Bearer valid-token'}
+    
+    def test_snapshot_plus_log_matches_rows(self, client, runner):
+        """Test that replaying the log over a compacted snapshot reproduces the stored objects."""
+        canvas = client.post('/api/canvas', json={'title': 'Oplog'}, headers=self.auth_headers).get_json()['canvas']
+        url = f"/api/canvas/{canvas['id']}"
+        object_ids = []
+        for x in range(3):
+            object_ids.append(client.post('/api/objects/', json={
+                'canvas_id': canvas['id'],
+                'object_type': 'rectangle',
+                'properties': {'x': x, 'y': 0, 'width': 5, 'height': 5}
+            }, headers=self.auth_headers).get_json()['object']['id'])
+        
+        ops = client.get(f'{url}/operations?since=1', headers=self.auth_headers).get_json()
+        assert [(op['seq'], op['op']) for op in ops['operations']] == [(2, 'create'), (3, 'create')]
+        assert ops['operations'][0]['actor_id'] == 'test-user-id'
+        
+        result = runner.invoke(args=['compact-canvas-logs', '--retain', '0'])
+        assert 'Compacted operation logs' in result.output
+        assert client.get(f'{url}/operations?since=1', headers=self.auth_headers).status_code == 410
+        
+        client.patch(f'/api/objects/{object_ids[0]}', json={'fill': 'red'}, headers=self.auth_headers)
+        client.delete(f'/api/objects/{object_ids[1]}', headers=self.auth_headers)
+        client.post('/api/objects/batch', json={
+            'canvas_id': canvas['id'],
+            'operations': [
+                {'op': 'create', 'type': 'circle', 'properties': {'x': 9, 'y': 9, 'radius': 2}},
+                {'op': 'update', 'id': object_ids[2], 'properties': {'x': 40}},
+                {'op': 'patch', 'id': object_ids[2], 'patch': {'y': 41}}
+            ]
+        }, headers=self.auth_headers)
+        
+        ops = client.get(f'{url}/operations?since=3', headers=self.auth_headers).get_json()
+        assert ops['version'] == 6
+        assert [op['op'] for op in ops['operations']] == ['patch', 'delete', 'create', 'update', 'patch']
+        
+        canvas_service = CanvasService()
+        version, replayed = canvas_service.load_canvas_state(canvas['id'])
+        stored = [obj.to_dict() for obj in canvas_service.get_canvas_objects(canvas['id'])]
+        assert version == 6
+        assert sorted(replayed, key=lambda obj: obj['id']) == sorted(stored, key=lambda obj: obj['id'])
+        
+        objects = client.get(f'{url}/objects', headers=self.auth_headers).get_json()['objects']
+        assert len(objects) == 3
+        assert client.get(f'{url}/operations?since=x', headers=self.auth_headers).status_code == 400
+    
+    def test_compaction_prunes_tombstones_and_resyncs_older_clients(self, client):
+        """Test that tombstones go with compacted history and a since below it gets the full snapshot."""
+        from app.models import CanvasObjectTombstone
+        canvas = client.post('/api/canvas', json={'title': 'Tombstones'}, headers=self.auth_headers).get_json()['canvas']
+        url = f"/api/canvas/{canvas['id']}"
+        object_ids = [client.post('/api/objects/', json={
+            'canvas_id': canvas['id'],
+            'object_type': 'rectangle',
+            'properties': {'x': x, 'y': 0, 'width': 5, 'height': 5}
+        }, headers=self.auth_headers).get_json()['object']['id'] for x in range(3)]
+        client.delete(f'/api/objects/{object_ids[0]}', headers=self.auth_headers)
+        client.delete(f'/api/objects/{object_ids[1]}', headers=self.auth_headers)
+        
+        assert client.get(f'{url}/objects?since=3', headers=self.auth_headers).get_json()['deleted'] == object_ids[:2]
+        
+        CanvasService().compact_canvas_log(canvas['id'], retain=1)
+        assert [row.object_id for row in CanvasObjectTombstone.query.filter_by(canvas_id=canvas['id'])] == [object_ids[1]]
+        
+        delta = client.get(f'{url}/objects?since=4', headers=self.auth_headers).get_json()
+        assert delta['deleted'] == [object_ids[1]]
+        full = client.get(f'{url}/objects?since=3', headers=self.auth_headers).get_json()
+        assert 'deleted' not in full
+        assert [obj['id'] for obj in full['objects']] == [object_ids[2]]
+        assert client.get(f'{url}/operations?since=3', headers=self.auth_headers).status_code == 410
+    
+    def test_compaction_runs_in_the_background_once_per_canvas(self, app, client, monkeypatch):
+        """Test that a write due for compaction hands it to a background task, never two per canvas."""
+        from app.extensions import db, socketio
+        from app.models import CanvasSnapshot
+        from app.services import canvas_service as canvas_service_module
+        monkeypatch.setattr(canvas_service_module, 'OPLOG_COMPACT_EVERY', 2)
+        scheduled = []
+        monkeypatch.setattr(socketio, 'start_background_task', lambda target, *args: scheduled.append((target, args)))
+        
+        canvas = client.post('/api/canvas', json={'title': 'Background'}, headers=self.auth_headers).get_json()['canvas']
+        canvas_service = CanvasService()
+        canvas_service._maybe_compact(canvas['id'], 3)
+        canvas_service._maybe_compact(canvas['id'], 2)
+        canvas_service._maybe_compact(canvas['id'], 4)
+        assert len(scheduled) == 1
+        assert db.session.get(CanvasSnapshot, canvas['id']) is None
+        
+        target, args = scheduled.pop()
+        target(*args)
+        assert canvas['id'] not in canvas_service_module._compacting
+        db.session.expire_all()
+        assert db.session.get(CanvasSnapshot, canvas['id']) is not None
+        
+        canvas_service._maybe_compact(canvas['id'], 4)
+        assert len(scheduled) == 1
+        canvas_service_module._compacting.discard(canvas['id'])
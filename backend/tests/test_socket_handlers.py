@@ -0,0 +1,565 @@
+import pytest
+from app.extensions import socketio
+from app.socket_handlers.session import socket_sessions
+
+class TestSocketSession:
+    """Test connection-scoped Socket.IO authentication."""
+    
+    def test_connect_binds_user_to_sid(self, app):
+        """Test that a token sent on connect authenticates later events."""
+        headers = {'Authorization': 'Bearer valid-token'}
+        canvas = app.test_client().post('/api/canvas', json={'title': 'Session'}, headers=headers).get_json()['canvas']
+        client = socketio.test_client(app, auth={'token': 'valid-token'})
+        
+        received = client.get_received()
+        authenticated = [msg for msg in received if msg['name'] == 'authenticated']
+        assert authenticated
+        assert authenticated[0]['args'][0]['user']['id'] == 'test-user-id'
+        
+        # No id_token in the payload: identity comes from the connection
+        client.emit('get_cursors', {'canvas_id': canvas['id']})
+        names = [msg['name'] for msg in client.get_received()]
+        assert 'cursors_data' in names
+        
+        client.disconnect()
+    
+    def test_session_token_reconnect_is_not_renewed(self, app):
+        """Test that connecting with a session token does not hand out a fresh one."""
+        client = socketio.test_client(app, auth={'token': 'valid-token'})
+        authenticated = [msg['args'][0] for msg in client.get_received() if msg['name'] == 'authenticated'][0]
+        session_token = authenticated['session_token']
+        client.disconnect()
+        
+        client = socketio.test_client(app, auth={'token': session_token})
+        authenticated = [msg['args'][0] for msg in client.get_received() if msg['name'] == 'authenticated'][0]
+        assert authenticated['user']['id'] == 'test-user-id'
+        assert 'session_token' not in authenticated
+        client.disconnect()
+    
+    def test_event_without_session_or_token_is_rejected(self, app):
+        """Test that unauthenticated connections cannot use token-less events."""
+        client = socketio.test_client(app)
+        client.emit('get_cursors', {'canvas_id': 'any-canvas'})
+        
+        names = [msg['name'] for msg in client.get_received()]
+        assert 'cursors_data' not in names
+        client.disconnect()
+    
+    def test_refresh_token_rejects_other_user(self, app):
+        """Test that refresh_token only extends the session for the same user."""
+        client = socketio.test_client(app, auth={'token': 'valid-token'})
+        client.get_received()
+        
+        client.emit('refresh_token', {'id_token': 'valid-token'})
+        names = [msg['name'] for msg in client.get_received()]
+        assert 'token_refreshed' in names
+        
+        client.emit('refresh_token', {'id_token': 'invalid-token'})
+        errors = [msg for msg in client.get_received() if msg['name'] == 'error']
+        assert errors
+        client.disconnect()
+    
+    def test_disconnect_unbinds_session(self, app):
+        """Test that the sid binding is dropped on disconnect."""
+        before = len(socket_sessions)
+        client = socketio.test_client(app, auth={'token': 'valid-token'})
+        assert len(socket_sessions) == before + 1
+        client.disconnect()
+        assert len(socket_sessions) == before
+
+class TestObjectEvents:
+    """Test canvas object socket events."""
+    
+    def test_object_patch_broadcasts_only_changed_keys(self, app):
+        """Test that a patch updates stored properties and broadcasts just the patch."""
+        from app.extensions import db
+        from app.models import CanvasObject
+        
+        client = socketio.test_client(app, auth={'token': 'valid-token'})
+        flask_client = app.test_client()
+        headers = {'Authorization': 'Bearer valid-token'}
+        canvas = flask_client.post('/api/canvas', json={'title': 'Patched'}, headers=headers).get_json()['canvas']
+        created = flask_client.post('/api/objects/', json={
+            'canvas_id': canvas['id'],
+            'object_type': 'rectangle',
+            'properties': {'x': 0, 'y': 0, 'width': 10, 'height': 10, 'fill': 'red'}
+        }, headers=headers).get_json()['object']
+        
+        client.emit('join_canvas', {'canvas_id': canvas['id']})
+        client.get_received()
+        client.emit('object_updated', {
+            'canvas_id': canvas['id'],
+            'object_id': created['id'],
+            'patch': {'x': 25, 'fill': None}
+        })
+        
+        patched = [msg['args'][0] for msg in client.get_received() if msg['name'] == 'object_patched']
+        assert patched and patched[0]['patch'] == {'x': 25, 'fill': None}
+        assert patched[0]['version'] == 2
+        
+        stored = db.session.get(CanvasObject, created['id'])
+        db.session.refresh(stored)
+        assert stored.get_properties() == {'x': 25, 'y': 0, 'width': 10, 'height': 10}
+        assert stored.min_x == 25
+        client.disconnect()
+    
+    def test_objects_batch_single_broadcast(self, app):
+        """Test that a batch yields one room broadcast and per-item results for the sender."""
+        client = socketio.test_client(app, auth={'token': 'valid-token'})
+        headers = {'Authorization': 'Bearer valid-token'}
+        canvas = app.test_client().post('/api/canvas', json={'title': 'Batched'}, headers=headers).get_json()['canvas']
+        
+        client.emit('join_canvas', {'canvas_id': canvas['id']})
+        client.get_received()
+        client.emit('objects_batch', {
+            'canvas_id': canvas['id'],
+            'batch_id': 'paste-1',
+            'operations': [
+                {'op': 'create', 'type': 'rectangle', 'properties': {'x': i, 'y': 0, 'width': 5, 'height': 5}}
+                for i in range(3)
+            ]
+        })
+        
+        received = client.get_received()
+        broadcasts = [msg['args'][0] for msg in received if msg['name'] == 'objects_batch']
+        results = [msg['args'][0] for msg in received if msg['name'] == 'objects_batch_result']
+        assert len(broadcasts) == 1 and len(broadcasts[0]['changes']) == 3
+        assert results[0]['batch_id'] == 'paste-1'
+        assert all(result['ok'] for result in results[0]['results'])
+        client.disconnect()
+    
+    def test_buffered_updates_coalesce_until_flush(self, app):
+        """Test that buffered drags broadcast every frame but write once on read."""
+        from app.extensions import db
+        from app.models import CanvasObject
+        from app.services.object_write_buffer import object_write_buffer
+        
+        client = socketio.test_client(app, auth={'token': 'valid-token'})
+        flask_client = app.test_client()
+        headers = {'Authorization': 'Bearer valid-token'}
+        canvas = flask_client.post('/api/canvas', json={'title': 'Dragged'}, headers=headers).get_json()['canvas']
+        created = flask_client.post('/api/objects/', json={
+            'canvas_id': canvas['id'],
+            'object_type': 'rectangle',
+            'properties': {'x': 0, 'y': 0, 'width': 10, 'height': 10}
+        }, headers=headers).get_json()['object']
+        client.emit('join_canvas', {'canvas_id': canvas['id']})
+        client.get_received()
+        
+        object_write_buffer.durability = 'buffered'
+        object_write_buffer.interval = 3600
+        try:
+            for x in range(1, 11):
+                client.emit('object_updated', {'canvas_id': canvas['id'], 'object_id': created['id'], 'patch': {'x': x}})
+            
+            patched = [msg for msg in client.get_received() if msg['name'] == 'object_patched']
+            assert len(patched) == 10
+            assert db.session.query(CanvasObject.properties).filter_by(id=created['id']).scalar().count('"x": 0') == 1
+            assert object_write_buffer.stats()['queue_depth'] == 1
+            
+            objects = flask_client.get(f"/api/canvas/{canvas['id']}/objects", headers=headers).get_json()
+            assert objects['objects'][0]['properties']['x'] == 10
+            assert objects['version'] == 2
+            assert object_write_buffer.stats()['queue_depth'] == 0
+        finally:
+            object_write_buffer.durability = 'sync'
+            object_write_buffer.interval = 0.25
+        client.disconnect()
+    
+    def test_buffered_flush_commits_in_its_own_session(self, app):
+        """Test that a flush keeps the edit's author and leaves the caller's pending work alone."""
+        from app.extensions import db
+        from app.models import CanvasObject, CanvasOperation, User
+        from app.services.object_write_buffer import object_write_buffer
+        
+        client = socketio.test_client(app, auth={'token': 'valid-token'})
+        flask_client = app.test_client()
+        headers = {'Authorization': 'Bearer valid-token'}
+        canvas = flask_client.post('/api/canvas', json={'title': 'Isolated'}, headers=headers).get_json()['canvas']
+        created = flask_client.post('/api/objects/', json={
+            'canvas_id': canvas['id'],
+            'object_type': 'rectangle',
+            'properties': {'x': 0, 'y': 0, 'width': 10, 'height': 10}
+        }, headers=headers).get_json()['object']
+        client.emit('join_canvas', {'canvas_id': canvas['id']})
+        
+        object_write_buffer.durability = 'buffered'
+        object_write_buffer.interval = 3600
+        try:
+            client.emit('object_updated', {'canvas_id': canvas['id'], 'object_id': created['id'], 'patch': {'x': 5}})
+            db.session.add(User(id='pending-user', email='pending@example.com', name='Pending'))
+            assert object_write_buffer.flush_canvas(canvas['id']) == 1
+            db.session.rollback()
+        finally:
+            object_write_buffer.durability = 'sync'
+            object_write_buffer.interval = 0.25
+        
+        assert db.session.get(User, 'pending-user') is None
+        assert '"x": 5' in db.session.get(CanvasObject, created['id']).properties
+        operation = CanvasOperation.query.filter_by(canvas_id=canvas['id']).order_by(CanvasOperation.seq.desc()).first()
+        assert operation.actor_id == 'test-user-id'
+        client.disconnect()
+    
+    def test_buffered_updates_flush_when_room_empties(self, app):
+        """Test that the last member leaving a room writes its buffered updates."""
+        from app.extensions import db
+        from app.models import CanvasObject
+        from app.services.object_write_buffer import object_write_buffer
+        
+        client = socketio.test_client(app, auth={'token': 'valid-token'})
+        headers = {'Authorization': 'Bearer valid-token'}
+        flask_client = app.test_client()
+        canvas = flask_client.post('/api/canvas', json={'title': 'Left'}, headers=headers).get_json()['canvas']
+        created = flask_client.post('/api/objects/', json={
+            'canvas_id': canvas['id'],
+            'object_type': 'circle',
+            'properties': {'x': 0, 'y': 0, 'radius': 4}
+        }, headers=headers).get_json()['object']
+        client.emit('join_canvas', {'canvas_id': canvas['id']})
+        
+        object_write_buffer.durability = 'buffered'
+        object_write_buffer.interval = 3600
+        try:
+            client.emit('object_updated', {'canvas_id': canvas['id'], 'object_id': created['id'], 'patch': {'x': 99}})
+            client.disconnect()
+            stored = db.session.get(CanvasObject, created['id'])
+            db.session.refresh(stored)
+            assert stored.get_properties()['x'] == 99
+        finally:
+            object_write_buffer.durability = 'sync'
+            object_write_buffer.interval = 0.25
+    
+    def test_rejoin_replays_missed_events(self, app):
+        """Test that rejoining with last_seq replays the gap, and an unknown epoch asks for a resync."""
+        headers = {'Authorization': 'Bearer valid-token'}
+        canvas = app.test_client().post('/api/canvas', json={'title': 'Replay'}, headers=headers).get_json()['canvas']
+        
+        client = socketio.test_client(app, auth={'token': 'valid-token'})
+        client.emit('join_canvas', {'canvas_id': canvas['id']})
+        joined = [msg['args'][0] for msg in client.get_received() if msg['name'] == 'joined_canvas'][0]
+        assert joined['seq'] == 0
+        client.disconnect()
+        
+        writer = socketio.test_client(app, auth={'token': 'valid-token'})
+        writer.emit('join_canvas', {'canvas_id': canvas['id']})
+        for x in range(3):
+            writer.emit('object_created', {
+                'canvas_id': canvas['id'],
+                'object': {'type': 'circle', 'properties': {'x': x, 'y': 0, 'radius': 2}}
+            })
+        created = [msg['args'][0] for msg in writer.get_received() if msg['name'] == 'object_created']
+        assert [event['seq'] for event in created] == [1, 2, 3]
+        writer.disconnect()
+        
+        client = socketio.test_client(app, auth={'token': 'valid-token'})
+        client.emit('join_canvas', {'canvas_id': canvas['id'], 'last_seq': 1, 'epoch': joined['epoch']})
+        replay = [msg['args'][0] for msg in client.get_received() if msg['name'] == 'canvas_replay'][0]
+        assert [(event['event'], event['data']['seq']) for event in replay['events']] == [
+            ('object_created', 2), ('object_created', 3)
+        ]
+        
+        client.emit('join_canvas', {'canvas_id': canvas['id'], 'last_seq': 1, 'epoch': 'stale'})
+        resync = [msg['args'][0] for msg in client.get_received() if msg['name'] == 'canvas_resync'][0]
+        assert resync['seq'] == 3
+        client.disconnect()
+    
+    def test_rejoin_with_snapshot_skips_replay(self, app):
+        """Test that a reconnect answered with a snapshot gets each object once and no replay."""
+        headers = {'Authorization': 'Bearer valid-token'}
+        canvas = app.test_client().post('/api/canvas', json={'title': 'Reconnect'}, headers=headers).get_json()['canvas']
+        
+        writer = socketio.test_client(app, auth={'token': 'valid-token'})
+        writer.emit('join_canvas', {'canvas_id': canvas['id']})
+        client = socketio.test_client(app, auth={'token': 'valid-token'})
+        client.emit('join_canvas', {'canvas_id': canvas['id'], 'with_objects': True})
+        joined = [msg['args'][0] for msg in client.get_received() if msg['name'] == 'joined_canvas'][0]
+        assert joined['objects'] == []
+        client.disconnect()
+        
+        writer.emit('object_created', {
+            'canvas_id': canvas['id'],
+            'object': {'type': 'circle', 'properties': {'x': 1, 'y': 0, 'radius': 2}}
+        })
+        
+        client = socketio.test_client(app, auth={'token': 'valid-token'})
+        client.emit('join_canvas', {
+            'canvas_id': canvas['id'], 'with_objects': True, 'last_seq': joined['seq'], 'epoch': joined['epoch']
+        })
+        received = client.get_received()
+        rejoined = [msg['args'][0] for msg in received if msg['name'] == 'joined_canvas'][0]
+        assert len(rejoined['objects']) == 1
+        assert rejoined['seq'] == 1
+        assert not [msg for msg in received if msg['name'] in ('canvas_replay', 'canvas_resync')]
+        client.disconnect()
+        writer.disconnect()
+    
+    def test_hot_canvas_state_serves_joins_and_buffered_edits(self, app):
+        """Test that joins are served from memory, edits stay in memory until release, and idle states are evicted."""
+        from app.extensions import db
+        from app.models import CanvasObject
+        from app.services.canvas_state import canvas_states, CANVAS_STATE_MAX_CANVASES
+        from app.services.object_write_buffer import object_write_buffer
+        canvas_states.clear()
+        
+        headers = {'Authorization': 'Bearer valid-token'}
+        flask_client = app.test_client()
+        canvas = flask_client.post('/api/canvas', json={'title': 'Hot'}, headers=headers).get_json()['canvas']
+        created = flask_client.post('/api/objects/', json={
+            'canvas_id': canvas['id'],
+            'object_type': 'rectangle',
+            'properties': {'x': 0, 'y': 0, 'width': 10, 'height': 10}
+        }, headers=headers).get_json()['object']
+        
+        first = socketio.test_client(app, auth={'token': 'valid-token'})
+        first.emit('join_canvas', {'canvas_id': canvas['id']})
+        assert canvas_states.stats()['loads'] == 1
+        
+        object_write_buffer.durability = 'buffered'
+        object_write_buffer.interval = 3600
+        try:
+            first.emit('object_updated', {'canvas_id': canvas['id'], 'object_id': created['id'], 'patch': {'x': 42}})
+            
+            second = socketio.test_client(app, auth={'token': 'valid-token'})
+            second.emit('join_canvas', {'canvas_id': canvas['id'], 'with_objects': True})
+            joined = [msg['args'][0] for msg in second.get_received() if msg['name'] == 'joined_canvas'][0]
+            assert joined['objects'][0]['properties']['x'] == 42
+            assert joined['version'] == 1
+            assert canvas_states.stats()['loads'] == 1
+            assert db.session.query(CanvasObject.properties).filter_by(id=created['id']).scalar().count('"x": 0') == 1
+            
+            flask_client.post('/api/objects/', json={
+                'canvas_id': canvas['id'],
+                'object_type': 'circle',
+                'properties': {'x': 5, 'y': 5, 'radius': 1}
+            }, headers=headers)
+            assert len(canvas_states.snapshot(canvas['id'])['objects']) == 2
+            
+            first.disconnect()
+            second.disconnect()
+            stored = db.session.get(CanvasObject, created['id'])
+            db.session.refresh(stored)
+            assert stored.get_properties()['x'] == 42
+            assert canvas_states.stats()['active'] == 0
+        finally:
+            object_write_buffer.durability = 'sync'
+            object_write_buffer.interval = 0.25
+        
+        canvas_states.max_canvases = 0
+        try:
+            canvas_states.release(canvas['id'])
+            assert canvas_states.stats()['canvases'] == 0
+        finally:
+            canvas_states.max_canvases = CANVAS_STATE_MAX_CANVASES
+
+class TestCursorEvents:
+    """Test batched cursor broadcasting."""
+    
+    def test_moves_coalesce_into_one_batch_per_tick(self, app):
+        """Test that many moves yield one cursors_batch with the latest position, and rates adapt."""
+        from app.services.cursor_broadcaster import cursor_broadcaster
+        
+        headers = {'Authorization': 'Bearer valid-token'}
+        canvas = app.test_client().post('/api/canvas', json={'title': 'Cursors'}, headers=headers).get_json()['canvas']
+        mover = socketio.test_client(app, auth={'token': 'valid-token'})
+        watcher = socketio.test_client(app, auth={'token': 'valid-token'})
+        for client in (mover, watcher):
+            client.emit('join_canvas', {'canvas_id': canvas['id']})
+            client.get_received()
+        
+        for x in range(20):
+            mover.emit('cursor_move', {'canvas_id': canvas['id'], 'position': {'x': x, 'y': 0}})
+        mover.emit('cursor_move', {'canvas_id': 'no-such-canvas', 'position': {'x': 1, 'y': 1}})
+        cursor_broadcaster.tick(now=float('inf'))
+        
+        received = watcher.get_received()
+        assert not [msg for msg in received if msg['name'] == 'cursor_moved']
+        batches = [msg['args'][0] for msg in received if msg['name'] == 'cursors_batch']
+        assert 1 <= len(batches) < 20
+        assert batches[-1]['cursors'][-1]['position'] == {'x': 19, 'y': 0}
+        # The mover draws its own cursor and is not sent it back
+        assert not [msg for msg in mover.get_received() if msg['name'] == 'cursors_batch']
+        assert cursor_broadcaster.get_cursors('no-such-canvas') == []
+        
+        watcher.emit('get_cursors', {'canvas_id': 'no-such-canvas'})
+        assert [msg['name'] for msg in watcher.get_received()] == ['error']
+        
+        watcher.emit('get_cursors', {'canvas_id': canvas['id']})
+        listed = [msg['args'][0] for msg in watcher.get_received() if msg['name'] == 'cursors_data'][0]
+        assert [cursor['position'] for cursor in listed['cursors']] == [{'x': 19, 'y': 0}]
+        mover.emit('cursor_leave', {'canvas_id': canvas['id']})
+        assert cursor_broadcaster.get_cursors(canvas['id']) == []
+        
+        base = 1 / cursor_broadcaster.hz
+        assert cursor_broadcaster.interval_for(1) == pytest.approx(base)
+        assert cursor_broadcaster.interval_for(cursor_broadcaster.room_size * 2) == pytest.approx(2 * base)
+        assert cursor_broadcaster.interval_for(10 ** 6) == pytest.approx(1 / cursor_broadcaster.min_hz)
+        mover.disconnect()
+        watcher.disconnect()
+
+class TestPresenceEvents:
+    """Test presence served from the ephemeral store."""
+    
+    def test_online_users_without_redis(self, app):
+        """Test that presence works on a single node with the in-memory store."""
+        from app.services.ephemeral_store import get_ephemeral_store
+        assert get_ephemeral_store().backend == 'memory'
+        
+        client = socketio.test_client(app, auth={'token': 'valid-token'})
+        client.emit('user_online', {'canvas_id': 'presence-canvas', 'timestamp': 1})
+        client.emit('get_online_users', {'canvas_id': 'presence-canvas'})
+        online = [msg['args'][0] for msg in client.get_received() if msg['name'] == 'online_users'][0]
+        assert [user['user_id'] for user in online['users']] == ['test-user-id']
+        
+        client.emit('user_offline', {'canvas_id': 'presence-canvas'})
+        client.emit('get_online_users', {'canvas_id': 'presence-canvas'})
+        online = [msg['args'][0] for msg in client.get_received() if msg['name'] == 'online_users'][0]
+        assert online['users'] == []
+        client.disconnect()
+    
+    def test_update_user_presence_lists_the_user(self, app):
+        """Test that PresenceService records a known user and lists them with their name."""
+        import uuid
+        from app.extensions import db
+        from app.models import User
+        from app.services.ephemeral_store import MemoryEphemeralStore
+        from app.services.presence_service import PresenceService
+        user_id = f'present-{uuid.uuid4()}'
+        db.session.add(User(id=user_id, email=f'{user_id}@example.com', name='Present User'))
+        db.session.commit()
+        
+        presence_service = PresenceService(store=MemoryEphemeralStore())
+        assert presence_service.update_user_presence(user_id, 'presence-service-canvas', activity='editing')
+        assert not presence_service.update_user_presence('no-such-user', 'presence-service-canvas')
+        
+        present = presence_service.get_canvas_presence('presence-service-canvas')
+        assert [(user['user_id'], user['user_name'], user['activity']) for user in present] == [
+            (user_id, 'Present User', 'editing')
+        ]
+    
+    def test_memory_store_expires_entries(self):
+        """Test that entries count as live for the table's ttl only."""
+        from app.services.ephemeral_store import EphemeralTable, MemoryEphemeralStore
+        store = MemoryEphemeralStore()
+        table = EphemeralTable('presence', 60)
+        store.set(table, 'canvas', 'old', '{}', now=1000.0)
+        store.set(table, 'canvas', 'new', '{}', now=1050.0)
+        
+        assert set(store.live(table, 'canvas', now=1070.0)) == {'new'}
+        assert store.count(table, 'canvas', now=1070.0) == 1
+        assert store.get(table, 'canvas', 'old', now=1070.0) is None
+        assert store.sweep(table, 'canvas', now=1070.0) == 1
+        assert store.stats()['entries'] == 1
+        assert store.live(table, 'canvas', now=1200.0) == {}
+    
+    def test_redis_store_falls_back_while_breaker_is_open(self, monkeypatch, fake_redis):
+        """Test that the Redis store serves node-local state while Redis is down and Redis once it answers."""
+        from flask import Flask
+        from app.services import ephemeral_store
+        from app.services.ephemeral_store import EphemeralTable, MemoryEphemeralStore, RedisEphemeralStore
+        from app.utils.redis_connection import RedisConnectionManager
+        flask_app = Flask(__name__)
+        flask_app.config.update(REDIS_URL='redis://127.0.0.1:1/0', REDIS_CONNECT_TIMEOUT_MS=200,
+                                REDIS_BREAKER_COOLDOWN=60)
+        manager = RedisConnectionManager()
+        manager.init_app(flask_app)
+        monkeypatch.setattr(ephemeral_store, 'get_redis_connection', manager.client)
+        
+        table = EphemeralTable('presence', 60)
+        store = RedisEphemeralStore(fallback=MemoryEphemeralStore())
+        store.set(table, 'canvas', 'alice', '{}', now=1000.0)
+        assert manager.stats()['state'] == 'open'
+        assert store.live(table, 'canvas', now=1010.0) == {'alice': '{}'}
+        assert store.count(table, 'canvas', now=1010.0) == 1
+        stats = store.stats()
+        assert stats['fallbacks'] == 3
+        assert stats['fallback']['entries'] == 1
+        
+        monkeypatch.setattr(ephemeral_store, 'get_redis_connection', lambda: fake_redis)
+        store.set(table, 'canvas', 'bob', '{}', now=1000.0)
+        assert store.live(table, 'canvas', now=1010.0) == {'bob': '{}'}
+        assert store.stats()['fallbacks'] == 3
+
+class TestRedisConnection:
+    """Test the shared Redis connection manager."""
+    
+    def test_unconfigured_redis_is_disabled(self, app):
+        """Test that the testing config runs without Redis."""
+        from app.extensions import get_redis_connection, redis_manager
+        assert get_redis_connection() is None
+        assert redis_manager.stats()['state'] == 'disabled'
+    
+    def test_unreachable_redis_opens_breaker(self):
+        """Test that a failed health check disables Redis until the cooldown ends."""
+        from flask import Flask
+        from app.utils.redis_connection import RedisConnectionManager, RedisUnavailable
+        flask_app = Flask(__name__)
+        flask_app.config.update(REDIS_URL='redis://127.0.0.1:1/0', REDIS_CONNECT_TIMEOUT_MS=200,
+                                REDIS_BREAKER_COOLDOWN=60)
+        manager = RedisConnectionManager()
+        manager.init_app(flask_app)
+        
+        assert manager.client() is None
+        stats = manager.stats()
+        assert stats['state'] == 'open'
+        assert stats['trips'] == 1
+        assert stats['commands']['PING']['errors'] == 1
+        
+        # Open breaker: no further connection attempts
+        assert manager.client() is None
+        with pytest.raises(RedisUnavailable):
+            manager._client.get('key')
+        stats = manager.stats()
+        assert stats['rejected'] == 2
+        assert stats['commands']['PING']['calls'] == 1
+        assert 'GET' not in stats['commands']
+
+class TestTimedHash:
+    """Test the Redis hash + last-seen sorted set behind shared ephemeral state."""
+    
+    def test_set_refreshes_last_seen(self, fake_redis):
+        """Test that writing a member again moves its last-seen time forward."""
+        from app.utils.timed_hash import TimedHash
+        timed_hash = TimedHash('cursors', 30)
+        timed_hash.set(fake_redis, 'canvas', 'alice', '{"x": 1}', now=1000.0)
+        timed_hash.set(fake_redis, 'canvas', 'alice', '{"x": 2}', now=1020.0)
+        
+        assert fake_redis.zscore('cursors:canvas:seen', 'alice') == 1020.0
+        assert timed_hash.get(fake_redis, 'canvas', 'alice', now=1040.0) == '{"x": 2}'
+        assert timed_hash.count(fake_redis, 'canvas', now=1040.0) == 1
+    
+    def test_expired_members_are_skipped_and_swept(self, fake_redis):
+        """Test that members past the ttl are hidden from reads and removed by sweep."""
+        from app.utils.timed_hash import TimedHash
+        timed_hash = TimedHash('cursors', 30)
+        timed_hash.set(fake_redis, 'canvas', 'old', '{}', now=1000.0)
+        timed_hash.set(fake_redis, 'canvas', 'new', '{}', now=1025.0)
+        
+        assert timed_hash.live(fake_redis, 'canvas', now=1040.0) == {'new': '{}'}
+        assert timed_hash.count(fake_redis, 'canvas', now=1040.0) == 1
+        assert timed_hash.get(fake_redis, 'canvas', 'old', now=1040.0) is None
+        
+        assert timed_hash.sweep(fake_redis, 'canvas', now=1040.0) == 1
+        assert set(fake_redis.data['cursors:canvas']) == {'new'}
+        assert set(fake_redis.data['cursors:canvas:seen']) == {'new'}
+        assert timed_hash.sweep(fake_redis, 'canvas', now=1040.0) == 0
+    
+    def test_staged_writes_share_one_round_trip(self, fake_redis):
+        """Test that sets and removals staged for several scopes go out in one pipeline."""
+        from app.utils.timed_hash import TimedHash
+        timed_hash = TimedHash('cursors', 30)
+        timed_hash.set(fake_redis, 'first', 'gone', '{}', now=1000.0)
+        fake_redis.executed.clear()
+        
+        pipe = fake_redis.pipeline(transaction=False)
+        timed_hash.stage_set(pipe, 'first', {'alice': '{}'}, {'alice': 1010.0})
+        timed_hash.stage_set(pipe, 'second', {'bob': '{}', 'carol': '{}'}, {'bob': 1010.0, 'carol': 1010.0})
+        timed_hash.stage_remove(pipe, 'first', ['gone'])
+        timed_hash.stage_set(pipe, 'second', {}, {})
+        timed_hash.stage_remove(pipe, 'second', [])
+        pipe.execute()
+        
+        assert len(fake_redis.executed) == 1
+        assert fake_redis.executed[0].count('hset') == 2
+        assert fake_redis.executed[0].count('hdel') == 1
+        assert timed_hash.live(fake_redis, 'first', now=1020.0) == {'alice': '{}'}
+        assert set(timed_hash.live(fake_redis, 'second', now=1020.0)) == {'bob', 'carol'}
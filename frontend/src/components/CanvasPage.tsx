@@ -21,8 +21,17 @@ import CursorTooltip from './CursorTooltip'
 import PointerIndicator from './PointerIndicator'
 import { getUserColor, getUserInitials, getCursorIcon } from '../utils/cursorUtils'
 import { getCursorManager, CursorState } from '../utils/cursorManager'
+import { applyMergePatch } from '../utils/mergePatch'
 import { FloatingToolbar, useToolbarState, useToolShortcuts, getToolById } from './toolbar'
 
+// One applied operation of an objects_batch broadcast
+interface BatchChange {
+  op: 'create' | 'update' | 'patch' | 'delete'
+  object_id: string
+  object?: CanvasObject
+  patch?: Record<string, any>
+}
+
 const CanvasPage: React.FC = () => {
   const { canvasId } = useParams<{ canvasId: string }>()
   const navigate = useNavigate()
@@ -84,9 +93,11 @@ const CanvasPage: React.FC = () => {
     }
 
     loadCanvas()
-    loadObjects()
     
-    // Connect to socket
+    // Connect to socket; joined_canvas carries the objects, so only load them over REST when offline
+    if (!isConnected || !idToken) {
+      loadObjects()
+    }
     if (isConnected && idToken) {
       socketService.joinCanvas(canvasId, idToken)
       socketService.userOnline(canvasId, idToken)
@@ -168,9 +179,22 @@ const CanvasPage: React.FC = () => {
   }
 
   const setupSocketListeners = () => {
+    socketService.on('joined_canvas', (data: { objects?: CanvasObject[] }) => {
+      if (data.objects) {
+        setObjects(data.objects)
+        setIsLoading(false)
+      } else {
+        // The server had no snapshot to send (canvas not loaded into memory)
+        loadObjects()
+      }
+    })
+
     // Object events
     socketService.on('object_created', (data: { object: CanvasObject }) => {
-      setObjects(prev => [...prev, data.object])
+      // Replace rather than append: a create can reach us after a snapshot that already holds it
+      setObjects(prev => prev.some(obj => obj.id === data.object.id)
+        ? prev.map(obj => obj.id === data.object.id ? data.object : obj)
+        : [...prev, data.object])
     })
 
     socketService.on('object_updated', (data: { object: CanvasObject }) => {
@@ -183,6 +207,41 @@ const CanvasPage: React.FC = () => {
       setObjects(prev => prev.filter(obj => obj.id !== data.object_id))
     })
 
+    // Only the changed property keys arrive; merge them into our copy
+    socketService.on('object_patched', (data: { object_id: string; patch: Record<string, any>; updated_at: string }) => {
+      setObjects(prev => prev.map(obj =>
+        obj.id === data.object_id
+          ? { ...obj, properties: applyMergePatch(obj.properties, data.patch), updated_at: data.updated_at }
+          : obj
+      ))
+    })
+
+    // A batch from any collaborator, applied in order in a single state update
+    socketService.on('objects_batch', (data: { changes: BatchChange[] }) => {
+      setObjects(prev => data.changes.reduce((objects, change) => {
+        switch (change.op) {
+          case 'delete':
+            return objects.filter(obj => obj.id !== change.object_id)
+          case 'patch':
+            return objects.map(obj =>
+              obj.id === change.object_id ? { ...obj, properties: applyMergePatch(obj.properties, change.patch) } : obj
+            )
+          default: {
+            const object = change.object
+            if (!object) return objects
+            return objects.some(obj => obj.id === object.id)
+              ? objects.map(obj => obj.id === object.id ? object : obj)
+              : [...objects, object]
+          }
+        }
+      }, prev))
+    })
+
+    // Too many events were missed while disconnected to replay them
+    socketService.on('canvas_resync', () => {
+      loadObjects()
+    })
+
     // Cursor events
     socketService.on('cursor_moved', (data: CursorData) => {
       setCursors(prev => {
@@ -191,6 +250,17 @@ const CanvasPage: React.FC = () => {
       })
     })
 
+    // One message per room tick with every cursor that moved; the server leaves out the one this
+    // connection moved, and our other tabs' cursors are skipped here
+    socketService.on('cursors_batch', (data: { cursors: CursorData[] }) => {
+      const moved = data.cursors.filter(cursor => cursor.user_id !== user?.id)
+      if (moved.length === 0) return
+      setCursors(prev => {
+        const movedIds = new Set(moved.map(cursor => cursor.user_id))
+        return [...prev.filter(cursor => !movedIds.has(cursor.user_id)), ...moved]
+      })
+    })
+
     socketService.on('cursor_left', (data: { user_id: string }) => {
       setCursors(prev => prev.filter(cursor => cursor.user_id !== data.user_id))
     })
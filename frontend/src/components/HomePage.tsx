@@ -10,6 +10,8 @@ const HomePage: React.FC = () => {
   const { user, isAuthenticated, signIn } = useAuth()
   const [canvases, setCanvases] = useState<Canvas[]>([])
   const [isLoading, setIsLoading] = useState(false)
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
+  const [isLoadingMore, setIsLoadingMore] = useState(false)
   const [showCreateModal, setShowCreateModal] = useState(false)
   const [newCanvasTitle, setNewCanvasTitle] = useState('')
   const [newCanvasDescription, setNewCanvasDescription] = useState('')
@@ -82,6 +84,7 @@ const HomePage: React.FC = () => {
       setIsLoading(true)
       const response = await canvasAPI.getCanvases()
       setCanvases(response.canvases)
+      setNextCursor(response.next_cursor)
     } catch (error) {
       console.error('Failed to load canvases:', error)
       toast.error('Failed to load canvases')
@@ -90,6 +93,25 @@ const HomePage: React.FC = () => {
     }
   }
 
+  // The listing is paginated; fetch the page after the last one shown
+  const loadMoreCanvases = async () => {
+    if (!nextCursor || isLoadingMore) return
+    try {
+      setIsLoadingMore(true)
+      const response = await canvasAPI.getCanvases({ cursor: nextCursor })
+      setCanvases(prev => {
+        const seen = new Set(prev.map(canvas => canvas.id))
+        return [...prev, ...response.canvases.filter(canvas => !seen.has(canvas.id))]
+      })
+      setNextCursor(response.next_cursor)
+    } catch (error) {
+      console.error('Failed to load more canvases:', error)
+      toast.error('Failed to load more canvases')
+    } finally {
+      setIsLoadingMore(false)
+    }
+  }
+
   const createCanvas = async () => {
     if (!newCanvasTitle.trim()) {
       toast.error('Canvas title is required')
@@ -267,6 +289,19 @@ const HomePage: React.FC = () => {
             ))}
           </div>
         )}
+
+        {!isLoading && nextCursor && (
+          <div className="flex justify-center mt-8">
+            <button
+              onClick={loadMoreCanvases}
+              className="btn btn-secondary"
+              disabled={isLoadingMore}
+              data-testid="load-more-canvases"
+            >
+              {isLoadingMore ? 'Loading...' : 'Load more'}
+            </button>
+          </div>
+        )}
       </main>
 
       {/* Create Canvas Modal */}
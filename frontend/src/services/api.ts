@@ -86,8 +86,10 @@ export const authAPI = {
 
 // Canvas API
 export const canvasAPI = {
-  getCanvases: async (): Promise<{ canvases: Canvas[] }> => {
-    const response = await api.get('/canvas')
+  getCanvases: async (
+    params: { cursor?: string; limit?: number; filter?: string } = {}
+  ): Promise<{ canvases: Canvas[]; next_cursor: string | null }> => {
+    const response = await api.get('/canvas', { params })
     return response.data
   },
   
@@ -110,10 +112,38 @@ export const canvasAPI = {
     await api.delete(`/canvas/${canvasId}`)
   },
   
-  getCanvasObjects: async (canvasId: string): Promise<{ objects: CanvasObject[] }> => {
+  getCanvasObjects: async (canvasId: string): Promise<{ objects: CanvasObject[]; version: number }> => {
     const response = await api.get(`/canvas/${canvasId}/objects`)
     return response.data
   },
+  
+  // Bounding box of every object on the canvas, null when it has none
+  getCanvasExtents: async (canvasId: string): Promise<{ extents: { min_x: number; min_y: number; max_x: number; max_y: number } | null }> => {
+    const response = await api.get(`/canvas/${canvasId}/extents`)
+    return response.data
+  },
+  
+  // Objects whose bounds intersect the viewport [x0, y0, x1, y1] in canvas coordinates
+  getCanvasObjectsInView: async (canvasId: string, bbox: [number, number, number, number]): Promise<{ objects: CanvasObject[]; bbox: number[]; version: number }> => {
+    const response = await api.get(`/canvas/${canvasId}/objects`, { params: { bbox: bbox.join(',') } })
+    return response.data
+  },
+  
+  // Objects written since a known canvas version; `deleted` is absent when the server sent a full snapshot
+  getCanvasChanges: async (canvasId: string, since: number): Promise<{ objects: CanvasObject[]; deleted?: string[]; since?: number; version: number }> => {
+    const response = await api.get(`/canvas/${canvasId}/objects`, { params: { since } })
+    return response.data
+  },
+
+  // Rejects with 410 once operations after `since` have been compacted; reload the snapshot instead
+  getCanvasOperations: async (canvasId: string, since: number): Promise<{
+    operations: { seq: number; op: 'create' | 'update' | 'patch' | 'delete'; object_id: string; payload: any; actor_id: string | null; created_at: string }[]
+    since: number
+    version: number
+  }> => {
+    const response = await api.get(`/canvas/${canvasId}/operations`, { params: { since } })
+    return response.data
+  },
 }
 
 // Objects API
@@ -5,6 +5,9 @@ class SocketService {
   private socket: Socket | null = null
   private listeners: Map<string, Function[]> = new Map()
   private debugMode = import.meta.env.VITE_DEBUG_SOCKET === 'true'
+  // Last object event applied per canvas, sent on (re)join so the server can replay the gap
+  private positions: Map<string, { epoch: string; seq: number }> = new Map()
+  private currentCanvasId: string | undefined
 
   connect(idToken: string) {
     const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:5000'
@@ -72,9 +75,25 @@ class SocketService {
 
     // Canvas events
     this.socket.on('joined_canvas', (data) => {
+      // A snapshot is current as of data.seq, so start from there; without one keep our
+      // position when rejoining the same epoch and let canvas_replay fill the gap
+      const position = this.positions.get(data.canvas_id)
+      if (data.objects || !position || position.epoch !== data.epoch) {
+        this.positions.set(data.canvas_id, { epoch: data.epoch, seq: data.seq })
+      }
       this.emit('joined_canvas', data)
     })
 
+    this.socket.on('canvas_replay', (data: { canvas_id: string; events: { event: string; data: any }[] }) => {
+      data.events.forEach(({ event, data: payload }) => this.emitSequenced(data.canvas_id, event, payload))
+    })
+
+    this.socket.on('canvas_resync', (data) => {
+      // Missed events are gone; listeners reload the canvas over REST
+      this.positions.set(data.canvas_id, { epoch: data.epoch, seq: data.seq })
+      this.emit('canvas_resync', data)
+    })
+
     this.socket.on('user_joined', (data) => {
       this.emit('user_joined', data)
     })
@@ -84,15 +103,27 @@ class SocketService {
     })
 
     this.socket.on('object_created', (data) => {
-      this.emit('object_created', data)
+      this.emitSequenced(this.canvasOf(data), 'object_created', data)
     })
 
     this.socket.on('object_updated', (data) => {
-      this.emit('object_updated', data)
+      this.emitSequenced(this.canvasOf(data), 'object_updated', data)
+    })
+
+    this.socket.on('object_patched', (data) => {
+      this.emitSequenced(this.canvasOf(data), 'object_patched', data)
+    })
+
+    this.socket.on('objects_batch', (data) => {
+      this.emitSequenced(this.canvasOf(data), 'objects_batch', data)
+    })
+
+    this.socket.on('objects_batch_result', (data) => {
+      this.emit('objects_batch_result', data)
     })
 
     this.socket.on('object_deleted', (data) => {
-      this.emit('object_deleted', data)
+      this.emitSequenced(this.canvasOf(data), 'object_deleted', data)
     })
 
     // Cursor events
@@ -100,6 +131,10 @@ class SocketService {
       this.emit('cursor_moved', data)
     })
 
+    this.socket.on('cursors_batch', (data) => {
+      this.emit('cursors_batch', data)
+    })
+
     this.socket.on('cursor_left', (data) => {
       this.emit('cursor_left', data)
     })
@@ -122,15 +157,39 @@ class SocketService {
     })
   }
 
+  private canvasOf(data: any): string | undefined {
+    return data.canvas_id ?? data.object?.canvas_id ?? this.currentCanvasId
+  }
+
+  // Drop events already applied (live broadcasts can overlap a replay), then dispatch
+  private emitSequenced(canvasId: string | undefined, event: string, data: any) {
+    const position = canvasId ? this.positions.get(canvasId) : undefined
+    if (position && data.epoch === position.epoch && typeof data.seq === 'number') {
+      if (data.seq <= position.seq) return
+      position.seq = data.seq
+    }
+    this.emit(event, data)
+  }
+
   // Canvas events
   joinCanvas(canvasId: string, idToken: string) {
     if (this.socket) {
-      this.socket.emit('join_canvas', { canvas_id: canvasId, id_token: idToken })
+      const position = this.positions.get(canvasId)
+      this.currentCanvasId = canvasId
+      this.socket.emit('join_canvas', {
+        canvas_id: canvasId,
+        id_token: idToken,
+        // The server answers with the canvas objects from its in-memory state
+        with_objects: true,
+        ...(position ? { last_seq: position.seq, epoch: position.epoch } : {})
+      })
     }
   }
 
   leaveCanvas(canvasId: string, idToken: string) {
     if (this.socket) {
+      // Position is kept: a reconnect leaves and rejoins, and should only replay the gap
+      if (this.currentCanvasId === canvasId) this.currentCanvasId = undefined
       this.socket.emit('leave_canvas', { canvas_id: canvasId, id_token: idToken })
     }
   }
@@ -156,6 +215,30 @@ class SocketService {
     }
   }
 
+  // Send only the changed keys (JSON merge patch; null removes a key)
+  patchObject(canvasId: string, idToken: string, objectId: string, patch: Record<string, any>) {
+    if (this.socket) {
+      this.socket.emit('object_updated', {
+        canvas_id: canvasId,
+        id_token: idToken,
+        object_id: objectId,
+        patch
+      })
+    }
+  }
+
+  // Apply many creates/updates/patches/deletes in one transaction; results arrive as objects_batch_result
+  batchObjects(canvasId: string, idToken: string, operations: Array<Record<string, any>>, batchId?: string) {
+    if (this.socket) {
+      this.socket.emit('objects_batch', {
+        canvas_id: canvasId,
+        id_token: idToken,
+        batch_id: batchId,
+        operations
+      })
+    }
+  }
+
   deleteObject(canvasId: string, idToken: string, objectId: string) {
     if (this.socket) {
       this.socket.emit('object_deleted', {
@@ -0,0 +1,16 @@
+// JSON merge patch (RFC 7386), as applied by the backend to object properties
+
+export const applyMergePatch = (target: any, patch: any): any => {
+  if (patch === null || typeof patch !== 'object' || Array.isArray(patch)) return patch
+
+  const result: Record<string, any> =
+    target !== null && typeof target === 'object' && !Array.isArray(target) ? { ...target } : {}
+  Object.entries(patch).forEach(([key, value]) => {
+    if (value === null) {
+      delete result[key]
+    } else {
+      result[key] = applyMergePatch(result[key], value)
+    }
+  })
+  return result
+}